@@ -1,3 +1,8 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from sklearn.metrics import mean_squared_error
+
 # --------------------------
 # Data Handling
 # --------------------------
@@ -55,27 +60,114 @@ Inputs:
       Make sure df is sorted by time (oldest → newest).
 - steps: how many past rows (time steps) to include in each sequence.
          e.g., steps = 24 uses the last 24 hours/days/etc. to predict the next.
+- group_col: optional column (e.g. vehicle_id or route_id) whose groups are
+             windowed separately, so no sequence crosses from one trip into
+             another. The column itself is not used as a feature.
+- dtype: optional dtype for the arrays, e.g. np.float32 to halve memory.
 
 Outputs:
 - X: NumPy array of shape (num_samples, steps, num_features)
      → the rolling windows of input features.
+     Without group_col this is a read-only strided view over the data, so it
+     takes no memory beyond one copy of df. With group_col the valid windows
+     are gathered into a new array; use sequence_batches() to stream them.
 - y: NumPy array of shape (num_samples,)
      → the corresponding target values.
 """
 
 
-def create_sequences(df, steps):
-    X, y = [], []
-    values = df.values  # convert DataFrame to NumPy array
+def _sequence_windows(df, steps, group_col=None, dtype=None):
+    """
+    Zero-copy windows over df plus the start rows of the valid sequences.
+
+    Returns (windows, target, starts): windows[i] is the (steps, num_features)
+    view of rows i .. i+steps-1, target[i + steps] its label.
+    """
+    if group_col is not None:
+        groups = df[group_col].to_numpy()
+        # each group must be one contiguous run; a stable sort keeps time order
+        runs = 1 + np.count_nonzero(groups[1:] != groups[:-1]) if len(groups) else 0
+        if runs != pd.unique(groups).size:
+            order = np.argsort(groups, kind="stable")
+            df, groups = df.iloc[order], groups[order]
+        df = df.drop(columns=[group_col])
+
+    values = df.to_numpy(dtype=dtype)
+    features, target = values[:, :-1], values[:, -1]
+    n_windows = max(len(values) - steps, 0)
+    if n_windows == 0:
+        return np.empty((0, steps, features.shape[1]), dtype=values.dtype), target, np.arange(0)
+
+    # (rows, features, steps) -> (rows, steps, features), both views
+    windows = sliding_window_view(features, steps, axis=0).transpose(0, 2, 1)
+    starts = np.arange(n_windows)
+    if group_col is not None:
+        starts = starts[groups[starts] == groups[starts + steps]]
+    return windows, target, starts
+
+
+def create_sequences(df, steps, group_col=None, dtype=None):
+    windows, target, starts = _sequence_windows(df, steps, group_col, dtype)
+    if group_col is None:
+        return windows[:len(starts)], target[steps:]
+    return windows[starts], target[starts + steps]
+
+
+def sequence_batches(df, steps, batch_size=32, group_col=None, dtype=np.float32,
+                     shuffle=False, seed=None):
+    """
+    Iterate (X_batch, y_batch) from create_sequences() one batch at a time.
+
+    Only batch_size windows are materialized at once, so weeks of 15-second
+    snapshots can be trained on without holding every window in memory.
+    Pass the generator to model.fit(), or use sequence_dataset() for tf.data.
+
+    Parameters
+    ----------
+    df, steps, group_col, dtype :
+        As for create_sequences().
+    batch_size : int
+        Sequences per batch.
+    shuffle : bool
+        Visit the sequences in a random order (a new one on every pass).
+    seed : int, optional
+        Seed for the shuffle order.
+    """
+    windows, target, starts = _sequence_windows(df, steps, group_col, dtype)
+    return _batches(windows, target, starts, steps, batch_size,
+                    np.random.default_rng(seed) if shuffle else None)
+
+
+def _batches(windows, target, starts, steps, batch_size, rng=None):
+    order = rng.permutation(starts) if rng is not None else starts
+    for i in range(0, len(order), batch_size):
+        batch = order[i:i + batch_size]
+        yield windows[batch], target[batch + steps]
 
-    for i in range(len(values) - steps):
-        # Take the past `steps` rows of all columns except the last (features)
-        X.append(values[i:i+steps, :-1])
 
-        # Take the target value at the next time step (last column)
-        y.append(values[i+steps, -1])
+def sequence_dataset(df, steps, batch_size=32, group_col=None, shuffle=False, seed=None):
+    """
+    sequence_batches() as a prefetching tf.data.Dataset of float32 batches.
 
-    return np.array(X), np.array(y)
+    The dataset can be iterated again for every epoch; with shuffle=True each
+    epoch gets a new order.
+    """
+    import tensorflow as tf
+
+    # windowed once; every epoch re-runs batches() over the same views
+    windows, target, starts = _sequence_windows(df, steps, group_col, np.float32)
+    rng = np.random.default_rng(seed) if shuffle else None
+
+    def batches():
+        return _batches(windows, target, starts, steps, batch_size, rng)
+
+    return tf.data.Dataset.from_generator(
+        batches,
+        output_signature=(
+            tf.TensorSpec(shape=(None, steps, windows.shape[2]), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.float32),
+        ),
+    ).prefetch(tf.data.AUTOTUNE)
 
 
 
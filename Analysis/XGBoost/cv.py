@@ -0,0 +1,378 @@
+"""
+Time-aware cross-validation and hyperparameter search for the TTA model.
+
+prepare_data_for_xgboost splits rows at random, so snapshots from the same
+service day (and from days after the test rows) land in training and the
+test score is optimistic. Here rows are grouped by service day and
+evaluated walk-forward (rolling origin): fold k trains on the days before
+its test window and tests on the next test_days days, so every score is
+for days the model has not seen.
+
+For each fold the feature matrix is quantized once into an xgboost
+QuantileDMatrix (the hist method's histogram index) and shared by every
+hyperparameter candidate, instead of being rebuilt per training run.
+Candidate x fold runs are spread over a thread pool (xgboost releases the
+GIL while training), with the cores divided between the workers. Each run
+early-stops on the last day(s) of its own training window, never on the
+test days, and is scored with evaluate_model.
+
+The result is a DataFrame with one row per (candidate, fold); use
+summarize_search for the per-candidate mean/std ranking.
+
+Usage:
+    from cv import service_days, search_hyperparameters, summarize_search
+
+    results = search_hyperparameters(
+        df, {'max_depth': [4, 6, 8], 'eta': [0.05, 0.1]},
+        days=service_days(df), n_folds=5,
+    )
+    summary = summarize_search(results)
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils import FeatureTransformer, evaluate_model
+
+# Rides after midnight (and before this hour) belong to the previous
+# evening's service day
+SERVICE_DAY_START_HOUR = 3
+
+# Training parameters from the notebook's XGBRegressor, in xgboost.train
+# names. Candidates override these; 'num_boost_round' may be searched too.
+DEFAULT_PARAMS = {
+    'objective': 'reg:squarederror',
+    'eval_metric': 'rmse',
+    'tree_method': 'hist',
+    'max_bin': 256,
+    'max_depth': 6,
+    'eta': 0.1,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'min_child_weight': 3,
+    'gamma': 0.1,
+    'alpha': 0.01,
+    'lambda': 1.0,
+    'seed': 42,
+}
+NUM_BOOST_ROUND = 1000
+EARLY_STOPPING_ROUNDS = 50
+
+
+# ========================================================================
+# SPLITS
+# ========================================================================
+
+def service_days(df, time_col='snapshot_time', tz='America/New_York'):
+    """
+    Service day of each row: the local date of snapshot_time, with times
+    before SERVICE_DAY_START_HOUR counted as the previous day.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Rows with a time column
+    time_col : str
+        Timestamp column (offset-aware values are converted to tz, naive
+        values are taken as local)
+    tz : str
+        Local time zone
+
+    Returns:
+    --------
+    np.ndarray
+        datetime64[D] service day per row
+    """
+    times = pd.to_datetime(df[time_col], format='mixed')
+    if times.dt.tz is not None:
+        times = times.dt.tz_convert(tz).dt.tz_localize(None)
+    shifted = times - pd.Timedelta(hours=SERVICE_DAY_START_HOUR)
+    return shifted.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+
+
+def rolling_origin_splits(days, n_folds=5, test_days=1, gap_days=0,
+                          min_train_days=1, max_train_days=None):
+    """
+    Walk-forward train/test splits grouped by service day.
+
+    The last n_folds * test_days days are cut into n_folds consecutive test
+    windows. Each fold trains on the days before its window (all of them,
+    or the last max_train_days), leaving gap_days out in between.
+
+    Parameters:
+    -----------
+    days : array-like
+        Service day (or any sortable group label) per row
+    n_folds : int
+        Number of folds
+    test_days : int
+        Days per test window
+    gap_days : int
+        Days skipped between the training and test windows
+    min_train_days : int
+        Minimum training days for the first fold
+    max_train_days : int, optional
+        Sliding window length. If None, the training window expands.
+
+    Returns:
+    --------
+    list of tuple
+        (train_idx, test_idx) row positions per fold, oldest fold first;
+        rows are in day order
+    """
+    codes, n_days = _day_codes(days)
+    first_test = n_days - n_folds * test_days
+    if first_test - gap_days < min_train_days:
+        raise ValueError(
+            f"{n_days} service days cannot fit {n_folds} folds of {test_days} test day(s) "
+            f"after {gap_days} gap and {min_train_days} training day(s)"
+        )
+
+    # row positions grouped by day, so each window is one contiguous slice
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(n_days + 1))
+
+    splits = []
+    for k in range(n_folds):
+        test_start = first_test + k * test_days
+        train_end = test_start - gap_days
+        train_start = 0 if max_train_days is None else max(0, train_end - max_train_days)
+        splits.append((
+            order[bounds[train_start]:bounds[train_end]],
+            order[bounds[test_start]:bounds[test_start + test_days]],
+        ))
+    return splits
+
+
+def _day_codes(days):
+    _, codes = np.unique(np.asarray(days), return_inverse=True)
+    return codes.ravel(), int(codes.max()) + 1 if len(codes) else 0
+
+
+# ========================================================================
+# FOLD CACHE
+# ========================================================================
+
+class _Fold:
+    """One fold's quantized matrices, built once and shared by all candidates."""
+
+    def __init__(self, number, X, y, days, train_idx, test_idx, max_bin, early_stopping_days):
+        import xgboost as xgb
+
+        train_days = days[train_idx]
+        unique_days = np.unique(train_days)
+        if early_stopping_days and len(unique_days) > early_stopping_days:
+            # train_idx is in day order: the tail days become the early-stopping set
+            split = np.searchsorted(train_days, unique_days[-early_stopping_days])
+            fit_idx, valid_idx = train_idx[:split], train_idx[split:]
+        else:
+            fit_idx, valid_idx = train_idx, train_idx[:0]
+
+        self.number = number
+        self.train_start, self.train_end = unique_days[0], unique_days[-1]
+        self.test_start, self.test_end = days[test_idx].min(), days[test_idx].max()
+        self.n_train, self.n_valid, self.n_test = len(fit_idx), len(valid_idx), len(test_idx)
+
+        self.dtrain = xgb.QuantileDMatrix(X[fit_idx], y[fit_idx], max_bin=max_bin)
+        self.dvalid = (xgb.QuantileDMatrix(X[valid_idx], y[valid_idx], ref=self.dtrain, max_bin=max_bin)
+                       if len(valid_idx) else None)
+        # predicted with inplace_predict, no DMatrix needed
+        self.X_test, self.y_test = X[test_idx], y[test_idx]
+
+
+# ========================================================================
+# SEARCH
+# ========================================================================
+
+def _candidates(param_grid, n_iter, random_state):
+    from sklearn.model_selection import ParameterGrid, ParameterSampler
+
+    if param_grid is None:
+        return [{}]
+    if n_iter is None:
+        return list(ParameterGrid(param_grid))
+    return list(ParameterSampler(param_grid, n_iter, random_state=random_state))
+
+
+def _feature_matrix(df, feature_cols):
+    if feature_cols is None:
+        # the serving feature set (serve.py bundles an unscaled FeatureTransformer)
+        return FeatureTransformer().transform(df), FeatureTransformer().feature_names_
+    return np.asarray(df[feature_cols], dtype=np.float32), list(feature_cols)
+
+
+def _run(fold, params, num_boost_round, early_stopping_rounds, nthread):
+    import xgboost as xgb
+
+    params = {**params, 'nthread': nthread}
+    evals = [(fold.dvalid, 'valid')] if fold.dvalid is not None else []
+    start = time.perf_counter()
+    booster = xgb.train(
+        params, fold.dtrain,
+        num_boost_round=num_boost_round,
+        evals=evals,
+        early_stopping_rounds=early_stopping_rounds if evals else None,
+        verbose_eval=False,
+    )
+    fit_seconds = time.perf_counter() - start
+
+    best_iteration = booster.best_iteration if evals else num_boost_round - 1
+    y_pred = booster.inplace_predict(fold.X_test, iteration_range=(0, best_iteration + 1))
+    metrics = evaluate_model(fold.y_test, y_pred, verbose=False)
+    return best_iteration, fit_seconds, metrics
+
+
+def search_hyperparameters(df, param_grid=None, days=None, target_col='tta_sec', feature_cols=None,
+                           n_folds=5, test_days=1, gap_days=0, max_train_days=None,
+                           early_stopping_days=1, early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+                           num_boost_round=NUM_BOOST_ROUND, base_params=None,
+                           n_iter=None, n_jobs=None, random_state=42):
+    """
+    Rolling-origin cross-validation of every hyperparameter candidate.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Training rows: the target and the feature columns
+    param_grid : dict or list of dict, optional
+        xgboost.train parameters to search (sklearn ParameterGrid format),
+        overriding base_params; may include 'num_boost_round'. If None, only
+        base_params are cross-validated.
+    days : array-like, optional
+        Service day per row. Defaults to service_days(df).
+    target_col : str
+        Name of target column
+    feature_cols : list, optional
+        Feature columns. If None, the FeatureTransformer features computed
+        from the BASE_FEATURES columns.
+    n_folds, test_days, gap_days, max_train_days : int
+        Split layout, see rolling_origin_splits
+    early_stopping_days : int
+        Last training days of each fold held out for early stopping (0 to
+        train all num_boost_round rounds)
+    early_stopping_rounds : int
+        Rounds without improvement on those days before stopping
+    num_boost_round : int
+        Maximum boosting rounds
+    base_params : dict, optional
+        Parameters shared by all candidates. Defaults to DEFAULT_PARAMS.
+    n_iter : int, optional
+        Sample this many candidates from param_grid (distributions allowed)
+        instead of trying every combination
+    n_jobs : int, optional
+        Concurrent training runs. Defaults to one per candidate x fold, up
+        to the number of cores; the cores are shared out between them.
+    random_state : int
+        Seed for candidate sampling
+
+    Returns:
+    --------
+    pd.DataFrame
+        One row per (candidate, fold): candidate, fold, params, train and
+        test day ranges, row counts, best_iteration, rmse, mae, r2 and
+        fit_seconds
+    """
+    if target_col not in df.columns:
+        raise ValueError(f"Target column '{target_col}' not found in DataFrame")
+
+    base_params = {**DEFAULT_PARAMS, **(base_params or {})}
+    candidates = _candidates(param_grid, n_iter, random_state)
+
+    days = service_days(df) if days is None else np.asarray(days)
+    min_train_days = early_stopping_days + 1 if early_stopping_days else 1
+    splits = rolling_origin_splits(days, n_folds=n_folds, test_days=test_days, gap_days=gap_days,
+                                   min_train_days=min_train_days, max_train_days=max_train_days)
+
+    X, _ = _feature_matrix(df, feature_cols)
+    y = df[target_col].to_numpy(dtype=np.float32)
+
+    # one quantized matrix per fold and distinct max_bin
+    max_bins = sorted({int(c.get('max_bin', base_params['max_bin'])) for c in candidates})
+    folds = {
+        (k, max_bin): _Fold(k, X, y, days, train_idx, test_idx, max_bin, early_stopping_days)
+        for max_bin in max_bins
+        for k, (train_idx, test_idx) in enumerate(splits)
+    }
+
+    tasks = []
+    for i, candidate in enumerate(candidates):
+        params = {**base_params, **candidate}
+        rounds = int(params.pop('num_boost_round', num_boost_round))
+        for k in range(n_folds):
+            tasks.append((i, candidate, params, rounds, folds[(k, int(params['max_bin']))]))
+
+    cores = os.cpu_count() or 1
+    n_jobs = max(1, min(n_jobs or cores, len(tasks)))
+    nthread = max(1, cores // n_jobs)
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        futures = [pool.submit(_run, fold, params, rounds, early_stopping_rounds, nthread)
+                   for _, _, params, rounds, fold in tasks]
+        rows = []
+        for (i, candidate, _, _, fold), future in zip(tasks, futures):
+            best_iteration, fit_seconds, metrics = future.result()
+            rows.append({
+                'candidate': i,
+                'fold': fold.number,
+                'params': candidate,
+                'train_start': fold.train_start,
+                'train_end': fold.train_end,
+                'test_start': fold.test_start,
+                'test_end': fold.test_end,
+                'n_train': fold.n_train,
+                'n_valid': fold.n_valid,
+                'n_test': fold.n_test,
+                'best_iteration': best_iteration,
+                **metrics,
+                'fit_seconds': fit_seconds,
+            })
+    return pd.DataFrame(rows)
+
+
+def cross_validate(df, params=None, **kwargs):
+    """
+    Rolling-origin cross-validation of a single parameter set.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Training rows
+    params : dict, optional
+        Overrides of DEFAULT_PARAMS
+    **kwargs
+        Passed to search_hyperparameters
+
+    Returns:
+    --------
+    pd.DataFrame
+        One row per fold
+    """
+    return search_hyperparameters(df, [{k: [v] for k, v in (params or {}).items()}], **kwargs)
+
+
+def summarize_search(results):
+    """
+    Rank candidates by mean test RMSE across folds.
+
+    Parameters:
+    -----------
+    results : pd.DataFrame
+        Output of search_hyperparameters
+
+    Returns:
+    --------
+    pd.DataFrame
+        One row per candidate: params, mean and std of rmse/mae/r2, mean
+        best_iteration and total fit_seconds, best first
+    """
+    grouped = results.groupby('candidate')
+    summary = grouped[['rmse', 'mae', 'r2']].agg(['mean', 'std'])
+    summary.columns = [f'{metric}_{stat}' for metric, stat in summary.columns]
+    summary['best_iteration'] = grouped['best_iteration'].mean()
+    summary['fit_seconds'] = grouped['fit_seconds'].sum()
+    summary.insert(0, 'params', grouped['params'].first())
+    return summary.sort_values('rmse_mean')
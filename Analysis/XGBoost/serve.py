@@ -0,0 +1,444 @@
+"""
+Online TTA prediction server producing the Data-Viz DelayPrediction JSON.
+
+The model and its fitted FeatureTransformer are loaded once. Every pipeline
+tick hands the service one feature row per (bus, target stop): route_id,
+stop_id, snapshot_time and the BASE_FEATURES columns. The whole tick is run
+through the transformer and the model in one call off the event loop, and
+the per-(route, stop) results are cached until the next tick replaces them,
+so map requests are dictionary lookups.
+
+With warm=False, pairs are predicted on first request instead: cache misses
+from concurrent requests are queued and answered together by a single
+vectorized predict call (MicroBatcher), and requests for a pair that is
+already being predicted wait on the same future. Raw feature rows posted to
+/predict are batched the same way.
+
+Endpoints (aiohttp):
+    GET  /predictions?routeId=..[&stopId=..]  DelayPrediction list
+    POST /predict                             raw feature rows -> tta_sec
+    POST /tick[?warm=0]                       replace the current tick
+    GET  /health
+
+Usage:
+    python serve.py --model model.pkl [--port 8080]
+"""
+
+import argparse
+import asyncio
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import BASE_FEATURES, FeatureTransformer
+
+MAX_BATCH = 1024
+MAX_WAIT_MS = 1.0
+
+
+# ========================================================================
+# MODEL BUNDLE
+# ========================================================================
+
+def save_model_bundle(path, model, transformer=None, encoders=None):
+    """
+    Pickle a trained model together with its feature transformer and id
+    encoders.
+
+    Parameters:
+    -----------
+    path : str or Path
+        Output file
+    model : XGBRegressor
+        Trained model (features in transformer.feature_names_ order)
+    transformer : FeatureTransformer, optional
+        Fitted transformer. Defaults to an unscaled FeatureTransformer.
+    encoders : dict, optional
+        fit_index_encoders output the training route_id_idx and
+        target_stop_idx were built with. The online FeatureStore needs
+        them to number ids the same way.
+    """
+    with open(path, 'wb') as f:
+        pickle.dump({'model': model, 'transformer': transformer or FeatureTransformer(),
+                     'encoders': encoders}, f)
+
+
+def load_model_bundle(path):
+    """
+    Load a bundle written by save_model_bundle.
+
+    Returns:
+    --------
+    tuple
+        (model, transformer)
+    """
+    with open(path, 'rb') as f:
+        bundle = pickle.load(f)
+    return bundle['model'], bundle['transformer']
+
+
+def load_encoders(path):
+    """
+    Id encoders of a bundle written by save_model_bundle.
+
+    Returns:
+    --------
+    dict
+        Index column -> {raw id (str): index}
+
+    Raises:
+    -------
+    ValueError
+        If the bundle was saved without encoders
+    """
+    with open(path, 'rb') as f:
+        bundle = pickle.load(f)
+    if not bundle.get('encoders'):
+        raise ValueError(f"{path}: model bundle has no id encoders; save it with encoders=fit_index_encoders(...)")
+    return bundle['encoders']
+
+
+def _predictor(model):
+    """Fastest predict for the model: the booster's inplace_predict when available."""
+    booster = model.get_booster() if hasattr(model, 'get_booster') else None
+    if booster is not None and hasattr(booster, 'inplace_predict'):
+        return lambda X: np.asarray(booster.inplace_predict(X), dtype=np.float64)
+    return lambda X: np.asarray(model.predict(X), dtype=np.float64)
+
+
+# ========================================================================
+# MICRO-BATCHING
+# ========================================================================
+
+class MicroBatcher:
+    """
+    Collect items submitted concurrently on one event loop and process them
+    with a single call to fn(items) -> results (same length and order).
+
+    A batch is whatever is queued when the worker wakes up, plus anything
+    arriving within max_wait_ms, capped at max_batch items. fn runs in the
+    loop's default executor so the loop keeps serving while it predicts.
+    """
+
+    def __init__(self, fn, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._worker = None
+
+    async def submit(self, item):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    def _drain(self, batch):
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            self._drain(batch)
+            if len(batch) < self.max_batch and self.max_wait > 0:
+                await asyncio.sleep(self.max_wait)
+                self._drain(batch)
+
+            items = [item for item, _ in batch]
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(None, self.fn, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+
+# ========================================================================
+# PREDICTION SERVICE
+# ========================================================================
+
+class _Tick:
+    """One pipeline tick: its feature matrix, row index per pair and caches."""
+
+    def __init__(self, number, features, transformer, baseline_col):
+        features = features.reset_index(drop=True)
+        route_ids = features['route_id'].astype(str)
+        stop_ids = features['stop_id'].astype(str)
+
+        self.number = number
+        self.time = pd.Timestamp.now(tz='UTC')
+        self.features = transformer.transform(features)
+        self.snapshot_time = (pd.DatetimeIndex(pd.to_datetime(features['snapshot_time'])) if 'snapshot_time' in features
+                              else pd.DatetimeIndex([self.time] * len(features)))
+        baseline = (pd.DatetimeIndex(pd.to_datetime(features[baseline_col])) if baseline_col in features
+                    else pd.DatetimeIndex([pd.NaT] * len(features)))
+        if baseline.tz is None and self.snapshot_time.tz is not None:
+            baseline = baseline.tz_localize(self.snapshot_time.tz)
+        elif baseline.tz is not None and self.snapshot_time.tz is None:
+            baseline = baseline.tz_convert(None)
+        self.baseline = baseline
+        # (route_id, stop_id) -> rows, one per bus heading there
+        self.pairs = pd.DataFrame({'r': route_ids, 's': stop_ids}).groupby(['r', 's'], sort=False).indices
+        self.routes = {}
+        for route_id, stop_id in self.pairs:
+            self.routes.setdefault(route_id, []).append(stop_id)
+        self.cache = {}
+        self.pending = {}
+
+
+class PredictionService:
+    """
+    Per-tick DelayPrediction cache in front of a vectorized model.
+
+    A new tick is built (and, with warm=True, fully predicted) before it
+    replaces the current one, so requests keep being answered from the
+    previous tick's cache in the meantime.
+
+    Parameters:
+    -----------
+    model : XGBRegressor
+        Trained TTA model
+    transformer : FeatureTransformer
+        Fitted transformer the model was trained with
+    max_batch : int
+        Most cache misses answered by one predict call
+    max_wait_ms : float
+        How long a miss waits for others to join its batch
+    baseline_col : str
+        Tick column with the arrival the bus was expected at (the
+        FeatureStore's first_predicted_arrival, or a scheduled arrival).
+        predictedDelayMinutes is snapshot_time + predicted TTA minus this;
+        pairs without a baseline get no predictedDelayMinutes.
+    """
+
+    def __init__(self, model, transformer, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS,
+                 baseline_col='first_predicted_arrival'):
+        self.transformer = transformer
+        self.baseline_col = baseline_col
+        self._predict = _predictor(model)
+        self._stops = MicroBatcher(self._predict_pairs, max_batch, max_wait_ms)
+        self._rows = MicroBatcher(self._predict_records, max_batch, max_wait_ms)
+        self._tick = _Tick(0, pd.DataFrame(columns=['route_id', 'stop_id'] + BASE_FEATURES),
+                           transformer, baseline_col)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        model, transformer = load_model_bundle(path)
+        return cls(model, transformer, **kwargs)
+
+    @property
+    def tick(self):
+        return self._tick.number
+
+    @property
+    def tick_time(self):
+        return self._tick.time if self._tick.number else None
+
+    def _build_tick(self, features, warm):
+        tick = _Tick(self._tick.number + 1, features, self.transformer, self.baseline_col)
+        if warm and tick.pairs:
+            keys = list(tick.pairs)
+            tick.cache.update(zip(keys, self._predict_pairs([(tick, key) for key in keys])))
+        return tick
+
+    def update_tick(self, features, warm=True):
+        """
+        Replace the current tick. Call on the server's event loop (e.g. via
+        loop.call_soon_threadsafe from a pipeline thread); aupdate_tick does
+        the work off the loop.
+
+        Parameters:
+        -----------
+        features : pd.DataFrame
+            One row per (bus, target stop) with route_id, stop_id,
+            BASE_FEATURES and optionally snapshot_time and baseline_col
+        warm : bool
+            Predict every pair now instead of on first request
+
+        Returns:
+        --------
+        int
+            Number of (route, stop) pairs in the tick
+        """
+        self._tick = self._build_tick(features, warm)
+        return len(self._tick.pairs)
+
+    async def aupdate_tick(self, features, warm=True):
+        """update_tick with the transform and predict run in a worker thread."""
+        tick = await asyncio.get_running_loop().run_in_executor(None, self._build_tick, features, warm)
+        # a tick that finished after a newer one must not replace it
+        if tick.number > self._tick.number:
+            self._tick = tick
+        return len(tick.pairs)
+
+    async def predict_stop(self, route_id, stop_id):
+        """DelayPrediction dict for the next bus at (route, stop), or None."""
+        tick = self._tick
+        key = (str(route_id), str(stop_id))
+        cached = tick.cache.get(key)
+        if cached is not None or key not in tick.pairs:
+            return cached
+
+        # concurrent misses for the same pair share one pending prediction
+        future = tick.pending.get(key)
+        if future is None:
+            future = tick.pending[key] = asyncio.ensure_future(self._fill(tick, key))
+        return await asyncio.shield(future)
+
+    async def _fill(self, tick, key):
+        try:
+            tick.cache[key] = await self._stops.submit((tick, key))
+        finally:
+            tick.pending.pop(key, None)
+        return tick.cache[key]
+
+    async def predict_route(self, route_id):
+        """DelayPredictions for every stop of route_id in the current tick."""
+        tick = self._tick
+        stop_ids = tick.routes.get(str(route_id), [])
+        predictions = await asyncio.gather(*(self.predict_stop(route_id, stop_id) for stop_id in stop_ids))
+        return [p for p in predictions if p is not None]
+
+    async def predict_all(self):
+        predictions = await asyncio.gather(*(self.predict_stop(*key) for key in self._tick.pairs))
+        return [p for p in predictions if p is not None]
+
+    async def predict_tta(self, record):
+        """Predicted tta_sec for one raw feature row (dict with BASE_FEATURES)."""
+        return await self._rows.submit(record)
+
+    def _predict_pairs(self, items):
+        # items may come from different ticks when a tick changed mid-batch
+        results = [None] * len(items)
+        by_tick = {}
+        for i, (tick, key) in enumerate(items):
+            by_tick.setdefault(tick, []).append(i)
+        for tick, positions in by_tick.items():
+            keys = [items[i][1] for i in positions]
+            for i, prediction in zip(positions, self._predict_tick(tick, keys)):
+                results[i] = prediction
+        return results
+
+    def _predict_tick(self, tick, keys):
+        rows = [tick.pairs[key] for key in keys]
+        sizes = np.array([len(r) for r in rows])
+        rows = np.concatenate(rows)
+        tta = self._predict(tick.features[rows])
+
+        # soonest bus per pair: sort by (pair, tta) and take each pair's first row
+        pair = np.repeat(np.arange(len(keys)), sizes)
+        first = np.lexsort((tta, pair))[np.cumsum(sizes) - sizes]
+        best, best_tta = rows[first], tta[first]
+
+        eta = tick.snapshot_time[best] + pd.to_timedelta(best_tta, unit='s')
+        # the model's arrival against the one the bus was expected at
+        delay_min = np.round((eta - tick.baseline[best]).total_seconds().to_numpy() / 60, 1)
+
+        predictions = []
+        for key, delay, when in zip(keys, delay_min, eta):
+            prediction = {'routeId': key[0], 'stopId': key[1], 'eta': when.isoformat(timespec='milliseconds')}
+            if not np.isnan(delay):
+                prediction['predictedDelayMinutes'] = float(delay)
+            predictions.append(prediction)
+        return predictions
+
+    def _predict_records(self, records):
+        frame = pd.DataFrame.from_records(records, columns=BASE_FEATURES)
+        return self._predict(self.transformer.transform(frame)).tolist()
+
+    def close(self):
+        self._stops.close()
+        self._rows.close()
+
+
+# ========================================================================
+# HTTP
+# ========================================================================
+
+def make_app(service):
+    """
+    aiohttp application serving a PredictionService.
+
+    Parameters:
+    -----------
+    service : PredictionService
+        Service to expose
+
+    Returns:
+    --------
+    aiohttp.web.Application
+    """
+    from aiohttp import web
+
+    async def predictions(request):
+        route_id = request.query.get('routeId')
+        stop_id = request.query.get('stopId')
+        if route_id is None:
+            return web.json_response(await service.predict_all())
+        if stop_id is None:
+            return web.json_response(await service.predict_route(route_id))
+        prediction = await service.predict_stop(route_id, stop_id)
+        return web.json_response([prediction] if prediction is not None else [])
+
+    async def predict(request):
+        records = await request.json()
+        missing = [col for col in BASE_FEATURES if any(col not in r for r in records)]
+        if missing:
+            return web.json_response({'message': f"Missing features: {', '.join(missing)}"}, status=400)
+        tta = await asyncio.gather(*(service.predict_tta(r) for r in records))
+        return web.json_response({'tta_sec': tta})
+
+    async def tick(request):
+        pairs = await service.aupdate_tick(pd.DataFrame.from_records(await request.json()),
+                                           warm=request.query.get('warm', '1') != '0')
+        return web.json_response({'tick': service.tick, 'pairs': pairs})
+
+    async def health(request):
+        return web.json_response({
+            'tick': service.tick,
+            'tickTime': service.tick_time.isoformat() if service.tick_time is not None else None,
+            'pairs': len(service._tick.pairs),
+            'cached': len(service._tick.cache),
+        })
+
+    async def on_cleanup(app):
+        service.close()
+
+    app = web.Application()
+    app.router.add_get('/predictions', predictions)
+    app.router.add_post('/predict', predict)
+    app.router.add_post('/tick', tick)
+    app.router.add_get('/health', health)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == '__main__':
+    from aiohttp import web
+
+    parser = argparse.ArgumentParser(description="Serve DelayPrediction JSON from a trained XGBoost model")
+    parser.add_argument('--model', required=True, help="Bundle written by save_model_bundle()")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    service = PredictionService.load(args.model, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    print(f"✓ Loaded {args.model} in {time.perf_counter() - started:.2f}s")
+    web.run_app(make_app(service), host=args.host, port=args.port)
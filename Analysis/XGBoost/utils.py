@@ -9,108 +9,149 @@ from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 # DATA GENERATION FUNCTIONS
 # ========================================================================
 
-def generate_synthetic_bus_data(n_samples=10000):
+def _synthetic_chunk(rng, n_samples):
+    """
+    Draw n_samples rows of synthetic data from rng, one array per column.
+
+    Parameters:
+    -----------
+    rng : np.random.Generator
+        Source of randomness
+    n_samples : int
+        Number of rows to draw
+
+    Returns:
+    --------
+    pd.DataFrame
+        Synthetic rows with features and target
+    """
+    # Route and stop information
+    route_id_idx = rng.integers(0, 21, n_samples)  # 0-20
+    target_stop_idx = rng.integers(0, 101, n_samples)  # 0-100
+
+    # Distance to target stop (0-5000 meters)
+    distance_to_target_stop_m = rng.uniform(100, 5000, n_samples)
+
+    # Time features
+    time_of_day_min = rng.integers(0, 1440, n_samples)  # 0-1439 minutes
+    day_of_week = rng.integers(0, 7, n_samples)  # 0=Mon, 6=Sun
+
+    # Weather
+    is_raining = (rng.random(n_samples) < 0.3).astype(np.int64)  # 30% chance of rain
+    raining = is_raining == 1
+
+    # Rush hour (6-9am, 4-7pm)
+    hour = time_of_day_min // 60
+    rush_hour = ((6 <= hour) & (hour < 9)) | ((16 <= hour) & (hour < 19))
+
+    # Current speed (meters/second)
+    base_speed = rng.uniform(5, 15, n_samples)
+    base_speed *= np.where(rush_hour, 0.7, 1.0)  # Slower during rush hour
+    base_speed *= np.where(raining, 0.85, 1.0)  # Slower in rain
+    base_speed *= np.where(day_of_week >= 5, 1.1, 1.0)  # Slightly faster on weekends
+    current_speed_mps = np.clip(base_speed, 0, 20)
+
+    # Current delay (seconds)
+    base_delay = rng.normal(0, 300, n_samples)
+    base_delay += np.where(rush_hour, rng.normal(300, 200, n_samples), 0.0)
+    base_delay += np.where(raining, rng.normal(180, 120, n_samples), 0.0)
+    current_delay_sec = np.clip(base_delay, -900, 1800)
+
+    # Headway to previous bus (seconds): 5-15 min at rush hour, else 10-30 min
+    headway_to_prev_bus_sec = np.where(
+        rush_hour,
+        rng.uniform(300, 900, n_samples),
+        rng.uniform(600, 1800, n_samples),
+    )
+
+    # Calculate time to arrival (TARGET)
+    base_tta = distance_to_target_stop_m / (current_speed_mps + 0.1)
+
+    # Add realistic variation factors
+    delay_propagation = current_delay_sec * 0.5
+    num_stops = (distance_to_target_stop_m // 500).astype(np.int64)
+    stop_time = num_stops * rng.uniform(20, 40, n_samples)
+    traffic_delays = rng.uniform(0, 60, n_samples) * (distance_to_target_stop_m / 1000)
+    weather_delay = np.where(raining, rng.uniform(30, 90, n_samples), 0.0)
+    bunching_delay = np.where(headway_to_prev_bus_sec < 300, rng.uniform(30, 120, n_samples), 0.0)
+
+    # Total time to arrival
+    tta_sec = base_tta + delay_propagation + stop_time + traffic_delays + weather_delay + bunching_delay
+    tta_sec += rng.normal(0, 30, n_samples)
+    tta_sec = np.clip(tta_sec, 10, 3600)
+
+    return pd.DataFrame({
+        'route_id_idx': route_id_idx,
+        'target_stop_idx': target_stop_idx,
+        'distance_to_target_stop_m': np.round(distance_to_target_stop_m, 2),
+        'current_speed_mps': np.round(current_speed_mps, 2),
+        'time_of_day_min': time_of_day_min,
+        'day_of_week': day_of_week,
+        'current_delay_sec': np.round(current_delay_sec, 2),
+        'is_raining': is_raining,
+        'headway_to_prev_bus_sec': np.round(headway_to_prev_bus_sec, 2),
+        'tta_sec': np.round(tta_sec, 2)
+    })
+
+
+def generate_synthetic_bus_data(n_samples=10000, seed=42, chunk_size=1_000_000, output_path=None):
     """
     Generate synthetic bus delay prediction dataset.
 
+    Every column is drawn as a whole array from one np.random.Generator, so
+    millions of rows take seconds. With output_path set, rows are generated
+    and appended to disk chunk_size at a time and never held in memory at
+    once.
+
     Parameters:
     -----------
     n_samples : int
         Number of samples to generate
+    seed : int or None
+        Seed for np.random.default_rng; the same seed and chunk_size give
+        the same data
+    chunk_size : int
+        Rows generated per chunk
+    output_path : str or Path, optional
+        Write to this file instead of returning a DataFrame (.csv, or
+        .parquet with pyarrow installed)
 
     Returns:
     --------
-    pd.DataFrame
-        Synthetic dataset with features and target
+    pd.DataFrame or Path
+        Synthetic dataset with features and target, or output_path when
+        writing to disk
     """
-    np.random.seed(42)
-    data = []
-
-    for _ in range(n_samples):
-        # Route and stop information
-        route_id_idx = np.random.randint(0, 21)  # 0-20
-        target_stop_idx = np.random.randint(0, 101)  # 0-100
-
-        # Distance to target stop (0-5000 meters)
-        distance_to_target_stop_m = np.random.uniform(100, 5000)
-
-        # Time features
-        time_of_day_min = np.random.randint(0, 1440)  # 0-1439 minutes
-        day_of_week = np.random.randint(0, 7)  # 0=Mon, 6=Sun
-
-        # Weather
-        is_raining = np.random.choice([0, 1], p=[0.7, 0.3])  # 30% chance of rain
-
-        # Current speed (meters/second)
-        base_speed = np.random.uniform(5, 15)
-
-        # Rush hour effects (6-9am, 4-7pm)
-        hour = time_of_day_min // 60
-        if (6 <= hour < 9) or (16 <= hour < 19):
-            base_speed *= 0.7  # Slower during rush hour
-
-        # Weather effects
-        if is_raining:
-            base_speed *= 0.85  # Slower in rain
-
-        # Weekend effects
-        if day_of_week >= 5:
-            base_speed *= 1.1  # Slightly faster on weekends
-
-        current_speed_mps = np.clip(base_speed, 0, 20)
-
-        # Current delay (seconds)
-        base_delay = np.random.normal(0, 300)
-
-        if (6 <= hour < 9) or (16 <= hour < 19):
-            base_delay += np.random.normal(300, 200)
-
-        if is_raining:
-            base_delay += np.random.normal(180, 120)
-
-        current_delay_sec = np.clip(base_delay, -900, 1800)
-
-        # Headway to previous bus (seconds)
-        if (6 <= hour < 9) or (16 <= hour < 19):
-            headway_to_prev_bus_sec = np.random.uniform(300, 900)  # 5-15 min
-        else:
-            headway_to_prev_bus_sec = np.random.uniform(600, 1800)  # 10-30 min
-
-        # Calculate time to arrival (TARGET)
-        base_tta = distance_to_target_stop_m / (current_speed_mps + 0.1)
-
-        # Add realistic variation factors
-        delay_propagation = current_delay_sec * 0.5
-        num_stops = int(distance_to_target_stop_m / 500)
-        stop_time = num_stops * np.random.uniform(20, 40)
-        traffic_delays = np.random.uniform(0, 60) * (distance_to_target_stop_m / 1000)
-        weather_delay = 0
-        if is_raining:
-            weather_delay = np.random.uniform(30, 90)
-        bunching_delay = 0
-        if headway_to_prev_bus_sec < 300:
-            bunching_delay = np.random.uniform(30, 120)
-
-        # Total time to arrival
-        tta_sec = base_tta + delay_propagation + stop_time + traffic_delays + weather_delay + bunching_delay
-        tta_sec += np.random.normal(0, 30)
-        tta_sec = np.clip(tta_sec, 10, 3600)
-
-        data.append({
-            'route_id_idx': route_id_idx,
-            'target_stop_idx': target_stop_idx,
-            'distance_to_target_stop_m': round(distance_to_target_stop_m, 2),
-            'current_speed_mps': round(current_speed_mps, 2),
-            'time_of_day_min': time_of_day_min,
-            'day_of_week': day_of_week,
-            'current_delay_sec': round(current_delay_sec, 2),
-            'is_raining': is_raining,
-            'headway_to_prev_bus_sec': round(headway_to_prev_bus_sec, 2),
-            'tta_sec': round(tta_sec, 2)
-        })
-
-    df = pd.DataFrame(data)
-    return df
+    rng = np.random.default_rng(seed)
+    chunk_sizes = [min(chunk_size, n_samples - start) for start in range(0, n_samples, chunk_size)]
+
+    if output_path is None:
+        chunks = [_synthetic_chunk(rng, n) for n in chunk_sizes]
+        if not chunks:
+            return _synthetic_chunk(rng, 0)
+        return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+    from pathlib import Path
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if output_path.suffix == '.parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for n in chunk_sizes or [0]:
+                table = pa.Table.from_pandas(_synthetic_chunk(rng, n), preserve_index=False)
+                writer = writer or pq.ParquetWriter(output_path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        for i, n in enumerate(chunk_sizes or [0]):
+            _synthetic_chunk(rng, n).to_csv(output_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+    return output_path
 
 
 # ========================================================================
@@ -210,25 +251,279 @@ def create_interaction_features(df):
     return df
 
 
-def engineer_features(df):
+# Raw model inputs, in the order they appear in the feature matrix
+BASE_FEATURES = [
+    'route_id_idx',
+    'target_stop_idx',
+    'distance_to_target_stop_m',
+    'current_speed_mps',
+    'time_of_day_min',
+    'day_of_week',
+    'current_delay_sec',
+    'is_raining',
+    'headway_to_prev_bus_sec',
+]
+
+# Derived features as (name, function of the columns computed so far),
+# evaluated in order, so later entries may use earlier ones
+DERIVED_FEATURES = [
+    # Time of day: hour/minute, cyclical encodings, rush hour indicator
+    ('hour', lambda c: c['time_of_day_min'] // 60),
+    ('minute', lambda c: c['time_of_day_min'] % 60),
+    ('time_sin', lambda c: np.sin(2 * np.pi * c['time_of_day_min'] / 1440)),
+    ('time_cos', lambda c: np.cos(2 * np.pi * c['time_of_day_min'] / 1440)),
+    ('hour_sin', lambda c: np.sin(2 * np.pi * c['hour'] / 24)),
+    ('hour_cos', lambda c: np.cos(2 * np.pi * c['hour'] / 24)),
+    ('is_rush_hour', lambda c: ((c['hour'] >= 6) & (c['hour'] < 9)) | ((c['hour'] >= 16) & (c['hour'] < 19))),
+    # Day of week: cyclical encoding, weekend indicator
+    ('day_sin', lambda c: np.sin(2 * np.pi * c['day_of_week'] / 7)),
+    ('day_cos', lambda c: np.cos(2 * np.pi * c['day_of_week'] / 7)),
+    ('is_weekend', lambda c: c['day_of_week'] >= 5),
+    # Interactions
+    ('speed_distance_ratio', lambda c: c['current_speed_mps'] / (c['distance_to_target_stop_m'] / 1000 + 0.1)),
+    ('delay_per_km', lambda c: c['current_delay_sec'] / (c['distance_to_target_stop_m'] / 1000 + 0.1)),
+    ('rain_speed_interaction', lambda c: c['is_raining'] * c['current_speed_mps']),
+    ('rush_delay_interaction', lambda c: c['is_rush_hour'] * c['current_delay_sec']),
+]
+
+
+class FeatureTransformer:
+    """
+    Compute every model feature in one pass into a preallocated float32 matrix.
+
+    The base columns are copied once into a column-major float32 block and
+    each derived feature is written straight into its own column of that
+    block, so no intermediate DataFrames are created. The optional
+    standardization (what scale_features does with StandardScaler) is fitted
+    on the training data and applied to the same block in place. A fitted
+    transformer holds only names and scaling statistics, so it can be
+    pickled next to the model and reused for online inference.
+
+    Parameters:
+    -----------
+    scale : bool
+        Standardize features to zero mean and unit variance
+    scale_cols : list, optional
+        Features to standardize. If None, standardizes all features.
+    """
+
+    def __init__(self, scale=False, scale_cols=None):
+        self.scale = scale
+        self.scale_cols = scale_cols
+        self.feature_names_ = BASE_FEATURES + [name for name, _ in DERIVED_FEATURES]
+        self.derived_names_ = [name for name, _ in DERIVED_FEATURES]
+        self.mean_ = None
+        self.scale_ = None
+
+    def fit(self, X):
+        """
+        Fit the scaling statistics on training data.
+
+        Parameters:
+        -----------
+        X : pd.DataFrame or dict of arrays
+            Training rows with the BASE_FEATURES columns
+
+        Returns:
+        --------
+        FeatureTransformer
+            self
+        """
+        if self.scale:
+            features = self._compute(X)
+            # accumulate in float64 so large training sets don't lose precision
+            self.mean_ = features.mean(axis=0, dtype=np.float64)
+            std = features.std(axis=0, dtype=np.float64)
+            self.scale_ = np.where(std > 0, std, 1.0)
+            if self.scale_cols is not None:
+                unscaled = ~np.isin(self.feature_names_, self.scale_cols)
+                self.mean_[unscaled] = 0.0
+                self.scale_[unscaled] = 1.0
+            self.mean_ = self.mean_.astype(np.float32)
+            self.scale_ = self.scale_.astype(np.float32)
+        return self
+
+    def transform(self, X, out=None):
+        """
+        Build the feature matrix.
+
+        Parameters:
+        -----------
+        X : pd.DataFrame or dict of arrays
+            Rows with the BASE_FEATURES columns
+        out : np.ndarray, optional
+            Preallocated float32 (n_rows, n_features) array to fill, e.g. a
+            buffer reused across inference calls
+
+        Returns:
+        --------
+        np.ndarray
+            float32 matrix with columns in feature_names_ order
+        """
+        features = self._compute(X, out)
+        if self.scale:
+            if self.mean_ is None:
+                raise ValueError("FeatureTransformer(scale=True) must be fitted before transform")
+            features -= self.mean_
+            features /= self.scale_
+        return features
+
+    def fit_transform(self, X, out=None):
+        return self.fit(X).transform(X, out)
+
+    def transform_frame(self, df, inplace=False):
+        """
+        Return df with the derived feature columns appended (float32).
+
+        Existing columns are never copied: with inplace=True they are added
+        to df itself, otherwise to a shallow copy. Base columns keep their
+        original dtype and are not scaled.
+
+        Parameters:
+        -----------
+        df : pd.DataFrame
+            DataFrame with the BASE_FEATURES columns
+        inplace : bool
+            Add the columns to df instead of a shallow copy
+
+        Returns:
+        --------
+        pd.DataFrame
+            DataFrame with all engineered features
+        """
+        features = self.transform(df)
+        out = df if inplace else df.copy(deep=False)
+        offset = len(BASE_FEATURES)
+        for j, name in enumerate(self.derived_names_):
+            out[name] = features[:, offset + j]
+        return out
+
+    def to_frame(self, X, index=None):
+        """
+        Feature matrix as a DataFrame backed by the float32 block (no copy).
+
+        Parameters:
+        -----------
+        X : pd.DataFrame or dict of arrays
+            Rows with the BASE_FEATURES columns
+        index : pd.Index, optional
+            Index for the result. Defaults to X's index for a DataFrame.
+
+        Returns:
+        --------
+        pd.DataFrame
+            Features with columns in feature_names_ order
+        """
+        if index is None and isinstance(X, pd.DataFrame):
+            index = X.index
+        return pd.DataFrame(self.transform(X), columns=self.feature_names_, index=index, copy=False)
+
+    def _compute(self, X, out=None):
+        n_rows = len(np.atleast_1d(X[BASE_FEATURES[0]]))
+        shape = (n_rows, len(self.feature_names_))
+        if out is None:
+            # column-major so that every feature column is contiguous
+            out = np.empty(shape, dtype=np.float32, order='F')
+        elif out.shape != shape or out.dtype != np.float32:
+            raise ValueError(f"out must be a float32 array of shape {shape}")
+
+        columns = {}
+        for j, name in enumerate(BASE_FEATURES):
+            out[:, j] = np.asarray(X[name])
+            columns[name] = out[:, j]
+        for j, (name, func) in enumerate(DERIVED_FEATURES, start=len(BASE_FEATURES)):
+            out[:, j] = func(columns)
+            columns[name] = out[:, j]
+        return out
+
+
+def engineer_features(df, inplace=False):
     """
     Apply all feature engineering steps.
 
+    Runs FeatureTransformer in one pass; the derived columns are float32.
+
     Parameters:
     -----------
     df : pd.DataFrame
         Raw DataFrame
+    inplace : bool
+        Append the feature columns to df itself
 
     Returns:
     --------
     pd.DataFrame
         DataFrame with all engineered features
     """
-    df = create_time_features(df)
-    df = create_day_features(df)
-    df = create_interaction_features(df)
+    return FeatureTransformer().transform_frame(df, inplace=inplace)
 
-    return df
+
+# ========================================================================
+# ID ENCODERS
+# ========================================================================
+
+# Index column -> raw id column it encodes
+INDEX_COLUMNS = {
+    'route_id_idx': 'route_id',
+    'target_stop_idx': 'stop_id',
+}
+
+# Index given to ids that were not in the training data
+UNSEEN_INDEX = -1
+
+
+def fit_index_encoders(df, columns=None):
+    """
+    Number the raw route and stop ids of the training data.
+
+    Ids are keyed by their string form and numbered in sorted order, so the
+    mapping does not depend on row order. Save the result in the model
+    bundle (save_model_bundle(..., encoders=...)) so online features use
+    the same numbering.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Training rows with the raw id columns
+    columns : dict, optional
+        Index column -> raw id column. Defaults to INDEX_COLUMNS.
+
+    Returns:
+    --------
+    dict
+        Index column -> {raw id (str): index}
+    """
+    columns = INDEX_COLUMNS if columns is None else columns
+    return {
+        index_col: {raw_id: i for i, raw_id in enumerate(sorted(df[raw_col].dropna().astype(str).unique()))}
+        for index_col, raw_col in columns.items()
+    }
+
+
+def encode_index_columns(df, encoders, columns=None):
+    """
+    Add the index columns to df from fitted encoders.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Rows with the raw id columns
+    encoders : dict
+        Output of fit_index_encoders
+    columns : dict, optional
+        Index column -> raw id column. Defaults to INDEX_COLUMNS.
+
+    Returns:
+    --------
+    pd.DataFrame
+        Copy of df with the index columns; unseen ids get UNSEEN_INDEX
+    """
+    columns = INDEX_COLUMNS if columns is None else columns
+    out = df.copy()
+    for index_col, raw_col in columns.items():
+        out[index_col] = (df[raw_col].astype(str).map(encoders[index_col])
+                          .fillna(UNSEEN_INDEX).astype(int))
+    return out
 
 
 # ========================================================================
@@ -311,7 +606,7 @@ def scale_features(X_train, X_test, feature_cols=None):
 # EVALUATION FUNCTIONS
 # ========================================================================
 
-def evaluate_model(y_true, y_pred, model_name="Model"):
+def evaluate_model(y_true, y_pred, model_name="Model", verbose=True):
     """
     Calculate and print evaluation metrics.
 
@@ -323,22 +618,26 @@ def evaluate_model(y_true, y_pred, model_name="Model"):
         Predicted values
     model_name : str
         Name of the model for display
+    verbose : bool
+        Print the metrics. Set to False to only return them (e.g. per fold
+        in cross-validation).
 
     Returns:
     --------
     dict
         Dictionary of metrics
     """
-    rmse = np.sqrt(mean_squared_error(y_true, y_pred))
-    mae = mean_absolute_error(y_true, y_pred)
-    r2 = r2_score(y_true, y_pred)
-
-    print(f"\n{model_name} Performance Metrics:")
-    print("=" * 50)
-    print(f"RMSE (Root Mean Squared Error): {rmse:.2f} seconds")
-    print(f"MAE (Mean Absolute Error):      {mae:.2f} seconds")
-    print(f"R² Score:                        {r2:.4f}")
-    print("=" * 50)
+    rmse = float(np.sqrt(mean_squared_error(y_true, y_pred)))
+    mae = float(mean_absolute_error(y_true, y_pred))
+    r2 = float(r2_score(y_true, y_pred))
+
+    if verbose:
+        print(f"\n{model_name} Performance Metrics:")
+        print("=" * 50)
+        print(f"RMSE (Root Mean Squared Error): {rmse:.2f} seconds")
+        print(f"MAE (Mean Absolute Error):      {mae:.2f} seconds")
+        print(f"R² Score:                        {r2:.4f}")
+        print("=" * 50)
 
     return {
         'rmse': rmse,
@@ -159,13 +159,13 @@ def discover(session, api_key):
     _discover_section("Stops", stops)
 
 
-def _seconds_until_service():
+def _seconds_until_service(now=None, start_hour=SERVICE_START_HOUR, end_hour=SERVICE_END_HOUR):
     """Return seconds until the next weekday service window, or 0 if in service now."""
-    now = datetime.now()
-    if now.weekday() < 5 and SERVICE_START_HOUR <= now.hour < SERVICE_END_HOUR:
+    now = now or datetime.now()
+    if now.weekday() < 5 and start_hour <= now.hour < end_hour:
         return 0
-    # Find the next weekday at SERVICE_START_HOUR
-    target = now.replace(hour=SERVICE_START_HOUR, minute=0, second=0, microsecond=0)
+    # Find the next weekday at start_hour
+    target = now.replace(hour=start_hour, minute=0, second=0, microsecond=0)
     if target <= now:
         target += timedelta(days=1)
     while target.weekday() >= 5:
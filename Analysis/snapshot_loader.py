@@ -0,0 +1,212 @@
+"""
+Unified loader for the historical bus snapshot CSVs.
+
+Every collector wrote the same eight columns (snapshot_time, vehicle_id,
+route_id, route_stop_id, vehicle_lat, vehicle_lon, vehicle_speed,
+estimated_time_arrival) but with different time encodings:
+
+    gold      bus_data/*.csv                  naive local ISO times
+    green     green_bus_data/*.csv            naive local ISO times
+    route_29  alina_polling/route_29_data.csv UTC ISO times (+00:00)
+    clough    clough_bus/clough_bus_data.csv  "YYYY-MM-DD HH:MM:SS EST" snapshots,
+                                              /Date(ms)/ ETAs
+
+load_snapshots() reads every file in parallel with explicit dtypes, parses
+each time format with one vectorized call, and returns a single frame with
+naive America/New_York timestamps (what the notebooks already use) and
+categorical ids. The result is cached on disk, keyed by the files' paths,
+sizes and mtimes, so repeat loads skip parsing entirely.
+
+Usage (from a notebook in Analysis/<dir>/):
+
+    import sys; sys.path.append("..")
+    from snapshot_loader import load_snapshots
+    df = load_snapshots(["gold"])
+"""
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+# ========================================================================
+# SOURCES AND SCHEMA
+# ========================================================================
+
+ANALYSIS_DIR = Path(__file__).resolve().parent
+CACHE_DIR = ANALYSIS_DIR / ".cache"
+LOCAL_TZ = "America/New_York"
+
+# bump when the normalized output changes so stale caches are ignored
+LOADER_VERSION = 1
+
+# source name -> (glob relative to the Analysis directory, time format)
+SOURCES = {
+    "gold": ("bus_data/*.csv", "iso_local"),
+    "green": ("green_bus_data/*.csv", "iso_local"),
+    "route_29": ("alina_polling/route_29_data.csv", "iso_utc"),
+    "clough": ("clough_bus/clough_bus_data.csv", "clough"),
+}
+
+CSV_DTYPES = {
+    "snapshot_time": "string",
+    "vehicle_id": "Int32",
+    "route_id": "Int32",
+    "route_stop_id": "Int32",
+    "vehicle_lat": "float64",
+    "vehicle_lon": "float64",
+    "vehicle_speed": "float32",
+    "estimated_time_arrival": "string",
+}
+
+CATEGORICAL_COLUMNS = ["source", "source_file", "vehicle_id", "route_id", "route_stop_id"]
+
+
+# ========================================================================
+# TIME PARSING
+# ========================================================================
+
+def _to_local_naive(times):
+    """Convert tz-aware timestamps to naive America/New_York wall time."""
+    return times.dt.tz_convert(LOCAL_TZ).dt.tz_localize(None)
+
+
+def _parse_times(df, time_format):
+    """
+    Parse snapshot_time and estimated_time_arrival in place.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Raw frame read with CSV_DTYPES
+    time_format : str
+        One of "iso_local", "iso_utc" or "clough" (see SOURCES)
+    """
+    snapshot = df["snapshot_time"]
+    eta = df["estimated_time_arrival"]
+
+    if time_format == "iso_local":
+        df["snapshot_time"] = pd.to_datetime(snapshot, format="ISO8601")
+        df["estimated_time_arrival"] = pd.to_datetime(eta, format="ISO8601")
+    elif time_format == "iso_utc":
+        df["snapshot_time"] = _to_local_naive(pd.to_datetime(snapshot, format="ISO8601", utc=True))
+        df["estimated_time_arrival"] = _to_local_naive(pd.to_datetime(eta, format="ISO8601", utc=True))
+    elif time_format == "clough":
+        # "2026-03-02 11:27:43 EST": already local wall time, drop the zone name
+        df["snapshot_time"] = pd.to_datetime(snapshot.str.slice(0, 19), format="%Y-%m-%d %H:%M:%S")
+        # "/Date(1772469009862)/": UTC epoch milliseconds
+        ms = pd.to_numeric(eta.str.extract(r"(\d+)", expand=False), errors="coerce")
+        df["estimated_time_arrival"] = _to_local_naive(pd.to_datetime(ms, unit="ms", utc=True))
+    else:
+        raise ValueError(f"Unknown time format: {time_format}")
+
+    for col in ("snapshot_time", "estimated_time_arrival"):
+        df[col] = df[col].astype("datetime64[us]")
+    return df
+
+
+# ========================================================================
+# LOADING
+# ========================================================================
+
+def _source_files(sources, root):
+    """Return [(source, path, time_format)] for every matching file."""
+    files = []
+    for source in sources:
+        if source not in SOURCES:
+            raise ValueError(f"Unknown source {source!r}; expected one of {sorted(SOURCES)}")
+        pattern, time_format = SOURCES[source]
+        files.extend((source, path, time_format) for path in sorted(root.glob(pattern)))
+    return files
+
+
+def _read_file(source, path, time_format):
+    df = pd.read_csv(path, dtype=CSV_DTYPES, usecols=list(CSV_DTYPES))
+    df = _parse_times(df, time_format)
+    df["eta_seconds"] = (
+        (df["estimated_time_arrival"] - df["snapshot_time"]).dt.total_seconds().astype("float32")
+    )
+    df.insert(0, "source", source)
+    df.insert(1, "source_file", path.name)
+    return df
+
+
+def _cache_key(files):
+    digest = hashlib.sha1(f"v{LOADER_VERSION}".encode())
+    for source, path, _ in files:
+        stat = path.stat()
+        digest.update(f"{source}|{path}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def load_snapshots(sources=None, root=None, cache_dir=CACHE_DIR, use_cache=True,
+                   drop_duplicates=True, max_workers=None):
+    """
+    Load and normalize the historical snapshot CSVs into one frame.
+
+    Parameters:
+    -----------
+    sources : list of str, optional
+        Subset of SOURCES to load (default: all)
+    root : str or Path, optional
+        Directory the SOURCES globs are relative to (default: Analysis/)
+    cache_dir : str or Path or None
+        Where normalized results are cached; None disables caching
+    use_cache : bool
+        Read from / write to the cache
+    drop_duplicates : bool
+        Drop exact duplicate rows (repeated polls of an unchanged feed)
+    max_workers : int, optional
+        Threads used to read files in parallel
+
+    Returns:
+    --------
+    pd.DataFrame
+        Columns: source, source_file, snapshot_time, vehicle_id, route_id,
+        route_stop_id, vehicle_lat, vehicle_lon, vehicle_speed,
+        estimated_time_arrival, eta_seconds. Times are naive local
+        (America/New_York); ids and source columns are categorical.
+    """
+    root = Path(root) if root is not None else ANALYSIS_DIR
+    files = _source_files(sources or list(SOURCES), root)
+    if not files:
+        raise FileNotFoundError(f"No snapshot CSVs found under {root.resolve()}")
+
+    cache_path = None
+    if use_cache and cache_dir is not None:
+        suffix = "dedup" if drop_duplicates else "raw"
+        cache_path = Path(cache_dir) / f"snapshots-{_cache_key(files)}-{suffix}.pkl"
+        if cache_path.exists():
+            return pd.read_pickle(cache_path)
+
+    workers = max_workers or min(len(files), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        frames = list(pool.map(lambda f: _read_file(*f), files))
+
+    df = pd.concat(frames, ignore_index=True)
+    if drop_duplicates:
+        df = df.drop_duplicates(ignore_index=True)
+
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = df[col].astype("category")
+
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, cache_path)
+    return df
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    snapshots = load_snapshots(use_cache=False)
+    print(f"Loaded {len(snapshots):,} rows in {time.perf_counter() - start:.2f}s")
+    print(snapshots.groupby("source", observed=True)["snapshot_time"].agg(["min", "max", "count"]))
+    print(snapshots.dtypes)
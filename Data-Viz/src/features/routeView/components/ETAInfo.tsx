@@ -57,9 +57,11 @@ const ETAInfo: React.FC<Props> = ({ predictions, selectedStopId }) => {
       {filtered.map((p) => (
         <div key={`${p.routeId}-${p.stopId}`} className={styles.etaRow}>
           <span className={styles.etaTime}>{p.eta}</span>
-          <span className={styles.delay}>
-            Delay: {p.predictedDelayMinutes} min
-          </span>
+          {p.predictedDelayMinutes !== undefined && (
+            <span className={styles.delay}>
+              Delay: {p.predictedDelayMinutes} min
+            </span>
+          )}
         </div>
       ))}
     </div>
@@ -10,14 +10,12 @@ const RouteStatsBanner: React.FC<Props> = ({ route }) => {
   const totalStops = route.stops?.length || 0;
   const busCount = route.busLocations?.length || 0;
 
-  // Compute average delay (if any predictions exist)
-  const avgDelay = route.delayPredictions?.length
-    ? Math.round(
-        route.delayPredictions.reduce(
-          (sum, p) => sum + (p.predictedDelayMinutes || 0),
-          0
-        ) / route.delayPredictions.length
-      )
+  // Compute average delay (over the predictions that have one)
+  const delays = (route.delayPredictions ?? [])
+    .map((p) => p.predictedDelayMinutes)
+    .filter((d): d is number => d !== undefined);
+  const avgDelay = delays.length
+    ? Math.round(delays.reduce((sum, d) => sum + d, 0) / delays.length)
     : 0;
 
   return (
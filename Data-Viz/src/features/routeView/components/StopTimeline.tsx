@@ -57,7 +57,8 @@ const StopTimeline: React.FC<Props> = ({
                       {prediction.eta}
                     </span>
 
-                    {prediction.predictedDelayMinutes > 0 && (
+                    {prediction.predictedDelayMinutes !== undefined &&
+                      prediction.predictedDelayMinutes > 0 && (
                       <span
                         className={
                           prediction.predictedDelayMinutes >= 2
@@ -1,7 +1,7 @@
 export interface DelayPrediction {
   routeId: string;
   stopId: string;
-  predictedDelayMinutes: number;
+  predictedDelayMinutes?: number; // omitted when the bus has no expected arrival to compare against
   eta: string; // ISO string
   confidence?: number; // confidence score 0–1
 }
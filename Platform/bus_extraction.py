@@ -1,13 +1,13 @@
 import http.client
 import ssl
 import json
-import pytz
-from datetime import datetime, timedelta
-import re
+import pandas as pd
 import psycopg2
 from dotenv import load_dotenv
 import os
 
+from pipeline.extractors.transloc_time import decode_transloc_dates
+
 # Create an unverified SSL context to bypass SSL certificate errors
 try:
     _create_unverified_https_context = ssl._create_unverified_context
@@ -45,8 +45,6 @@ CREATE TABLE IF NOT EXISTS bus_data (
 cur.execute(create_table_query)
 conn.commit()
 
-eastern = pytz.timezone('America/New_York')
-
 conn_http = http.client.HTTPSConnection("bus.gatech.edu")
 
 
@@ -78,29 +76,15 @@ vehicles = json.loads(data.decode("utf-8"))
 
 bus_data = []
 "RouteID"
-for vehicle in vehicles:
-    
-    raw_timestamp = vehicle["TimeStamp"]
-    match = re.search(r'/Date\((\d+)([+-]\d{4})\)/', raw_timestamp)
-        
-    if match:
-            
-        timestamp_ms = int(match.group(1)) 
-            
-        utc_offset = match.group(2)
-        offset_hours = int(utc_offset[:3])  
-        offset_minutes = int(utc_offset[0] + utc_offset[3:])  
-            
-        utc_time = datetime.utcfromtimestamp(timestamp_ms / 1000)
-            
-        offset = timedelta(hours=offset_hours, minutes=offset_minutes)
-        adjusted_time = utc_time + offset
-            
-
-        day = adjusted_time.replace(tzinfo=pytz.utc).astimezone(eastern).strftime('%A')
-        month = adjusted_time.replace(tzinfo=pytz.utc).astimezone(eastern).strftime('%m')
-        time = adjusted_time.replace(tzinfo=pytz.utc).astimezone(eastern).strftime('%H:%M:%S')
+# TimeStamp is "/Date(ms-0400)/"; the ms are already UTC (see transloc_time)
+timestamps = decode_transloc_dates([vehicle["TimeStamp"] for vehicle in vehicles])
+days = timestamps.dt.day_name()
+months = timestamps.dt.strftime('%m')
+times = timestamps.dt.strftime('%H:%M:%S')
+
+for vehicle, timestamp, day, month, time in zip(vehicles, timestamps, days, months, times):
 
+    if not pd.isna(timestamp):
 
         bus_data.append({
             "Latitude": vehicle["Latitude"],
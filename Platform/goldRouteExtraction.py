@@ -3,9 +3,9 @@ import ssl
 import csv
 import json
 import os
-import pytz
-from datetime import datetime, timedelta
-import re
+import pandas as pd
+
+from pipeline.extractors.transloc_time import decode_transloc_dates
 
 # Create an unverified SSL context to bypass SSL certificate errors
 try:
@@ -16,8 +16,6 @@ else:
     ssl._create_default_https_context = _create_unverified_https_context
 
 
-eastern = pytz.timezone('America/New_York')
-
 #Add the location where you wanna save the csv here!
 directory = os.path.expanduser('~/Desktop/Bus_Delay_Project/')
 file_path = os.path.join(directory, 'gold_bus_data.csv')
@@ -65,27 +63,14 @@ vehicles = json.loads(data.decode("utf-8"))
 
 route_9_data = []
 
-for vehicle in vehicles:
-    if vehicle["RouteID"] == 9:
-        raw_timestamp = vehicle["TimeStamp"]
-        match = re.search(r'/Date\((\d+)([+-]\d{4})\)/', raw_timestamp)
-        
-        if match:
-            
-            timestamp_ms = int(match.group(1)) 
-            
-            utc_offset = match.group(2)
-            offset_hours = int(utc_offset[:3])  
-            offset_minutes = int(utc_offset[0] + utc_offset[3:])  
-            
-            utc_time = datetime.utcfromtimestamp(timestamp_ms / 1000)
-            
-            offset = timedelta(hours=offset_hours, minutes=offset_minutes)
-            adjusted_time = utc_time - offset 
-            
-
-            local_time = pytz.utc.localize(adjusted_time).astimezone(eastern).strftime('%Y-%m-%d %H:%M:%S')
+route_9_vehicles = [vehicle for vehicle in vehicles if vehicle["RouteID"] == 9]
+
+# TimeStamp is "/Date(ms-0400)/"; the ms are already UTC (see transloc_time)
+timestamps = decode_transloc_dates([vehicle["TimeStamp"] for vehicle in route_9_vehicles])
+local_times = timestamps.dt.strftime('%Y-%m-%d %H:%M:%S')
 
+for vehicle, timestamp, local_time in zip(route_9_vehicles, timestamps, local_times):
+    if not pd.isna(timestamp):
 
         route_9_data.append({
             "Latitude": vehicle["Latitude"],
@@ -4,7 +4,7 @@ from dotenv import load_dotenv
 
 class Config:
     load_dotenv()
-    #pg_dsn: str = os.environ["PG_DSN"]
+    pg_dsn: str = os.environ.get("PG_DSN")  # optional: no DB writes when unset
     bus_key: str = os.environ["BUS_API_KEY"]
     weather_user_agent: str = os.environ["WEATHER_USER_AGENT"]
     traffic_key: str = os.environ["TRAFFIC_API_KEY"]
\ No newline at end of file
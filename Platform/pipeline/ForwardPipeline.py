@@ -3,40 +3,270 @@ from extractors.BusExtractor import BusExtractor
 from extractors.TrafficExtractor import TrafficExtractor
 from extractors.WeatherExtractor import WeatherExtractor
 from repository import DbRepository
+from merge_sql import MERGE_INDEX, MERGE_STATEMENTS
+from dedupe import RecentKeys
+import asyncio
 import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait as futures_wait
 from datetime import datetime, timezone
+import pandas as pd
 
 class ForwardPipeline:
-    def __init__(self, cfg: Config):
-        #self.repo = DbRepository(cfg.pg_dsn)
+    # seconds each source gets per batch before it is skipped; bus positions go
+    # stale fastest, so the bus budget is the tightest
+    EXTRACT_TIMEOUTS = {"bus": 10.0, "weather": 20.0, "traffic": 20.0}
+    STAGING_TABLES = {"bus": "staging_stop_events", "weather": "staging_weather", "traffic": "staging_traffic"}
+    MERGES = {"bus": "merge_stop_events", "weather": "merge_weather", "traffic": "merge_traffic"}
+    # natural key per source for write-time dedupe. snapshot_time is our own
+    # wall clock and differs on every retry, so bus rows are keyed on the
+    # vehicle's GPS fix time (time_of_day) instead; see merge_sql for the upsert
+    DEDUPE_KEYS = {"bus": ("bus_id", "destination_route_stop_id", "time_of_day")}
+
+    def __init__(self, cfg: Config, concurrent: bool = True, sinks: list | None = None):
+        self.repo = DbRepository(cfg.pg_dsn) if cfg.pg_dsn else None
+        if self.repo is not None:
+            self.repo.create_staging_tables()
+            if not self.repo.index_exists(MERGE_INDEX):
+                self.repo.close()
+                raise RuntimeError(f"stop_events has no {MERGE_INDEX} index for the upsert; "
+                                   "run run_pipeline.py --migrate once (see merge_sql.MERGE_DDL)")
+            for name, sql in MERGE_STATEMENTS.items():
+                self.repo.prepare(name, sql)
         self.bus = BusExtractor(base_url=os.environ["BUS_API_URL"], api_key=cfg.bus_key)
         self.weather = WeatherExtractor(base_url=os.environ["WEATHER_API_URL"], api_key="", user_agent=cfg.weather_user_agent)
         self.traffic = TrafficExtractor(base_url=os.environ["TRAFFIC_API_URL"], api_key=cfg.traffic_key)
 
-    def run_once(self, since: str | None = None):
+        self.concurrent = concurrent
+        # one worker per source: a hung HERE call can only ever hold up traffic
+        self._executors = {name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"extract-{name}") for name in self.EXTRACT_TIMEOUTS}
+        self._inflight = {}
+        # background threads delivering sources that outlived run_once(wait=False)
+        self._stragglers = []
+        self._deliver_lock = threading.Lock()
+        self.last_timings = {}
+        self.recent_keys = {name: RecentKeys() for name in self.DEDUPE_KEYS}
+        # extra outputs with write(source, batch, df) / close(), e.g. sinks.ColumnarSink
+        self.sinks = list(sinks or [])
+
+    def run_once(self, since: str | None = None, wait: bool = True) -> dict:
+        """
+        Extract one batch from every source. Each source's frame is deduped,
+        loaded and handed to the sinks as soon as its own extract returns (or
+        times out), so a slow weather or traffic call never holds up the bus
+        rows.
+
+        With wait=False the call returns as soon as the bus frame has been
+        delivered; the other sources are delivered from a background thread
+        when they finish, and the returned dict holds only the sources
+        delivered so far.
+        """
+        batch = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        sources = {
+            "bus": self.bus.extract,
+            "weather": lambda: self.weather.extract(since=since),
+            "traffic": self.traffic.extract,
+        }
+
+        if self.concurrent:
+            return self._extract_concurrent(batch, sources, wait)
+        return self._extract_sequential(batch, sources)
+
+    async def arun_once(self, since: str | None = None) -> dict:
+        """
+        run_once on the extractors' async transport: all three sources share
+        one event loop and connection pool, under the same EXTRACT_TIMEOUTS.
+        """
         batch = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        started = time.monotonic()
+        tasks = {
+            "bus": asyncio.create_task(self.bus.aextract()),
+            "weather": asyncio.create_task(self.weather.aextract(since=since)),
+            "traffic": asyncio.create_task(self.traffic.aextract()),
+        }
+
+        results = {}
+        for name, task in tasks.items():
+            remaining = self.EXTRACT_TIMEOUTS[name] - (time.monotonic() - started)
+            try:
+                results[name] = self._result(await asyncio.wait_for(task, timeout=max(0.0, remaining)), "ok", started)
+            except asyncio.TimeoutError:
+                print(f"✗ {name} extract timed out after {self.EXTRACT_TIMEOUTS[name]:.0f}s")
+                results[name] = self._result(pd.DataFrame(), "timeout", started)
+            except Exception as e:
+                print(f"✗ {name} extract failed: {e}")
+                results[name] = self._result(pd.DataFrame(), "error", started)
+            self._deliver_source(name, batch, results[name])
+
+        self._report(batch, results)
+        return {name: result["frame"] for name, result in results.items()}
+
+    async def aclose(self) -> None:
+        """Close the async sessions and the shared pool opened by arun_once."""
+        for extractor in (self.bus, self.weather, self.traffic):
+            await extractor.aclose()
+        await BusExtractor.aclose_pool()
+
+    def _deliver(self, name: str, batch: str, result: dict) -> pd.DataFrame:
+        """
+        Dedupe one source's frame, load it (its own transaction) and write it
+        to every sink. Deliveries are serialized, so sinks and the dedupe
+        state are never used from two threads at once. The rows' dedupe keys
+        are only recorded once the load has committed, so rows from a failed
+        load are not dropped as duplicates when the next tick sees them.
+        """
+        self._handle(name, batch, result["frame"])
+        with self._deliver_lock:
+            frame, keys = self._dedupe(name, result["frame"])
+            result["frame"] = frame
+            if self.repo is not None and not frame.empty:
+                self._load(name, batch, frame)
+            for sink in self.sinks:
+                try:
+                    sink.write(name, batch, frame)
+                except Exception as e:
+                    print(f"✗ {type(sink).__name__} failed to write {name}: {e}")
+            if keys:
+                self.recent_keys[name].commit(keys)
+        return frame
+
+    def _deliver_source(self, name: str, batch: str, result: dict) -> None:
+        """
+        _deliver one source of a batch. A failed load (DB down, merge error)
+        marks the source "error" instead of aborting the batch, so the other
+        sources are still delivered and the batch is reported.
+        """
+        try:
+            self._deliver(name, batch, result)
+        except Exception as e:
+            print(f"✗ {name} failed to load batch={batch}: {e}")
+            result["status"] = "error"
+
+    def _report(self, batch: str, results: dict) -> None:
+        self.last_timings = {name: {k: v for k, v in result.items() if k != "frame"} for name, result in results.items()}
+        print(f"\nbatch={batch} " + " | ".join(
+            f"{name}={t['seconds']:.2f}s {t['status']} ({t['rows']} rows)" for name, t in self.last_timings.items()
+        ))
+
+    def close(self) -> None:
+        """Finalize sinks, release DB connections and stop the extract workers."""
+        # let batches still delivering slow sources finish (each is bounded by its timeout)
+        for thread in self._stragglers:
+            thread.join(timeout=max(self.EXTRACT_TIMEOUTS.values()))
+        for sink in self.sinks:
+            sink.close()
+        if self.repo is not None:
+            self.repo.close()
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _load(self, name: str, batch: str, df: pd.DataFrame) -> None:
+        """
+        Stage one source's frame and merge it into its core table in one
+        transaction, so each source commits as soon as it lands.
+        """
+        with self.repo.batch() as db:
+            staged = db.copy_to_staging(df, self.STAGING_TABLES[name], {"source_batch": batch})
+            merged = db.merge(self.MERGES[name], batch) if staged else 0
+        print(f"batch={batch} merged {name}={merged}")
+
+    def _dedupe(self, name: str, df: pd.DataFrame) -> tuple:
+        """
+        Drop rows already written by an earlier (or retried) batch. Returns
+        the fresh rows and their keys, to commit once they are written.
+        """
+        recent = self.recent_keys.get(name)
+        if recent is None or df.empty:
+            return df, []
+        fresh, keys = recent.filter(df, self.DEDUPE_KEYS[name])
+        if len(fresh) < len(df):
+            print(f"{name}: dropped {len(df) - len(fresh)} duplicate rows")
+        return fresh.reset_index(drop=True), keys
+
+    def _extract_sequential(self, batch: str, sources: dict) -> dict:
+        results = {}
+        for name, extract in sources.items():
+            started = time.monotonic()
+            try:
+                results[name] = self._result(extract(), "ok", started)
+            except Exception as e:
+                print(f"✗ {name} extract failed: {e}")
+                results[name] = self._result(pd.DataFrame(), "error", started)
+            self._deliver_source(name, batch, results[name])
+        self._report(batch, results)
+        return {name: result["frame"] for name, result in results.items()}
+
+    def _extract_concurrent(self, batch: str, sources: dict, wait: bool = True) -> dict:
+        """
+        Run every extractor on its own worker and deliver each frame as soon
+        as it lands. A source that errors or overruns its EXTRACT_TIMEOUTS
+        budget yields an empty frame for this batch; a source still running
+        from an earlier batch is not resubmitted. With wait=False, sources
+        still running once bus is delivered are left to a background thread.
+        """
+        started = time.monotonic()
+        futures = {}
+        results = {}
+        for name, extract in sources.items():
+            pending = self._inflight.get(name)
+            if pending is not None and not pending.done():
+                results[name] = self._result(pd.DataFrame(), "busy", started)
+                self._deliver_source(name, batch, results[name])
+                continue
+            futures[name] = self._inflight[name] = self._executors[name].submit(extract)
+
+        pending = self._collect(batch, futures, results, started, until=None if wait else "bus")
+        delivered = {name: results[name]["frame"] for name in sources if name in results}
+        if pending:
+            thread = threading.Thread(target=self._collect_rest, args=(batch, pending, results, started),
+                                      name=f"deliver-{batch}", daemon=True)
+            self._stragglers = [t for t in self._stragglers if t.is_alive()] + [thread]
+            thread.start()
+        else:
+            self._report(batch, results)
+        return delivered
+
+    def _collect(self, batch: str, futures: dict, results: dict, started: float, until: str | None = None) -> dict:
+        """
+        Deliver each source in the order its extract completes or times out,
+        until the until source is delivered (or all of them). Returns the
+        futures still pending.
+        """
+        pending = dict(futures)
+        while pending and (until is None or until in pending):
+            deadlines = {name: started + self.EXTRACT_TIMEOUTS[name] for name in pending}
+            futures_wait(pending.values(), timeout=max(0.0, min(deadlines.values()) - time.monotonic()),
+                         return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for name, future in list(pending.items()):
+                if future.done():
+                    try:
+                        results[name] = self._result(future.result(), "ok", started)
+                    except Exception as e:
+                        print(f"✗ {name} extract failed: {e}")
+                        results[name] = self._result(pd.DataFrame(), "error", started)
+                elif now >= deadlines[name]:
+                    print(f"✗ {name} extract timed out after {self.EXTRACT_TIMEOUTS[name]:.0f}s")
+                    results[name] = self._result(pd.DataFrame(), "timeout", started)
+                else:
+                    continue
+                del pending[name]
+                self._deliver_source(name, batch, results[name])
+        return pending
+
+    def _collect_rest(self, batch: str, pending: dict, results: dict, started: float) -> None:
+        try:
+            self._collect(batch, pending, results, started)
+        except Exception as e:
+            print(f"✗ batch={batch} failed to deliver late sources: {e}")
+        self._report(batch, results)
+
+    def _result(self, frame: pd.DataFrame, status: str, started: float) -> dict:
+        return {"frame": frame, "status": status, "seconds": time.monotonic() - started, "rows": len(frame)}
 
-        bus_df = self.bus.extract()
-        print("\n=== BUS DATA ===")
-        print(f"batch={batch} rows={len(bus_df)}")
-        print(bus_df.head())
-        print(bus_df.dtypes)
-        #self.repo.copy_to_staging(bus_df, "staging_stop_events", {"source_batch": batch})
-
-        weather_df = self.weather.extract(since=since)
-        #self.repo.copy_to_staging(weather_df, "staging_weather", {"source_batch": batch})
-        print("\n=== WEATHER DATA ===")
-        print(f"batch={batch} rows={len(weather_df)}")
-        print(weather_df.head())
-        print(weather_df.dtypes)
-
-        traffic_df = self.traffic.extract()
-        print("\n=== TRAFFIC DATA ===")
-        print(f"batch={batch} rows={len(traffic_df)}")
-        print(traffic_df.head())
-        print(traffic_df.dtypes)
-        #self.repo.copy_to_staging(traffic_df, "staging_traffic", {"source_batch": batch})
-
-        #self.repo.merge_core(SQL_MERGE_STOP_EVENTS)
-        #self.repo.merge_core(SQL_MERGE_WEATHER)
-        #self.repo.merge_core(SQL_MERGE_TRAFFIC)
+    def _handle(self, name: str, batch: str, df: pd.DataFrame):
+        print(f"\n=== {name.upper()} DATA ===")
+        print(f"batch={batch} rows={len(df)}")
+        print(df.head())
+        print(df.dtypes)
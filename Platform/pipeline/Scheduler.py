@@ -0,0 +1,158 @@
+"""
+Scheduler.py
+Continuous collection on top of ForwardPipeline.
+
+One tick = one ForwardPipeline.run_once(), i.e. a single GetMapVehiclePoints
+fetch for the whole fleet. The bus frame is then fanned out to every
+configured route, replacing the per-route collectors (red_line_collector,
+gt_gold_bus_scraper, green_bus_scraper, alina_polling/scraper,
+cloughRouteExtraction) that each re-downloaded the full feed to keep one
+RouteID.
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+from ForwardPipeline import ForwardPipeline
+
+# route_id -> name used in output file names (ids from BusExtractor)
+DEFAULT_ROUTES = {
+    20: "red",
+    21: "blue",
+    17: "green",
+    29: "gold",
+    28: "clough",
+}
+
+POLL_INTERVAL = 15
+
+# service hours and the wait for them are the collectors' own, shared with
+# Analysis/gt_gold_bus_scraper.py rather than copied
+COLLECTOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Analysis")
+if COLLECTOR_DIR not in sys.path:
+    sys.path.append(COLLECTOR_DIR)
+
+from gt_gold_bus_scraper import SERVICE_END_HOUR, SERVICE_START_HOUR, _seconds_until_service  # noqa: E402
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt(f"signal {signum}")
+
+
+class CsvRouteWriter:
+    """
+    Default route handler: appends each route's rows to
+    <output_dir>/<route name>_bus_<YYYY-MM-DD>.csv, one file per route per day.
+    """
+    def __init__(self, output_dir: str = "route_data"):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def __call__(self, route_id: int, name: str, rows: pd.DataFrame, tick_time: datetime) -> None:
+        csv_path = self.output_dir / f"{name}_bus_{tick_time:%Y-%m-%d}.csv"
+        rows.to_csv(csv_path, mode="a", header=not csv_path.exists(), index=False)
+
+
+class Scheduler:
+    """
+    Drives a ForwardPipeline on a fixed, drift-corrected cadence.
+
+    Tick k is due at anchor + k * interval on the monotonic clock, so time
+    spent extracting never accumulates into the schedule. A tick that overruns
+    whole intervals skips the missed slots instead of firing them back to back.
+    Outside service hours the scheduler sleeps until the next window and
+    re-anchors there. SIGTERM stops it like Ctrl-C, so the caller's
+    pipeline.close() still finalizes the sinks' open files.
+    """
+    def __init__(self, pipeline: ForwardPipeline,
+                 routes: Optional[Dict[int, str]] = None,
+                 handler: Optional[Callable[[int, str, pd.DataFrame, datetime], None]] = None,
+                 interval: float = POLL_INTERVAL,
+                 start_hour: int = SERVICE_START_HOUR,
+                 end_hour: int = SERVICE_END_HOUR):
+        self.pipeline = pipeline
+        self.routes = dict(routes or DEFAULT_ROUTES)
+        self.handler = handler or CsvRouteWriter()
+        self.interval = interval
+        self.start_hour = start_hour
+        self.end_hour = end_hour
+        self.ticks = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def tick(self, tick_time: Optional[datetime] = None) -> Dict[int, int]:
+        """
+        Run one pipeline batch and fan the bus frame out to every configured
+        route. Returns {route_id: rows handed to the handler}.
+        """
+        tick_time = tick_time or datetime.now()
+        # weather and traffic finish (and load) in the background: a slow
+        # source never delays the bus rows or the next tick
+        bus_df = self.pipeline.run_once(wait=False)["bus"]
+
+        counts = {route_id: 0 for route_id in self.routes}
+        if bus_df.empty:
+            return counts
+
+        for route_id, rows in bus_df.groupby("route_id", sort=False):
+            name = self.routes.get(route_id)
+            if name is None:
+                continue
+            self.handler(route_id, name, rows, tick_time)
+            counts[route_id] = len(rows)
+        return counts
+
+    def run(self, max_ticks: Optional[int] = None) -> None:
+        print(f"Scheduling routes {self.routes} every {self.interval}s "
+              f"({self.start_hour}:00-{self.end_hour}:00 weekdays)")
+
+        anchor = time.monotonic()
+        slot = 0
+        previous = None
+        if threading.current_thread() is threading.main_thread():
+            previous = signal.signal(signal.SIGTERM, _interrupt)
+        try:
+            while max_ticks is None or self.ticks < max_ticks:
+                wait = _seconds_until_service(start_hour=self.start_hour, end_hour=self.end_hour)
+                if wait > 0:
+                    print(f"Outside service hours — sleeping {wait:.0f}s")
+                    time.sleep(wait)
+                    anchor, slot = time.monotonic(), 0
+                    continue
+
+                try:
+                    counts = self.tick()
+                    print(f"Tick #{self.ticks + 1}: " + ", ".join(
+                        f"{self.routes[route_id]}={n}" for route_id, n in counts.items()
+                    ))
+                except Exception as e:
+                    self.errors += 1
+                    print(f"✗ Tick #{self.ticks + 1} failed: {e}")
+                self.ticks += 1
+
+                slot += 1
+                now = time.monotonic()
+                due = anchor + slot * self.interval
+                if now > due:
+                    missed = int((now - due) // self.interval) + 1
+                    self.skipped += missed
+                    slot += missed
+                    print(f"Tick ran {now - due:.1f}s past its next slot — skipping {missed} slot(s)")
+                    due = anchor + slot * self.interval
+                time.sleep(max(0.0, due - now))
+
+        except KeyboardInterrupt:
+            print("\nShutting down...")
+        finally:
+            if previous is not None:
+                signal.signal(signal.SIGTERM, previous)
+
+        print(f"Finished — {self.ticks} ticks, {self.skipped} skipped slots, {self.errors} errors")
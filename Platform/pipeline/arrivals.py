@@ -0,0 +1,263 @@
+"""
+arrivals.py
+Stop arrival/departure events derived from vehicle snapshot streams.
+
+The collectors record where each bus is and what TransLoc predicts, never
+when it actually reached a stop, yet the XGBoost target
+tta_sec = t_arrival(target_stop) - snapshot_time needs exactly that.
+ArrivalDetector consumes snapshots tick by tick (or a whole CSV history in
+one call) and emits events from two signals:
+
+  geofence  the bus enters a circle of radius_m around one of its route's
+            stops (arrival), then leaves exit_radius_m (departure, stamped
+            with the last snapshot still inside; the wider exit circle keeps
+            GPS jitter at the stop from splitting one dwell into several)
+  eta       the predicted ETA to the target stop drops to eta_zero_s, or the
+            target stop changes, meaning the previous target was passed; the
+            arrival is stamped at the predicted time, capped at the snapshot
+            that revealed it
+
+Whichever signal fires first wins; later arrivals at the same stop are
+suppressed for rearm_s so one visit yields one arrival. Per-vehicle state is
+a few scalars plus the stops arrived at within rearm_s, vehicles silent for
+stale_after_s are dropped, and at most max_vehicles are tracked.
+
+Snapshots may use BusExtractor's columns (bus_id, latitude, longitude,
+destination_route_stop_id, eta_to_stop seconds) or the CSV collectors'
+(vehicle_id, vehicle_lat, vehicle_lon, route_stop_id,
+estimated_time_arrival). Stops come from BusExtractor.get_route_stops().
+
+ArrivalDetector also has the sink interface (write/close), so it can be
+passed to ForwardPipeline(sinks=[...]); its events then go to on_events.
+"""
+
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+GEOFENCE_RADIUS_M = 40.0
+EXIT_RADIUS_M = 80.0
+ETA_ZERO_S = 15
+REARM_S = 300
+STALE_AFTER_S = 900
+MAX_VEHICLES = 1_000
+
+EARTH_RADIUS_M = 6_371_000.0
+
+EVENT_COLUMNS = ["vehicle_id", "route_id", "route_stop_id", "event", "event_time", "source"]
+
+# snapshot column -> normalized name, for both snapshot layouts
+_ALIASES = {
+    "bus_id": "vehicle_id",
+    "latitude": "lat",
+    "vehicle_lat": "lat",
+    "longitude": "lon",
+    "vehicle_lon": "lon",
+    "destination_route_stop_id": "route_stop_id",
+}
+
+
+def normalize_snapshots(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per (vehicle, snapshot): vehicle_id, route_id, snapshot_time,
+    lat, lon, route_stop_id (the target stop) and eta_s. Multi-stop CSV
+    rows are reduced to the stop with the smallest ETA.
+    """
+    out = df.rename(columns={k: v for k, v in _ALIASES.items() if k in df.columns})
+    out["snapshot_time"] = pd.to_datetime(out["snapshot_time"], format="mixed")
+    if "eta_to_stop" in out.columns:
+        out["eta_s"] = pd.to_numeric(out["eta_to_stop"], errors="coerce")
+    elif "estimated_time_arrival" in out.columns:
+        eta_time = pd.to_datetime(out["estimated_time_arrival"], format="mixed", errors="coerce")
+        out["eta_s"] = (eta_time - out["snapshot_time"]).dt.total_seconds()
+    else:
+        out["eta_s"] = np.nan
+
+    out = out[["vehicle_id", "route_id", "snapshot_time", "lat", "lon", "route_stop_id", "eta_s"]]
+    out = out.sort_values(["snapshot_time", "vehicle_id", "eta_s"], na_position="last", kind="stable")
+    return out.drop_duplicates(["vehicle_id", "snapshot_time"]).reset_index(drop=True)
+
+
+def nearest_stops(snapshots: pd.DataFrame, stops: pd.DataFrame, radius_m: float = GEOFENCE_RADIUS_M) -> np.ndarray:
+    """
+    For each normalized snapshot, the route_stop_id of the closest stop on
+    its route within radius_m, or NaN. Distances use an equirectangular
+    approximation, which is exact to centimetres at geofence scale.
+    """
+    result = np.full(len(snapshots), np.nan)
+    if snapshots.empty or stops.empty:
+        return result
+
+    lat = np.radians(snapshots["lat"].to_numpy(dtype=float))
+    lon = np.radians(snapshots["lon"].to_numpy(dtype=float))
+    route_ids = snapshots["route_id"].to_numpy()
+
+    for route_id, route_stops in stops.groupby("route_id", sort=False):
+        rows = np.flatnonzero(route_ids == route_id)
+        if rows.size == 0:
+            continue
+        stop_lat = np.radians(route_stops["latitude"].to_numpy(dtype=float))
+        stop_lon = np.radians(route_stops["longitude"].to_numpy(dtype=float))
+
+        dy = lat[rows, None] - stop_lat[None, :]
+        dx = (lon[rows, None] - stop_lon[None, :]) * np.cos(lat[rows, None])
+        dist = EARTH_RADIUS_M * np.hypot(dx, dy)
+
+        nearest = dist.argmin(axis=1)
+        inside = dist[np.arange(rows.size), nearest] <= radius_m
+        result[rows[inside]] = route_stops["route_stop_id"].to_numpy(dtype=float)[nearest[inside]]
+    return result
+
+
+class _VehicleState:
+    __slots__ = ("last_time", "in_stop", "last_inside", "target", "target_eta", "target_time", "arrived")
+
+    def __init__(self):
+        self.last_time = None
+        self.in_stop = None
+        self.last_inside = None
+        self.target = None
+        self.target_eta = None
+        self.target_time = None
+        # stop -> time of its last arrival, only kept for rearm_s
+        self.arrived = {}
+
+
+class ArrivalDetector:
+    """
+    Incremental arrival/departure detection with bounded per-vehicle state.
+    update() takes the next snapshots (any number of ticks, in any order
+    within the call) and returns the events they complete.
+    """
+    def __init__(self, stops: pd.DataFrame,
+                 radius_m: float = GEOFENCE_RADIUS_M,
+                 exit_radius_m: float = EXIT_RADIUS_M,
+                 eta_zero_s: float = ETA_ZERO_S,
+                 rearm_s: float = REARM_S,
+                 stale_after_s: float = STALE_AFTER_S,
+                 max_vehicles: int = MAX_VEHICLES,
+                 on_events: Optional[Callable[[pd.DataFrame], None]] = None):
+        self.stops = stops.dropna(subset=["latitude", "longitude"])
+        self.radius_m = radius_m
+        self.exit_radius_m = max(exit_radius_m, radius_m)
+        self.eta_zero = pd.Timedelta(seconds=eta_zero_s)
+        self.rearm = pd.Timedelta(seconds=rearm_s)
+        self.stale_after = pd.Timedelta(seconds=stale_after_s)
+        self.max_vehicles = max_vehicles
+        self.on_events = on_events
+        self._vehicles: "OrderedDict[object, _VehicleState]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._vehicles)
+
+    def update(self, snapshots: pd.DataFrame) -> pd.DataFrame:
+        if snapshots.empty:
+            return pd.DataFrame(columns=EVENT_COLUMNS)
+
+        snaps = normalize_snapshots(snapshots)
+        entered = nearest_stops(snaps, self.stops, self.radius_m)
+        near = nearest_stops(snaps, self.stops, self.exit_radius_m)
+        etas = pd.to_timedelta(snaps["eta_s"], unit="s")
+
+        events: List[tuple] = []
+        for row, enter_stop, near_stop, eta in zip(snaps.itertuples(index=False), entered, near, etas):
+            self._step(row, None if np.isnan(enter_stop) else enter_stop,
+                       None if np.isnan(near_stop) else near_stop, eta, events)
+
+        self._evict(snaps["snapshot_time"].max())
+        events = pd.DataFrame(events, columns=EVENT_COLUMNS)
+        return events.astype({"route_stop_id": "Int64"}) if not events.empty else events
+
+    def _state(self, vehicle_id, now) -> _VehicleState:
+        state = self._vehicles.get(vehicle_id)
+        if state is None or (state.last_time is not None and now - state.last_time > self.stale_after):
+            # a gap this long says nothing about what happened in between
+            state = self._vehicles[vehicle_id] = _VehicleState()
+        self._vehicles.move_to_end(vehicle_id)
+        return state
+
+    def _arrive(self, state, row, stop, when, source, events) -> None:
+        state.arrived = {s: t for s, t in state.arrived.items() if when - t < self.rearm}
+        if stop in state.arrived:
+            return
+        state.arrived[stop] = when
+        events.append((row.vehicle_id, row.route_id, stop, "arrival", when, source))
+
+    def _step(self, row, enter_stop, near_stop, eta, events) -> None:
+        now = row.snapshot_time
+        state = self._state(row.vehicle_id, now)
+
+        # geofence: entering a stop circle is an arrival, leaving its exit
+        # circle a departure
+        fence_stop = state.in_stop if state.in_stop is not None and near_stop == state.in_stop else enter_stop
+        if fence_stop != state.in_stop:
+            if state.in_stop is not None:
+                events.append((row.vehicle_id, row.route_id, state.in_stop, "departure", state.last_inside, "geofence"))
+            if fence_stop is not None:
+                self._arrive(state, row, fence_stop, now, "geofence", events)
+            state.in_stop = fence_stop
+        if fence_stop is not None:
+            state.last_inside = now
+
+        # eta: the previous target was passed, or the prediction hit zero
+        target = None if pd.isna(row.route_stop_id) else row.route_stop_id
+        if target is not None:
+            if state.target is not None and target != state.target and state.target_eta is not None:
+                predicted = state.target_time + state.target_eta
+                self._arrive(state, row, state.target, min(max(predicted, state.target_time), now), "eta", events)
+            elif target == state.target and not pd.isna(eta) and eta <= self.eta_zero:
+                self._arrive(state, row, target, now + max(eta, pd.Timedelta(0)), "eta", events)
+            state.target = target
+            state.target_eta = None if pd.isna(eta) else eta
+            state.target_time = now
+
+        state.last_time = now
+
+    def _evict(self, now) -> None:
+        while self._vehicles:
+            vehicle_id, state = next(iter(self._vehicles.items()))
+            if len(self._vehicles) > self.max_vehicles or now - state.last_time > self.stale_after:
+                self._vehicles.popitem(last=False)
+            else:
+                break
+
+    # sink interface for ForwardPipeline(sinks=[...])
+    def write(self, source: str, batch: str, df: pd.DataFrame) -> None:
+        if source != "bus" or df.empty:
+            return
+        events = self.update(df)
+        if not events.empty and self.on_events is not None:
+            self.on_events(events)
+
+    def close(self) -> None:
+        self._vehicles.clear()
+
+
+def label_time_to_arrival(snapshots: pd.DataFrame, events: pd.DataFrame,
+                          max_horizon_s: float = 3600) -> pd.DataFrame:
+    """
+    Attach the actual arrival at each snapshot's target stop: the vehicle's
+    next arrival event at that stop after snapshot_time (within
+    max_horizon_s). Adds arrival_time and tta_sec to normalize_snapshots().
+    """
+    snaps = normalize_snapshots(snapshots).dropna(subset=["route_stop_id"])
+    arrivals = events[events["event"] == "arrival"][["vehicle_id", "route_stop_id", "event_time"]]
+    arrivals = arrivals.rename(columns={"event_time": "arrival_time"})
+
+    key_types = {"vehicle_id": "int64", "route_stop_id": "float64"}
+    snaps = snaps.astype(key_types).sort_values("snapshot_time")
+    arrivals = arrivals.astype(key_types)
+    arrivals = arrivals.assign(arrival_time=pd.to_datetime(arrivals["arrival_time"]).astype(snaps["snapshot_time"].dtype))
+    arrivals = arrivals.sort_values("arrival_time")
+
+    labeled = pd.merge_asof(
+        snaps, arrivals,
+        left_on="snapshot_time", right_on="arrival_time",
+        by=["vehicle_id", "route_stop_id"],
+        direction="forward",
+        tolerance=pd.Timedelta(seconds=max_horizon_s),
+    )
+    labeled["tta_sec"] = (labeled["arrival_time"] - labeled["snapshot_time"]).dt.total_seconds()
+    return labeled
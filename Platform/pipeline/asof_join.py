@@ -0,0 +1,280 @@
+"""
+asof_join.py
+Point-in-time joins of weather and traffic onto bus snapshots.
+
+ForwardPipeline emits bus, weather and traffic frames at different
+cadences (and WeatherExtractor serves a cached forecast for up to 15
+minutes), so a training row has to be given what was known at its
+snapshot_time and nothing later:
+
+  attach_weather    the latest weather row fetched at or before each
+                    snapshot (a backward as-of match). Rows are matched on
+                    their fetch time, not the forecast period's
+                    recorded_at, which can lie ahead of the fetch.
+  attach_incidents  the number of incidents active at each snapshot
+                    (start_time <= t < end_time), and optionally, per route,
+                    how many touch the snapshot's route and how many metres
+                    of it they cover (incident_overlap.OverlapEngine ranges).
+                    An incident only counts from when it was first fetched,
+                    even if HERE backdates its start_time.
+
+HERE revises an incident between fetches (most often it extends end_time),
+so incident_intervals splits each incident into segments, one per run of
+fetches that agree on its end_time, closure and geometry: a fetch's values
+apply from that fetch until the next revision, never to earlier snapshots.
+An incident's segments do not overlap in time, so summing them still counts
+the incident once. HERE drops cleared incidents from its feed, so an
+incident's last segment also ends at the first later fetch it is missing
+from (or INCIDENT_MAX_GAP_S after its last fetch, when no later fetch is
+known), whatever its end_time says.
+
+Active counts come from interval endpoints rather than a scan: with starts
+and ends sorted once, active(t) = #(start <= t) - #(end <= t), two
+searchsorted calls for all snapshots. Route metres are the union of the
+active incidents' ranges along the route, computed once for each period
+between consecutive segment endpoints and looked up per snapshot. All
+times are compared as naive America/New_York wall clock, the collectors'
+snapshot_time.
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from extractors.transloc_time import LOCAL_TZ
+from feature_store import RAIN_CONDITIONS, RAIN_PROBABILITY
+from incident_overlap import _union_length
+
+WEATHER_MAX_AGE_S = 7_200
+WEATHER_COLUMNS = ["temperature", "precipitation_probability", "wind_speed", "conditions"]
+
+# fields that identify one incident across the ticks that re-fetch it
+INCIDENT_KEY = ["type", "start_time", "comment"]
+# fields HERE may revise between fetches; each revision starts a new segment
+INCIDENT_REVISED = ["end_time", "is_road_closed", "polylines"]
+# an incident no later fetch is known for counts as cleared this long after
+# its last fetch
+INCIDENT_MAX_GAP_S = 900
+INTERVAL_COLUMNS = INCIDENT_KEY + INCIDENT_REVISED + ["first_seen", "active_from", "active_until", "incident"]
+
+
+def _local_time(value, tz: str):
+    stamp = pd.Timestamp(value)
+    return stamp.tz_convert(tz).tz_localize(None) if stamp.tzinfo is not None else stamp
+
+
+def local_times(values, tz: str = LOCAL_TZ) -> pd.Series:
+    """
+    Parse timestamps to naive local wall clock: offset-aware values are
+    converted to tz, naive values are taken as already local.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        parsed = values
+    else:
+        try:
+            parsed = pd.to_datetime(values, format="ISO8601")
+        except (ValueError, TypeError):
+            try:
+                parsed = pd.to_datetime(values, format="mixed", errors="coerce")
+            except ValueError:
+                # mixed offsets, or aware and naive values together
+                parsed = pd.to_datetime(values.map(lambda v: _local_time(v, tz) if pd.notna(v) else pd.NaT))
+    if parsed.dtype == object:
+        parsed = pd.to_datetime(parsed.map(lambda v: _local_time(v, tz) if pd.notna(v) else pd.NaT))
+    if parsed.dt.tz is not None:
+        parsed = parsed.dt.tz_convert(tz).dt.tz_localize(None)
+    return parsed.astype("datetime64[ns]")
+
+
+def attach_weather(snapshots: pd.DataFrame, weather: pd.DataFrame,
+                   time_col: str = "snapshot_time",
+                   weather_time_col: str = "snapshot_time",
+                   max_age_s: Optional[float] = WEATHER_MAX_AGE_S) -> pd.DataFrame:
+    """
+    snapshots plus the WEATHER_COLUMNS, is_raining and weather_age_s of the
+    latest weather row fetched at or before each snapshot (NaN when there
+    is none within max_age_s). Row order and index are preserved.
+    """
+    right = weather[[c for c in WEATHER_COLUMNS if c in weather.columns]].assign(
+        _weather_time=local_times(weather[weather_time_col]).to_numpy(),
+    ).dropna(subset=["_weather_time"]).sort_values("_weather_time", kind="stable").reset_index(drop=True)
+
+    # the rain rule runs once per weather row, not once per snapshot
+    conditions = right["conditions"] if "conditions" in right else pd.Series(np.nan, index=right.index)
+    probability = (pd.to_numeric(right["precipitation_probability"], errors="coerce")
+                   if "precipitation_probability" in right else pd.Series(np.nan, index=right.index))
+    right["is_raining"] = ((conditions.astype(str).str.contains(RAIN_CONDITIONS) & conditions.notna())
+                           | (probability >= RAIN_PROBABILITY)).astype(float)
+
+    # backward as-of match: the last weather row with _weather_time <= t. Only
+    # the (small) weather side is sorted, snapshots keep their order.
+    times = local_times(snapshots[time_col]).to_numpy()
+    weather_times = right["_weather_time"].to_numpy()
+    match = np.searchsorted(weather_times, times, side="right") - 1
+    age = ((times - weather_times[np.maximum(match, 0)]) / np.timedelta64(1, "s")
+           if len(right) else np.full(len(times), np.nan))
+    found = (match >= 0) & ~np.isnat(times)
+    if max_age_s is not None:
+        found &= age <= max_age_s
+
+    take = np.where(found, match, -1)
+    out = snapshots.copy()
+    for col in WEATHER_COLUMNS + ["is_raining"]:
+        if col in right:
+            out[col] = right[col].array.take(take, allow_fill=True)
+    out["weather_age_s"] = np.where(found, age, np.nan)
+    return out
+
+
+def _row_codes(fields: pd.DataFrame) -> np.ndarray:
+    """An integer per row, equal for rows whose fields are equal (missing values included)."""
+    as_text = {name: column.astype(object).where(column.notna(), "").astype(str)
+               for name, column in fields.items()}
+    if not as_text:
+        return np.zeros(len(fields), dtype=int)
+    return pd.DataFrame(as_text).groupby(list(as_text), sort=False).ngroup().to_numpy()
+
+
+def incident_intervals(incidents: pd.DataFrame, max_gap_s: float = INCIDENT_MAX_GAP_S) -> pd.DataFrame:
+    """
+    Point-in-time activity of each incident across ticks: one row per
+    segment, a run of fetches with the same INCIDENT_REVISED values, with
+    those values as fetched. first_seen is when the incident was first
+    fetched; a segment is active from max(start_time, its first fetch)
+    (active_from) until the earlier of its end_time and the next revision
+    (active_until), all naive local. The last segment ends by the first
+    later fetch (any row's snapshot_time) the incident is missing from, and
+    at most max_gap_s after the incident's last fetch. Segments already over
+    when fetched are dropped. incident numbers the distinct incidents and is
+    shared by their segments; OverlapEngine ranges built from this frame
+    refer to its rows.
+    """
+    if incidents.empty:
+        return pd.DataFrame(columns=INTERVAL_COLUMNS)
+    revised = [c for c in INCIDENT_REVISED if c in incidents.columns]
+    frame = incidents.assign(
+        _seen=local_times(incidents["snapshot_time"]).to_numpy(),
+        _key=_row_codes(incidents[INCIDENT_KEY]),
+        _values=_row_codes(incidents[revised]),
+    ).dropna(subset=["_seen"]).sort_values(["_key", "_seen"], kind="stable")
+    if frame.empty:
+        return pd.DataFrame(columns=INTERVAL_COLUMNS)
+
+    key = frame["_key"].to_numpy()
+    values = frame["_values"].to_numpy()
+    new_key = np.concatenate([[True], key[1:] != key[:-1]])
+    revision = new_key | np.concatenate([[True], values[1:] != values[:-1]])
+
+    seen = frame["_seen"].to_numpy()
+    first_seen = frame["_seen"].where(new_key).ffill().to_numpy()
+    segments = frame[revision].drop(columns=["_values"])
+    # a segment lasts until the next revision of the same incident
+    revised_at = seen[revision]
+    last_of_key = np.concatenate([new_key[revision][1:], [True]])
+    # ... and the last one until the incident drops out of the feed
+    fetches = np.unique(seen)
+    last_seen = seen[np.concatenate([new_key[1:], [True]])]
+    later = np.searchsorted(fetches, last_seen, side="right")
+    cleared_at = last_seen + np.timedelta64(int(max_gap_s * 1e9), "ns")
+    cleared_at = np.where(later < len(fetches), np.minimum(fetches[np.minimum(later, len(fetches) - 1)], cleared_at),
+                          cleared_at)
+    next_revision = np.roll(revised_at, -1)
+    next_revision[last_of_key] = cleared_at
+
+    start = local_times(segments["start_time"]).to_numpy()
+    end = local_times(segments["end_time"]).to_numpy() if "end_time" in segments else np.full(len(segments), np.datetime64("NaT"), "datetime64[ns]")
+    active_from = np.where(np.isnat(start) | (start < revised_at), revised_at, start)
+    active_until = np.where(np.isnat(end) | (~np.isnat(next_revision) & (next_revision < end)), next_revision, end)
+
+    segments = segments.assign(
+        first_seen=first_seen[revision],
+        active_from=active_from.astype("datetime64[ns]"),
+        active_until=active_until.astype("datetime64[ns]"),
+        incident=pd.factorize(segments["_key"])[0],
+    )
+    live = np.isnat(segments["active_until"].to_numpy()) | (segments["active_until"] > segments["active_from"]).to_numpy()
+    segments = segments[live].sort_values(["first_seen", "incident", "active_from"], kind="stable")
+    # renumber so incidents are numbered in the order they were first fetched
+    segments["incident"] = pd.factorize(segments["incident"])[0]
+    return segments.drop(columns=["_seen", "_key"]).reset_index(drop=True)
+
+
+def _active(times: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    For each time, the number of intervals with start <= t < end, from
+    sorted endpoints and two searchsorted calls.
+    """
+    return (np.searchsorted(np.sort(starts), times, side="right")
+            - np.searchsorted(np.sort(ends), times, side="right"))
+
+
+def _route_coverage(times: np.ndarray, starts: np.ndarray, ends: np.ndarray, ranges: pd.DataFrame,
+                    incident: np.ndarray):
+    """
+    Distinct incidents and union metres of one route's ranges (rows of
+    segment starts/ends) at each time. The segment endpoints cut time into
+    periods with a fixed active set; each range is repeated into the
+    periods its segment covers and measured per period.
+    """
+    segment = ranges["incident"].to_numpy()
+    seg_start, seg_end = starts[segment], ends[segment]
+    bounds = np.unique(np.concatenate([seg_start, seg_end]))
+    first = np.searchsorted(bounds, seg_start)
+    count = np.searchsorted(bounds, seg_end) - first
+    period = np.repeat(first - (np.cumsum(count) - count), count) + np.arange(count.sum())
+    rows = np.repeat(np.arange(len(ranges)), count)
+
+    metres = _union_length(period, ranges["start_m"].to_numpy(float)[rows],
+                           ranges["end_m"].to_numpy(float)[rows], len(bounds))
+    distinct = pd.DataFrame({"period": period, "incident": incident[segment][rows]}).drop_duplicates()
+    active = np.bincount(distinct["period"].to_numpy(), minlength=len(bounds))
+
+    at = np.searchsorted(bounds, times, side="right") - 1
+    found = at >= 0
+    at = np.maximum(at, 0)
+    return np.where(found, active[at], 0), np.where(found, metres[at], 0.0)
+
+
+def attach_incidents(snapshots: pd.DataFrame, incidents: pd.DataFrame,
+                     ranges: Optional[pd.DataFrame] = None,
+                     time_col: str = "snapshot_time",
+                     route_col: str = "route_id") -> pd.DataFrame:
+    """
+    snapshots plus active_incidents and active_closures at each snapshot.
+
+    incidents is TrafficExtractor output over any number of ticks (or
+    incident_intervals() of it). ranges, OverlapEngine.intervals() run on
+    incident_intervals(), places each segment on the routes it covers and
+    adds route_active_incidents and route_affected_m (metres of the route
+    under any active incident, counted once) for each snapshot's own route.
+    Row order and index are preserved.
+    """
+    intervals = incidents if "active_from" in incidents.columns else incident_intervals(incidents)
+    times = local_times(snapshots[time_col]).to_numpy().astype("int64")
+    out = snapshots.copy()
+
+    never = np.iinfo(np.int64).max
+    starts = intervals["active_from"].to_numpy(dtype="datetime64[ns]").astype("int64")
+    ends = intervals["active_until"].to_numpy(dtype="datetime64[ns]")
+    ends = np.where(np.isnat(ends), never, ends.astype("int64"))
+    closed = (intervals["is_road_closed"].fillna(False).astype(bool).to_numpy()
+              if "is_road_closed" in intervals else np.zeros(len(intervals), dtype=bool))
+
+    out["active_incidents"] = _active(times, starts, ends).astype(int)
+    out["active_closures"] = _active(times, starts[closed], ends[closed]).astype(int)
+
+    if ranges is not None:
+        route_ids = snapshots[route_col].to_numpy()
+        route_active = np.zeros(len(snapshots), dtype=int)
+        route_metres = np.zeros(len(snapshots))
+        incident = intervals["incident"].to_numpy() if "incident" in intervals else np.arange(len(intervals))
+        for route_id, route_ranges in ranges.groupby("route_id", sort=False):
+            rows = np.flatnonzero(route_ids == route_id)
+            if rows.size:
+                route_active[rows], route_metres[rows] = _route_coverage(
+                    times[rows], starts, ends, route_ranges, incident)
+        out["route_active_incidents"] = route_active
+        out["route_affected_m"] = route_metres
+    return out
@@ -1,3 +1,5 @@
+import asyncio
+import weakref
 import requests
 from typing import Optional, Dict, Any, List
 import pandas as pd
@@ -6,19 +8,76 @@ class ABCBaseExtractor:
     """
     Abstract base class for data extrators (bus, weather, traffic).
     Handles HTTP setup and Dataframe conversion
+
+    Every extractor has a blocking path (_get / extract) on a requests.Session
+    and an async path (_aget / aextract) on aiohttp. All extractors running on
+    the same event loop share one bounded aiohttp connection pool, so many
+    in-flight requests are multiplexed on the loop instead of a thread each.
     """
+    REQUEST_TIMEOUT = 15    # seconds per request, sync and async
+    MAX_CONNECTIONS = 32    # open connections in the shared async pool
+
+    # event loop -> aiohttp.TCPConnector shared by every extractor on that loop
+    _connectors = weakref.WeakKeyDictionary()
+
     def __init__(self, base_url: str, api_key: str):
         self.base_url = base_url
         self.api_key = api_key
         self.session = requests.Session()
+        self._async_session = None
+        self._async_loop = None
+
+    def _url(self, endpoint: str) -> str:
+        return f"{self.base_url}/{endpoint.lstrip('/')}"
 
     def _get(self, endpoint: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
-        url = f"{self.base_url}/{endpoint.lstrip('/')}"
-        response = self.session.get(url, params=params, headers=headers)
+        url = self._url(endpoint)
+        response = self.session.get(url, params=params, headers=headers, timeout=self.REQUEST_TIMEOUT)
         return response.json()
-    
-    def extract(self) -> pd.DataFrame:
-        raise NotImplementedError("Subclasses must implement extract()")
 
+    async def _aget(self, endpoint: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        session = self._get_async_session()
+        query = {k: str(v) for k, v in (params or {}).items()}
+        async with session.get(self._url(endpoint), params=query, headers=headers) as response:
+            return await response.json(content_type=None)
+
+    def _get_async_session(self):
+        import aiohttp
 
+        loop = asyncio.get_running_loop()
+        if self._async_session is None or self._async_session.closed or self._async_loop is not loop:
+            connector = ABCBaseExtractor._connectors.get(loop)
+            if connector is None or connector.closed:
+                connector = aiohttp.TCPConnector(limit=self.MAX_CONNECTIONS)
+                ABCBaseExtractor._connectors[loop] = connector
+
+            # carry over headers set on the sync session (e.g. weather.gov's User-Agent)
+            defaults = requests.utils.default_headers()
+            headers = {k: v for k, v in self.session.headers.items() if defaults.get(k) != v}
+
+            self._async_session = aiohttp.ClientSession(
+                connector=connector,
+                connector_owner=False,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=self.REQUEST_TIMEOUT),
+            )
+            self._async_loop = loop
+        return self._async_session
+
+    async def aclose(self) -> None:
+        if self._async_session is not None and not self._async_session.closed:
+            await self._async_session.close()
+        self._async_session = None
+
+    @staticmethod
+    async def aclose_pool() -> None:
+        """Close the shared connection pool of the running event loop."""
+        connector = ABCBaseExtractor._connectors.pop(asyncio.get_running_loop(), None)
+        if connector is not None:
+            await connector.close()
+
+    def extract(self) -> pd.DataFrame:
+        raise NotImplementedError("Subclasses must implement extract()")
 
+    async def aextract(self) -> pd.DataFrame:
+        raise NotImplementedError("Subclasses must implement aextract()")
@@ -1,8 +1,8 @@
 from .BaseExtractor import ABCBaseExtractor as BaseExtractor
+from .transloc_time import decode_transloc_dates
+import asyncio
 import pandas as pd
-from datetime import datetime, time, timedelta
-import pytz
-import re
+from datetime import datetime
 
 """
 Route Ids
@@ -18,79 +18,144 @@ Nara/Science SQ: 22
 """
 class BusExtractor(BaseExtractor):
 
-    def __init__(self, base_url: str, api_key:str):
+    # GetVehicleRouteStopEstimates accepts a comma-joined vehicleIdStrings, so
+    # ETAs for the whole fleet are fetched in chunks of this many vehicles
+    ETA_BATCH_SIZE = 25
+
+    VEHICLES_ENDPOINT = "/Services/JSONPRelay.svc/GetMapVehiclePoints?"
+    ESTIMATES_ENDPOINT = "/Services/JSONPRelay.svc/GetVehicleRouteStopEstimates?"
+    CAPACITIES_ENDPOINT = "/Services/JSONPRelay.svc/GetVehicleCapacities"
+    STOPS_ENDPOINT = "/Services/JSONPRelay.svc/GetMapStopPoints"
+    ROUTES_ENDPOINT = "/Services/JSONPRelay.svc/GetRoutesForMapWithScheduleWithEncodedLine"
+
+    def __init__(self, base_url: str, api_key:str, batch_etas: bool = True):
         super().__init__(base_url, api_key)
+        self.batch_etas = batch_etas
     
     def get_bus_data(self):
-        endpoint = "/Services/JSONPRelay.svc/GetMapVehiclePoints?"
-        params = {
+        vehicles = self._get(self.VEHICLES_ENDPOINT, params=self._vehicle_params())
+        bus_data = self._parse_vehicles(vehicles)
+
+        if self.batch_etas:
+            stop_info = self.get_stop_info_batch(list(bus_data))
+        else:
+            stop_info = {bus_id: self.get_stop_info(bus_id) for bus_id in bus_data}
+
+        # one fleet-wide capacity snapshot per tick, joined on VehicleID
+        capacity_info = self.get_capacity_info() if bus_data else {}
+
+        return self._join(bus_data, stop_info, capacity_info)
+
+    async def aget_bus_data(self):
+        """
+        Async get_bus_data: the ETA requests (one per chunk, or one per vehicle
+        with batch_etas=False) and the capacity snapshot are all in flight at once.
+        """
+        vehicles = await self._aget(self.VEHICLES_ENDPOINT, params=self._vehicle_params())
+        bus_data = self._parse_vehicles(vehicles)
+        if not bus_data:
+            return []
+
+        if self.batch_etas:
+            eta_params = self._batch_eta_params(list(bus_data))
+        else:
+            eta_params = [{"vehicleIdStrings": bus_id} for bus_id in bus_data]
+
+        *eta_responses, capacities = await asyncio.gather(
+            *(self._aget(self.ESTIMATES_ENDPOINT, params=params) for params in eta_params),
+            self._aget(self.CAPACITIES_ENDPOINT, params={}),
+        )
+
+        stop_info = {}
+        for response in eta_responses:
+            stop_info.update(self._parse_stop_info(response))
+
+        return self._join(bus_data, stop_info, self._parse_capacity_info(capacities))
+
+    def _vehicle_params(self):
+        return {
             "apiKey": self.api_key,
             "isPublicMap": "true"
         }
-        
-        vehicles = self._get(endpoint, params=params)
-        
-        bus_data = {}
-        
-        for vehicle in vehicles:
-            raw_timestamp = vehicle["TimeStamp"]
-            match = re.search(r'/Date\((\d+)([+-]\d{4})\)/', raw_timestamp)
-            
-            if not match:
-                continue
-            
-            timestamp_ms = int(match.group(1))
-            utc_offset = match.group(2)
-            offset_hours = int(utc_offset[:3])
-            offset_minutes = int(utc_offset[0] + utc_offset[3:])
-            
-            utc_time = datetime.fromtimestamp(timestamp_ms / 1000, tz=pytz.utc)
-            offset = timedelta(hours=offset_hours, minutes=offset_minutes)
-            adjusted_time = utc_time + offset
-            timestamp = adjusted_time.astimezone(pytz.timezone('America/New_York'))
-            
-            bus_id = vehicle["VehicleID"]
-            route_id = vehicle["RouteID"]
-            latitude = vehicle["Latitude"]
-            longitude = vehicle["Longitude"]
-            day_of_week = timestamp.strftime('%A')
-            month = timestamp.strftime('%m')
-            time_of_day = timestamp.strftime('%H:%M:%S')
-            bus_speed = vehicle["GroundSpeed"]
-            
-            destination_route_stop_id, eta_to_stop = self.get_stop_info(bus_id)
-            #api call may return an eta where eta < t_o_d, in which we symbol with 0 to show bus already arrived or passed stop
-            #this only matters when keeping eta as a timestamp
-            # if eta_to_stop < time_of_day:
-            #     eta_to_stop = 0
-            
-            bus_data[bus_id] = {
-                "bus_id": bus_id,
-                "route_id": route_id,
-                "latitude": latitude,
-                "longitude": longitude,
-                "day_of_week": day_of_week,
-                "month": month,
-                "time_of_day": time_of_day,
-                "bus_speed": bus_speed,
-                "destination_route_stop_id": destination_route_stop_id,
-                "eta_to_stop": eta_to_stop,
-                "snapshot_time": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
 
-            self.get_capacity_info(bus_data)
+    def _parse_vehicles(self, vehicles):
+        """
+        Return {VehicleID: row} for every vehicle with a parseable TimeStamp.
+        Timestamps are decoded for the whole fleet at once; see transloc_time.
+        """
+        if not vehicles:
+            return {}
+
+        frame = pd.DataFrame(vehicles)
+        timestamps = decode_transloc_dates(frame["TimeStamp"])
+        valid = timestamps.notna()
+        frame, timestamps = frame[valid], timestamps[valid]
+
+        snapshot_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = pd.DataFrame({
+            "bus_id": frame["VehicleID"],
+            "route_id": frame["RouteID"],
+            "latitude": frame["Latitude"],
+            "longitude": frame["Longitude"],
+            "day_of_week": timestamps.dt.day_name(),
+            "month": timestamps.dt.strftime('%m'),
+            "time_of_day": timestamps.dt.strftime('%H:%M:%S'),
+            "bus_speed": frame["GroundSpeed"],
+            "destination_route_stop_id": None,
+            "eta_to_stop": None,
+            "snapshot_time": snapshot_time,
+        })
+        return {row["bus_id"]: row for row in rows.to_dict("records")}
+
+    def _join(self, bus_data, stop_info, capacity_info):
+        #api call may return an eta where eta < t_o_d, in which we symbol with 0 to show bus already arrived or passed stop
+        #this only matters when keeping eta as a timestamp
+        # if eta_to_stop < time_of_day:
+        #     eta_to_stop = 0
+        for bus_id, (destination_route_stop_id, eta_to_stop) in stop_info.items():
+            values = bus_data.get(bus_id)
+            if values:
+                values["destination_route_stop_id"] = destination_route_stop_id
+                values["eta_to_stop"] = eta_to_stop
+
+        for bus_id, values in bus_data.items():
+            values["capacity"], values["occupancy"] = capacity_info.get(bus_id, (None, None))
         
         return list(bus_data.values())
     
     def get_stop_info(self, vehicle_id):
-        endpoint = "/Services/JSONPRelay.svc/GetVehicleRouteStopEstimates?"
         params = {
             "vehicleIdStrings": vehicle_id,
         }
 
-        response = self._get(endpoint, params=params)
-        estimates = response[0].get("Estimates")
+        response = self._get(self.ESTIMATES_ENDPOINT, params=params)
+        return self._parse_estimates(response[0].get("Estimates"))
+
+    def get_stop_info_batch(self, vehicle_ids):
+        """
+        Fetch the next-stop estimate for every vehicle in vehicle_ids using
+        comma-joined vehicleIdStrings, ETA_BATCH_SIZE vehicles per request.
+        Returns {VehicleID: (route_stop_id, eta)}; vehicles without
+        estimates map to (None, None).
+        """
+        stop_info = {}
+        for params in self._batch_eta_params(vehicle_ids):
+            stop_info.update(self._parse_stop_info(self._get(self.ESTIMATES_ENDPOINT, params=params)))
+        return stop_info
 
+    def _batch_eta_params(self, vehicle_ids):
+        return [
+            {
+                "vehicleIdStrings": ",".join(str(vehicle_id) for vehicle_id in vehicle_ids[i:i + self.ETA_BATCH_SIZE]),
+                "quantity": 1,
+            }
+            for i in range(0, len(vehicle_ids), self.ETA_BATCH_SIZE)
+        ]
+
+    def _parse_stop_info(self, response):
+        return {vehicle.get("VehicleID"): self._parse_estimates(vehicle.get("Estimates")) for vehicle in response or []}
+
+    def _parse_estimates(self, estimates):
         if estimates:
             est = estimates[0]
             route_stop_id = est.get("RouteStopID")
@@ -101,33 +166,75 @@ class BusExtractor(BaseExtractor):
                 
             # this code will make eta a timestamp rather than a seconds count
             #
-            # estimate_time = est.get("EstimateTime")
-            # match = re.search(r'\\?/Date\((\d+)\)\\?/', estimate_time)
-            # if match:
-            #     timestamp_ms = int(match.group(1))
-            #     utc_time = datetime.fromtimestamp(timestamp_ms / 1000, tz=pytz.utc)
-            #     timestamp = utc_time.astimezone(pytz.timezone('America/New_York'))
+            # timestamp = decode_transloc_date(est.get("EstimateTime"))
+            # if timestamp is not None:
             #     eta_time_of_day = timestamp.strftime('%H:%M:%S')
             #     return route_stop_id, eta_time_of_day
             return route_stop_id, eta
         return None, None
 
-    def get_capacity_info(self, bus_data):
-        endpoint = "/Services/JSONPRelay.svc/GetVehicleCapacities"
+    def get_route_stops(self) -> pd.DataFrame:
+        """
+        Fetch every route stop's position (for stop geofences, see arrivals.py).
+        Returns one row per RouteStopID: route_stop_id, route_id, latitude,
+        longitude, name.
+        """
+        response = self._get(self.STOPS_ENDPOINT, params=self._vehicle_params())
+        return self._parse_route_stops(response)
+
+    def _parse_route_stops(self, response):
+        stops = [
+            {
+                "route_stop_id": stop.get("RouteStopID", stop.get("StopID")),
+                "route_id": stop.get("RouteID"),
+                "latitude": stop.get("Latitude"),
+                "longitude": stop.get("Longitude"),
+                "name": stop.get("Description", stop.get("Name")),
+            }
+            for stop in response or []
+        ]
+        return pd.DataFrame(stops, columns=["route_stop_id", "route_id", "latitude", "longitude", "name"])
+
+    def get_route_shapes(self) -> pd.DataFrame:
+        """
+        Fetch every route's encoded polyline (for route_geometry).
+        Returns one row per RouteID: route_id, name, encoded_polyline.
+        """
+        response = self._get(self.ROUTES_ENDPOINT, params=self._vehicle_params())
+        return self._parse_route_shapes(response)
+
+    def _parse_route_shapes(self, response):
+        routes = [
+            {
+                "route_id": route.get("RouteID"),
+                "name": route.get("Description", route.get("LongName")),
+                "encoded_polyline": route.get("EncodedPolyline"),
+            }
+            for route in response or []
+        ]
+        return pd.DataFrame(routes, columns=["route_id", "name", "encoded_polyline"])
+
+    def get_capacity_info(self):
+        """
+        Fetch the fleet's capacity table once.
+        Returns {VehicleID: (capacity, occupancy)}.
+        """
         params = {}
 
-        response = self._get(endpoint, params=params)
+        response = self._get(self.CAPACITIES_ENDPOINT, params=params)
+        return self._parse_capacity_info(response)
 
-        for vehicle in response:
-            bus_id = vehicle.get("VehicleID")
-            capacity = vehicle.get("Capacity")
-            occupancy = vehicle.get("CurrentOccupation")
-            values = bus_data.get(bus_id)
-            if values:
-                values["capacity"] = capacity
-                values["occupancy"] = occupancy
+    def _parse_capacity_info(self, response):
+        capacity_info = {}
+        for vehicle in response or []:
+            capacity_info[vehicle.get("VehicleID")] = (vehicle.get("Capacity"), vehicle.get("CurrentOccupation"))
+        return capacity_info
 
     
     def extract(self) -> pd.DataFrame:
         bus_data = self.get_bus_data()
         return pd.DataFrame(bus_data)
+
+    async def aextract(self) -> pd.DataFrame:
+        bus_data = await self.aget_bus_data()
+        return pd.DataFrame(bus_data)
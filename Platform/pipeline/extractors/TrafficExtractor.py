@@ -19,12 +19,18 @@ class TrafficExtractor(BaseExtractor):
         self.params = {
             "in": f"circle:{self.circle_center};r=1900",
             "locationReferencing": "shape",
-            "apiKey": {self.api_key}
+            "apiKey": self.api_key
         }
 
     def extract(self) -> pd.DataFrame:
         response = self._get("v7/incidents", headers=self.headers, params=self.params)
+        return self._to_dataframe(response)
 
+    async def aextract(self) -> pd.DataFrame:
+        response = await self._aget("v7/incidents", headers=self.headers, params=self.params)
+        return self._to_dataframe(response)
+
+    def _to_dataframe(self, response: dict) -> pd.DataFrame:
         if response.get("error") is not None:
             raise Exception(f"Error in TrafficExtractor extract(): {response}")
 
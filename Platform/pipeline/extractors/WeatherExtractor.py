@@ -4,10 +4,14 @@ Extracts weather data from weather.gov API and formats it for the database.
 """
 
 from .BaseExtractor import ABCBaseExtractor as BaseExtractor
+import asyncio
 import pandas as pd
 from datetime import datetime
+import json
+import os
 import re
-from typing import Optional
+import time
+from typing import List, Optional
 
 
 class WeatherExtractor(BaseExtractor):
@@ -16,6 +20,12 @@ class WeatherExtractor(BaseExtractor):
     
     Important: weather.gov doesn't use API keys - it requires a User-Agent header.
     The api_key parameter is kept for compatibility with BaseExtractor but not used.
+    
+    Caching: the points -> forecastHourly mapping for a location never changes,
+    so it is resolved once per process (and optionally persisted to cache_path).
+    The hourly forecast is reused until its Cache-Control max-age (or
+    FORECAST_TTL) runs out, then revalidated with If-None-Match /
+    If-Modified-Since so an unchanged forecast costs a 304 and no body.
     """
     
     # Georgia Tech coordinates
@@ -32,7 +42,33 @@ class WeatherExtractor(BaseExtractor):
         'conditions'          # Description like "Partly Cloudy"
     ]
     
-    def __init__(self, base_url: str, api_key: str, user_agent: str = None):
+    # Columns of extract_horizon(), indexed by period start_time
+    HORIZON_COLUMNS = [
+        'end_time',
+        'temperature',
+        'precipitation_probability',
+        'wind_speed',
+        'conditions',
+        'is_daytime',
+        'alert_count',        # Active alerts overlapping the period
+        'alert_events',       # e.g. "Flood Watch; Heat Advisory"
+        'alert_severity',     # Highest severity among those alerts
+        'snapshot_time',
+    ]
+    
+    # NWS CAP severities, lowest to highest
+    ALERT_SEVERITIES = ['Unknown', 'Minor', 'Moderate', 'Severe', 'Extreme']
+    
+    # Seconds to reuse a forecast when weather.gov sends no Cache-Control max-age
+    FORECAST_TTL = 900
+    
+    # Seconds to reuse the active alerts list
+    ALERTS_TTL = 300
+    
+    # (base_url, "lat,lon") -> forecastHourly endpoint, shared by every instance
+    _forecast_endpoints = {}
+    
+    def __init__(self, base_url: str, api_key: str, user_agent: str = None, cache_path: Optional[str] = None):
         """
         Initialize WeatherExtractor.
         
@@ -41,6 +77,8 @@ class WeatherExtractor(BaseExtractor):
             api_key: Not used by weather.gov, but required by BaseExtractor signature
             user_agent: User-Agent string required by weather.gov
                        Format: (YourApp, your-email@gatech.edu)
+            cache_path: Optional JSON file that persists resolved forecast
+                       endpoints across restarts
         """
         super().__init__(base_url, api_key)
         
@@ -52,6 +90,13 @@ class WeatherExtractor(BaseExtractor):
             )
         
         self.user_agent = user_agent
+        self.cache_path = cache_path
+        
+        # Last hourly forecast: body, validators and monotonic expiry
+        self._forecast_cache = None
+        
+        # Last active alerts: (monotonic expiry, features)
+        self._alerts_cache = None
         
         # Set up session headers for all requests
         self.session.headers.update({
@@ -75,75 +120,13 @@ class WeatherExtractor(BaseExtractor):
             Exception: If API request fails or data parsing fails
         """
         try:
-            # Step 1: Get forecast URL for Georgia Tech location
-            print(f"Fetching weather for coordinates: {self.GT_LATITUDE}, {self.GT_LONGITUDE}")
-            
-            points_endpoint = f"points/{self.GT_LATITUDE},{self.GT_LONGITUDE}"
-            points_data = self._get(points_endpoint)
-            
-            # Extract the hourly forecast URL from the response
-            # Response structure:
-            # {
-            #   "properties": {
-            #     "forecastHourly": "https://api.weather.gov/gridpoints/FFC/52,87/forecast/hourly"
-            #   }
-            # }
-            forecast_hourly_url = points_data['properties']['forecastHourly']
-            
-            # Step 2: Get hourly forecast data
-            # We need to extract just the endpoint part (after base_url)
-            # Example: "https://api.weather.gov/gridpoints/FFC/52,87/forecast/hourly"
-            #          becomes "gridpoints/FFC/52,87/forecast/hourly"
-            forecast_endpoint = forecast_hourly_url.replace(self.base_url + "/", "")
-            
-            print(f"Fetching hourly forecast from: {forecast_endpoint}")
-            forecast_data = self._get(forecast_endpoint)
-            
-            # Step 3: Extract current period (first in the list)
-            # Response structure:
-            # {
-            #   "properties": {
-            #     "periods": [
-            #       {
-            #         "startTime": "2025-10-18T14:00:00-04:00",
-            #         "temperature": 72,
-            #         "windSpeed": "10 mph",
-            #         "shortForecast": "Partly Cloudy",
-            #         "probabilityOfPrecipitation": {"value": 20},
-            #         ...
-            #       },
-            #       ...
-            #     ]
-            #   }
-            # }
-            periods = forecast_data['properties']['periods']
+            # Step 1: Get forecast URL for Georgia Tech location (cached)
+            forecast_endpoint = self._resolve_forecast_endpoint()
             
-            if not periods:
-                raise ValueError("No forecast periods returned from API")
+            # Step 2: Get hourly forecast data (cached / revalidated)
+            forecast_data = self._get_forecast(forecast_endpoint)
             
-            current_period = periods[0]  # Current hour
-            
-            # Step 4: Parse data from the current period
-            weather_dict = {
-                'recorded_at': self._parse_timestamp(current_period['startTime']),
-                'snapshot_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'temperature': self._parse_temperature(current_period),
-                'precipitation_probability': self._parse_precipitation_probability(current_period),
-                'wind_speed': self._parse_wind_speed(current_period),
-                'conditions': self._parse_conditions(current_period)
-            }
-            
-            # Step 5: Convert to DataFrame
-            df = pd.DataFrame([weather_dict])
-            
-            # Step 6: Validate DataFrame has correct columns
-            self._validate_dataframe(df)
-            
-            print(f"✓ Extracted weather: {weather_dict['temperature']}°F, "
-                  f"{weather_dict['conditions']}, "
-                  f"{weather_dict['precipitation_probability']}% precip")
-            
-            return df
+            return self._to_dataframe(forecast_data)
             
         except KeyError as e:
             print(f"✗ Error: Missing expected field in API response: {e}")
@@ -151,6 +134,374 @@ class WeatherExtractor(BaseExtractor):
         except Exception as e:
             print(f"✗ Error extracting weather data: {e}")
             raise
+
+    async def aextract(self, since: Optional[str] = None) -> pd.DataFrame:
+        """
+        Async version of extract(), sharing the extractor event loop's
+        connection pool. Same arguments, return value and errors.
+        """
+        try:
+            forecast_endpoint = await self._aresolve_forecast_endpoint()
+            forecast_data = await self._aget_forecast(forecast_endpoint)
+
+            return self._to_dataframe(forecast_data)
+
+        except KeyError as e:
+            print(f"✗ Error: Missing expected field in API response: {e}")
+            raise
+        except Exception as e:
+            print(f"✗ Error extracting weather data: {e}")
+            raise
+
+    def extract_horizon(self) -> pd.DataFrame:
+        """
+        Extract every hourly forecast period plus the active alerts for
+        Georgia Tech as one time-indexed frame.
+        
+        Both requests go through the forecast / alerts caches, so calling this
+        every tick costs about one forecast fetch per hour. Feature joins can
+        then look up the weather for any prediction horizon locally.
+        
+        Returns:
+            pd.DataFrame: One row per forecast period, indexed by tz-aware
+                         (UTC) start_time, with HORIZON_COLUMNS
+        """
+        try:
+            forecast_data = self._get_forecast(self._resolve_forecast_endpoint())
+            return self._to_horizon_dataframe(forecast_data, self._get_alerts())
+        except KeyError as e:
+            print(f"✗ Error: Missing expected field in API response: {e}")
+            raise
+        except Exception as e:
+            print(f"✗ Error extracting weather horizon: {e}")
+            raise
+
+    async def aextract_horizon(self) -> pd.DataFrame:
+        """
+        Async version of extract_horizon(); the forecast and alerts requests
+        run concurrently.
+        """
+        try:
+            forecast_endpoint = await self._aresolve_forecast_endpoint()
+            forecast_data, alerts = await asyncio.gather(
+                self._aget_forecast(forecast_endpoint),
+                self._aget_alerts(),
+            )
+            return self._to_horizon_dataframe(forecast_data, alerts)
+        except KeyError as e:
+            print(f"✗ Error: Missing expected field in API response: {e}")
+            raise
+        except Exception as e:
+            print(f"✗ Error extracting weather horizon: {e}")
+            raise
+
+    def _points_endpoint(self) -> str:
+        return f"points/{self.GT_LATITUDE},{self.GT_LONGITUDE}"
+
+    def _alerts_params(self) -> dict:
+        return {
+            "point": f"{self.GT_LATITUDE},{self.GT_LONGITUDE}",
+            "status": "actual",
+            "message_type": "alert",
+        }
+
+    # =========================================================================
+    # CACHING - forecast endpoint resolution and conditional forecast GETs
+    # =========================================================================
+
+    def _cache_key(self) -> str:
+        return f"{self.base_url}|{self.GT_LATITUDE},{self.GT_LONGITUDE}"
+
+    def _resolve_forecast_endpoint(self) -> str:
+        endpoint = self._cached_forecast_endpoint()
+        if endpoint is None:
+            print(f"Fetching weather for coordinates: {self.GT_LATITUDE}, {self.GT_LONGITUDE}")
+            points_data = self._get(self._points_endpoint())
+            endpoint = self._remember_forecast_endpoint(self._forecast_endpoint(points_data))
+        return endpoint
+
+    async def _aresolve_forecast_endpoint(self) -> str:
+        endpoint = self._cached_forecast_endpoint()
+        if endpoint is None:
+            print(f"Fetching weather for coordinates: {self.GT_LATITUDE}, {self.GT_LONGITUDE}")
+            points_data = await self._aget(self._points_endpoint())
+            endpoint = self._remember_forecast_endpoint(self._forecast_endpoint(points_data))
+        return endpoint
+
+    def _cached_forecast_endpoint(self) -> Optional[str]:
+        """
+        Return the resolved forecast endpoint for this location from the
+        in-process cache, falling back to cache_path, or None if unresolved.
+        """
+        key = self._cache_key()
+        endpoint = self._forecast_endpoints.get(key)
+        if endpoint is None and self.cache_path and os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path) as f:
+                    endpoint = json.load(f).get(key)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read weather cache '{self.cache_path}': {e}")
+            if endpoint:
+                self._forecast_endpoints[key] = endpoint
+        return endpoint
+
+    def _remember_forecast_endpoint(self, endpoint: str) -> str:
+        key = self._cache_key()
+        self._forecast_endpoints[key] = endpoint
+        if self.cache_path:
+            try:
+                cached = {}
+                if os.path.exists(self.cache_path):
+                    with open(self.cache_path) as f:
+                        cached = json.load(f)
+                cached[key] = endpoint
+                with open(self.cache_path, "w") as f:
+                    json.dump(cached, f, indent=2)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not write weather cache '{self.cache_path}': {e}")
+        return endpoint
+
+    def _get_forecast(self, endpoint: str) -> dict:
+        """
+        Return the hourly forecast for endpoint, hitting weather.gov only once
+        the cached copy has expired, and then conditionally.
+        """
+        cached = self._forecast_cache
+        if cached is not None and cached["endpoint"] == endpoint and time.monotonic() < cached["expires"]:
+            return cached["body"]
+
+        print(f"Fetching hourly forecast from: {endpoint}")
+        response = self.session.get(self._url(endpoint), headers=self._revalidation_headers(endpoint), timeout=self.REQUEST_TIMEOUT)
+        body = response.json() if response.status_code != 304 else None
+        return self._store_forecast(endpoint, response.status_code, response.headers, body)
+
+    async def _aget_forecast(self, endpoint: str) -> dict:
+        cached = self._forecast_cache
+        if cached is not None and cached["endpoint"] == endpoint and time.monotonic() < cached["expires"]:
+            return cached["body"]
+
+        print(f"Fetching hourly forecast from: {endpoint}")
+        session = self._get_async_session()
+        async with session.get(self._url(endpoint), headers=self._revalidation_headers(endpoint)) as response:
+            body = await response.json(content_type=None) if response.status != 304 else None
+            return self._store_forecast(endpoint, response.status, response.headers, body)
+
+    def _revalidation_headers(self, endpoint: str) -> dict:
+        cached = self._forecast_cache
+        headers = {}
+        if cached is not None and cached["endpoint"] == endpoint:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+        return headers
+
+    def _store_forecast(self, endpoint: str, status: int, headers, body: Optional[dict]) -> dict:
+        """
+        Update the forecast cache from a response and return the forecast body.
+        A 304 (or an error while a cached copy exists) keeps the cached body.
+        """
+        cached = self._forecast_cache
+        has_cached = cached is not None and cached["endpoint"] == endpoint
+        expires = time.monotonic() + self._max_age(headers)
+
+        if status == 304 and has_cached:
+            cached["expires"] = expires
+            cached["etag"] = headers.get("ETag") or cached["etag"]
+            print("✓ Hourly forecast not modified (304), reusing cached copy")
+            return cached["body"]
+
+        if status >= 400:
+            if has_cached:
+                print(f"Warning: Forecast request returned {status}, serving cached copy")
+                return cached["body"]
+            return body
+
+        self._forecast_cache = {
+            "endpoint": endpoint,
+            "body": body,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "expires": expires,
+        }
+        return body
+
+    def _get_alerts(self) -> List[dict]:
+        """Active alerts for Georgia Tech, reused for ALERTS_TTL seconds."""
+        if self._alerts_cache is not None and time.monotonic() < self._alerts_cache[0]:
+            return self._alerts_cache[1]
+        response = self.session.get(self._url("alerts/active"), params=self._alerts_params(), timeout=self.REQUEST_TIMEOUT)
+        body = response.json() if 200 <= response.status_code < 300 else None
+        return self._store_alerts(response.status_code, body)
+
+    async def _aget_alerts(self) -> List[dict]:
+        if self._alerts_cache is not None and time.monotonic() < self._alerts_cache[0]:
+            return self._alerts_cache[1]
+        session = self._get_async_session()
+        async with session.get(self._url("alerts/active"), params=self._alerts_params()) as response:
+            body = await response.json(content_type=None) if 200 <= response.status < 300 else None
+            return self._store_alerts(response.status, body)
+
+    def _store_alerts(self, status: int, data: Optional[dict]) -> List[dict]:
+        """
+        Cache a successful alerts response for ALERTS_TTL. A failed request
+        is not cached (the next call retries); it serves the last known
+        alerts, or none if there are none yet.
+        """
+        if not 200 <= status < 300:
+            stale = self._alerts_cache[1] if self._alerts_cache is not None else []
+            print(f"Warning: Alerts request returned {status}, serving {len(stale)} cached alert(s)")
+            return stale
+        features = data.get("features", [])
+        self._alerts_cache = (time.monotonic() + self.ALERTS_TTL, features)
+        return features
+
+    def _max_age(self, headers) -> float:
+        match = re.search(r'max-age=(\d+)', headers.get("Cache-Control") or "")
+        return float(match.group(1)) if match else float(self.FORECAST_TTL)
+
+    def _forecast_endpoint(self, points_data: dict) -> str:
+        """
+        Resolve the hourly forecast endpoint from a points response.
+        """
+        # Extract the hourly forecast URL from the response
+        # Response structure:
+        # {
+        #   "properties": {
+        #     "forecastHourly": "https://api.weather.gov/gridpoints/FFC/52,87/forecast/hourly"
+        #   }
+        # }
+        forecast_hourly_url = points_data['properties']['forecastHourly']
+        
+        # We need to extract just the endpoint part (after base_url)
+        # Example: "https://api.weather.gov/gridpoints/FFC/52,87/forecast/hourly"
+        #          becomes "gridpoints/FFC/52,87/forecast/hourly"
+        return forecast_hourly_url.replace(self.base_url + "/", "")
+
+    def _to_dataframe(self, forecast_data: dict) -> pd.DataFrame:
+        """
+        Build the single-row weather DataFrame from an hourly forecast response.
+        """
+        # Step 3: Extract current period (first in the list)
+        # Response structure:
+        # {
+        #   "properties": {
+        #     "periods": [
+        #       {
+        #         "startTime": "2025-10-18T14:00:00-04:00",
+        #         "temperature": 72,
+        #         "windSpeed": "10 mph",
+        #         "shortForecast": "Partly Cloudy",
+        #         "probabilityOfPrecipitation": {"value": 20},
+        #         ...
+        #       },
+        #       ...
+        #     ]
+        #   }
+        # }
+        periods = forecast_data['properties']['periods']
+        
+        if not periods:
+            raise ValueError("No forecast periods returned from API")
+        
+        # A cached (or 304-revalidated) body can be hours old, so the first
+        # period is not necessarily the current hour
+        current_period = self._current_period(periods)
+        
+        # Step 4: Parse data from the current period
+        weather_dict = {
+            'recorded_at': self._parse_timestamp(current_period['startTime']),
+            'snapshot_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'temperature': self._parse_temperature(current_period),
+            'precipitation_probability': self._parse_precipitation_probability(current_period),
+            'wind_speed': self._parse_wind_speed(current_period),
+            'conditions': self._parse_conditions(current_period)
+        }
+        
+        # Step 5: Convert to DataFrame
+        df = pd.DataFrame([weather_dict])
+        
+        # Step 6: Validate DataFrame has correct columns
+        self._validate_dataframe(df)
+        
+        print(f"✓ Extracted weather: {weather_dict['temperature']}°F, "
+              f"{weather_dict['conditions']}, "
+              f"{weather_dict['precipitation_probability']}% precip")
+        
+        return df
+    
+    def _current_period(self, periods: List[dict], now: Optional[pd.Timestamp] = None) -> dict:
+        """
+        Return the period with startTime <= now < endTime.
+        
+        Falls back to the latest period that has started (or the first one
+        if none has) when no period covers now.
+        """
+        now = now if now is not None else pd.Timestamp.now(tz='UTC')
+        current = periods[0]
+        for period in periods:
+            if pd.Timestamp(period['startTime']) > now:
+                break
+            current = period
+            end = period.get('endTime')
+            if end is None or now < pd.Timestamp(end):
+                return current
+        print(f"Warning: No forecast period covers {now}, using the one starting {current['startTime']}")
+        return current
+    
+    def _to_horizon_dataframe(self, forecast_data: dict, alerts: List[dict]) -> pd.DataFrame:
+        """
+        Build the time-indexed horizon frame from an hourly forecast response
+        and a list of active alert features.
+        """
+        periods = forecast_data['properties']['periods']
+        
+        if not periods:
+            raise ValueError("No forecast periods returned from API")
+        
+        df = pd.DataFrame({
+            'start_time': pd.to_datetime([p['startTime'] for p in periods], utc=True),
+            'end_time': pd.to_datetime([p['endTime'] for p in periods], utc=True),
+            'temperature': [self._parse_temperature(p) for p in periods],
+            'precipitation_probability': [self._parse_precipitation_probability(p) for p in periods],
+            'wind_speed': [self._parse_wind_speed(p) for p in periods],
+            'conditions': pd.Categorical([self._parse_conditions(p) for p in periods]),
+            'is_daytime': [bool(p.get('isDaytime')) for p in periods],
+        })
+        df['precipitation_probability'] = df['precipitation_probability'].astype('int16')
+        
+        # Alert windows: onset/effective -> ends/expires (open-ended if missing)
+        alert_props = [a.get('properties', {}) for a in alerts]
+        starts = pd.to_datetime([p.get('onset') or p.get('effective') for p in alert_props], utc=True)
+        ends = pd.to_datetime([p.get('ends') or p.get('expires') for p in alert_props], utc=True)
+        events = [p.get('event', 'Alert') for p in alert_props]
+        severity_rank = [
+            self.ALERT_SEVERITIES.index(p.get('severity')) if p.get('severity') in self.ALERT_SEVERITIES else 0
+            for p in alert_props
+        ]
+        
+        # (periods x alerts) overlap matrix; both axes are small
+        period_start = df['start_time'].to_numpy()[:, None]
+        period_end = df['end_time'].to_numpy()[:, None]
+        overlaps = (
+            (starts.isna() | (starts.to_numpy()[None, :] < period_end))
+            & (ends.isna() | (ends.to_numpy()[None, :] > period_start))
+        )
+        
+        df['alert_count'] = overlaps.sum(axis=1).astype('int16')
+        df['alert_events'] = ['; '.join(e for e, hit in zip(events, row) if hit) or None for row in overlaps]
+        df['alert_severity'] = pd.Categorical(
+            [self.ALERT_SEVERITIES[max((r for r, hit in zip(severity_rank, row) if hit), default=0)] if row.any() else None
+             for row in overlaps],
+            categories=self.ALERT_SEVERITIES, ordered=True,
+        )
+        df['snapshot_time'] = pd.Timestamp.now(tz='UTC')
+        
+        df = df.set_index('start_time').sort_index()
+        
+        print(f"✓ Extracted weather horizon: {len(df)} period(s), {len(alerts)} active alert(s)")
+        
+        return df[self.HORIZON_COLUMNS]
     
     # =========================================================================
     # HELPER METHODS - Parse specific fields from API response
@@ -0,0 +1,389 @@
+"""
+feature_store.py
+In-memory online features for the XGBoost model, updated tick by tick.
+
+Every feature in Analysis/XGBoost/README.md depends on more than the
+current snapshot: speed is smoothed over recent fixes, delay is how far the
+predicted arrival has slipped, headway is how long ago the previous bus
+reached the stop, and is_raining comes from the latest WeatherExtractor row.
+FeatureStore keeps that state in fixed-size ring buffers:
+
+  per vehicle          the last VEHICLE_HISTORY snapshots (time, position,
+                       speed, ETA, target stop)
+  per (route, stop)    the last STOP_HISTORY arrivals (time, vehicle)
+
+Each snapshot row is one O(1) buffer write. Arrivals are inferred when a
+vehicle's target stop changes (as in arrivals.ArrivalDetector's eta signal)
+or fed in from an ArrivalDetector via add_arrivals().
+
+features() returns the point-in-time feature rows for the live vehicles, in
+the layout serve.PredictionService.update_tick() takes (route_id, stop_id,
+snapshot_time and the README features). Without a schedule feed,
+current_delay_sec is the slip of the predicted arrival at the current
+target since the vehicle first headed for it; first_predicted_arrival, that
+first prediction, is the baseline serve measures the model's arrival
+against for predictedDelayMinutes. route_id_idx and
+target_stop_idx come from the encoders the model was trained with (saved in
+its bundle, see load_encoders); ids the model never saw get UNSEEN_INDEX.
+
+FeatureStore has the sink interface (write/close), so it plugs into
+ForwardPipeline(sinks=[...]). snapshot()/restore() pickle the buffers so a
+restart resumes without replaying history; with snapshot_path set, the
+store is also snapshotted every snapshot_every_s and on close().
+"""
+
+import os
+import pickle
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+VEHICLE_HISTORY = 40        # ~10 minutes at one tick per 15 s
+STOP_HISTORY = 16
+SPEED_WINDOW_S = 60
+STALE_AFTER_S = 900
+MAX_VEHICLES = 1_000
+WEATHER_MAX_AGE_S = 7_200
+RAIN_PROBABILITY = 50
+SNAPSHOT_EVERY_S = 300
+
+MPH_TO_MPS = 0.44704        # TransLoc GroundSpeed is in mph
+RAIN_CONDITIONS = re.compile(r"rain|shower|drizzle|storm|thunder", re.IGNORECASE)
+
+# 2: route/stop indexes are the training encoders, not numbered as seen
+SNAPSHOT_VERSION = 2
+
+# training encoder keys (Analysis/XGBoost/utils.fit_index_encoders)
+ROUTE_ENCODER = "route_id_idx"
+STOP_ENCODER = "target_stop_idx"
+UNSEEN_INDEX = -1
+
+FEATURE_COLUMNS = [
+    "vehicle_id", "route_id", "stop_id", "snapshot_time",
+    "route_id_idx", "target_stop_idx", "distance_to_target_stop_m", "current_speed_mps",
+    "time_of_day_min", "day_of_week", "current_delay_sec", "is_raining", "headway_to_prev_bus_sec",
+    "first_predicted_arrival",
+]
+
+# vehicle buffer columns
+T, LAT, LON, SPEED, ETA, TARGET = range(6)
+
+
+class RingBuffer:
+    """Fixed-capacity float rows; append is O(1) and overwrites the oldest row."""
+    __slots__ = ("data", "head", "size")
+
+    def __init__(self, capacity: int, width: int):
+        self.data = np.full((capacity, width), np.nan)
+        self.head = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, row) -> None:
+        self.data[self.head] = row
+        self.head = (self.head + 1) % len(self.data)
+        self.size = min(self.size + 1, len(self.data))
+
+    def last(self) -> np.ndarray:
+        return self.data[self.head - 1]
+
+    def ordered(self) -> np.ndarray:
+        """Rows oldest to newest."""
+        return self.data[(self.head - self.size + np.arange(self.size)) % len(self.data)]
+
+
+class _VehicleState:
+    __slots__ = ("route_id", "history", "target", "target_time", "target_eta", "first_arrival")
+
+    def __init__(self, route_id, capacity: int):
+        self.route_id = route_id
+        self.history = RingBuffer(capacity, 6)
+        self.target = None
+        self.target_time = None
+        self.target_eta = None
+        # predicted arrival at the current target when it was first seen
+        self.first_arrival = None
+
+
+def _seconds(times: pd.Series) -> np.ndarray:
+    """Wall-clock snapshot_time strings/timestamps -> float seconds (naive, local)."""
+    times = pd.to_datetime(times, format="mixed", cache=False)
+    if times.dt.tz is not None:
+        times = times.dt.tz_localize(None)
+    return times.astype("datetime64[ns]").to_numpy().astype("int64") / 1e9
+
+
+def load_encoders(bundle_path: str) -> Dict[str, Dict[str, int]]:
+    """
+    The id encoders saved in a model bundle (Analysis/XGBoost/serve.py
+    save_model_bundle). Unpickling the bundle loads its model and
+    FeatureTransformer too, so xgboost and Analysis/XGBoost must be
+    importable.
+    """
+    with open(bundle_path, "rb") as f:
+        bundle = pickle.load(f)
+    encoders = bundle.get("encoders") if isinstance(bundle, dict) else None
+    if not encoders or ROUTE_ENCODER not in encoders or STOP_ENCODER not in encoders:
+        raise ValueError(f"{bundle_path}: model bundle has no {ROUTE_ENCODER}/{STOP_ENCODER} encoders")
+    return encoders
+
+
+class FeatureStore:
+    """
+    Ring-buffered per-vehicle and per-(route, stop) state with point-in-time
+    feature rows. encoders are the model's training id encoders
+    (load_encoders). geometry (a route_geometry.RouteGeometryStore) is
+    optional; without it distance_to_target_stop_m is NaN.
+    """
+    def __init__(self, encoders: Dict[str, Dict], geometry=None,
+                 vehicle_history: int = VEHICLE_HISTORY,
+                 stop_history: int = STOP_HISTORY,
+                 speed_window_s: float = SPEED_WINDOW_S,
+                 stale_after_s: float = STALE_AFTER_S,
+                 max_vehicles: int = MAX_VEHICLES,
+                 snapshot_path: Optional[str] = None,
+                 snapshot_every_s: float = SNAPSHOT_EVERY_S):
+        self.geometry = geometry
+        self.vehicle_history = vehicle_history
+        self.stop_history = stop_history
+        self.speed_window_s = speed_window_s
+        self.stale_after_s = stale_after_s
+        self.max_vehicles = max_vehicles
+        self.set_encoders(encoders)
+        self.snapshot_path = snapshot_path
+        self.snapshot_every_s = snapshot_every_s
+
+        self._vehicles: "OrderedDict[object, _VehicleState]" = OrderedDict()
+        self._stops: Dict[tuple, RingBuffer] = {}
+        self._weather = None
+        self._last_snapshot = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._vehicles)
+
+    def set_encoders(self, encoders: Dict[str, Dict]) -> None:
+        """Use these training encoders for route_id_idx and target_stop_idx."""
+        # keyed by the raw id's string form, as fit_index_encoders does
+        self.route_index = {str(k): int(v) for k, v in encoders[ROUTE_ENCODER].items()}
+        self.stop_index = {str(k): int(v) for k, v in encoders[STOP_ENCODER].items()}
+        self._unseen = set()
+
+    # -- updates ------------------------------------------------------------
+
+    def update_bus(self, df: pd.DataFrame) -> None:
+        """Apply BusExtractor rows (any number of ticks) in snapshot_time order."""
+        if df.empty:
+            return
+        t = _seconds(df["snapshot_time"])
+        columns = (
+            t,
+            df["bus_id"].to_numpy(),
+            df["route_id"].to_numpy(),
+            pd.to_numeric(df["latitude"], errors="coerce").to_numpy(dtype=float),
+            pd.to_numeric(df["longitude"], errors="coerce").to_numpy(dtype=float),
+            pd.to_numeric(df["bus_speed"], errors="coerce").to_numpy(dtype=float) * MPH_TO_MPS,
+            pd.to_numeric(df["eta_to_stop"], errors="coerce").to_numpy(dtype=float),
+            pd.to_numeric(df["destination_route_stop_id"], errors="coerce").to_numpy(dtype=float),
+        )
+        order = np.argsort(t, kind="stable")
+        for row in zip(*(column[order] for column in columns)):
+            self._step(*row)
+        self._evict(t[order[-1]])
+
+    def _step(self, t, vehicle_id, route_id, lat, lon, speed, eta, target) -> None:
+        state = self._vehicles.get(vehicle_id)
+        if state is None or t - state.history.last()[T] > self.stale_after_s:
+            state = self._vehicles[vehicle_id] = _VehicleState(route_id, self.vehicle_history)
+        self._vehicles.move_to_end(vehicle_id)
+        state.route_id = route_id
+        state.history.append((t, lat, lon, speed, eta, target))
+
+        if np.isnan(target):
+            return
+        predicted = t + eta if not np.isnan(eta) else None
+        if target != state.target:
+            # the previous target was passed: arrival at its predicted time,
+            # bounded by the snapshots either side
+            if state.target is not None and state.target_eta is not None:
+                arrived = min(max(state.target_time + state.target_eta, state.target_time), t)
+                self._record_arrival(state.route_id, state.target, arrived, vehicle_id)
+            state.target = target
+            state.first_arrival = predicted
+        elif state.first_arrival is None:
+            state.first_arrival = predicted
+        state.target_time = t
+        state.target_eta = None if np.isnan(eta) else eta
+
+    def _record_arrival(self, route_id, stop_id, when: float, vehicle_id) -> None:
+        key = (route_id, float(stop_id))
+        buffer = self._stops.get(key)
+        if buffer is None:
+            buffer = self._stops[key] = RingBuffer(self.stop_history, 2)
+        last = buffer.last() if len(buffer) else None
+        # the same visit reported twice (e.g. inferred and from a detector)
+        if last is not None and last[1] == vehicle_id and abs(when - last[0]) < self.stale_after_s:
+            return
+        buffer.append((when, vehicle_id))
+
+    def add_arrivals(self, events: pd.DataFrame) -> None:
+        """Record arrival events from arrivals.ArrivalDetector."""
+        arrivals = events[events["event"] == "arrival"]
+        if arrivals.empty:
+            return
+        arrivals = arrivals.assign(t=_seconds(arrivals["event_time"])).sort_values("t", kind="stable")
+        for row in arrivals.itertuples(index=False):
+            self._record_arrival(row.route_id, row.route_stop_id, row.t, row.vehicle_id)
+
+    def update_weather(self, df: pd.DataFrame) -> None:
+        """Keep the latest WeatherExtractor row."""
+        if df.empty:
+            return
+        latest = df.iloc[-1]
+        conditions = latest.get("conditions")
+        probability = pd.to_numeric(latest.get("precipitation_probability"), errors="coerce")
+        self._weather = {
+            "t": float(_seconds(pd.Series([latest["snapshot_time"]]))[0]),
+            "is_raining": bool((isinstance(conditions, str) and RAIN_CONDITIONS.search(conditions))
+                               or (not pd.isna(probability) and probability >= RAIN_PROBABILITY)),
+        }
+
+    def _evict(self, now: float) -> None:
+        while self._vehicles:
+            vehicle_id, state = next(iter(self._vehicles.items()))
+            if len(self._vehicles) > self.max_vehicles or now - state.history.last()[T] > self.stale_after_s:
+                self._vehicles.popitem(last=False)
+            else:
+                break
+
+    # -- features -----------------------------------------------------------
+
+    def _encode(self, encoder: str, mapping: Dict[str, int], ids: pd.Series) -> np.ndarray:
+        keys = ids.astype(str)
+        index = keys.map(mapping)
+        for key in set(keys[index.isna()]) - self._unseen:
+            self._unseen.add(key)
+            print(f"✗ {encoder}: id {key} not in the model's training encoder, using {UNSEEN_INDEX}")
+        return index.fillna(UNSEEN_INDEX).to_numpy(dtype="int64")
+
+    def vector(self, vehicle_id) -> Optional[dict]:
+        """Feature row for one vehicle at its latest snapshot, or None."""
+        features = self.features([vehicle_id])
+        return None if features.empty else features.iloc[0].to_dict()
+
+    def features(self, vehicle_ids: Optional[Iterable] = None, max_age_s: Optional[float] = None) -> pd.DataFrame:
+        """
+        One row per live vehicle with a target stop (or per vehicle_ids),
+        as of each vehicle's latest snapshot. max_age_s drops vehicles whose
+        latest snapshot is that much older than the newest one.
+        """
+        ids = list(self._vehicles) if vehicle_ids is None else [v for v in vehicle_ids if v in self._vehicles]
+        rows = []
+        for vehicle_id in ids:
+            state = self._vehicles[vehicle_id]
+            if state.target is None:
+                continue
+            history = state.history.ordered()
+            now = history[-1, T]
+            recent = history[history[:, T] >= now - self.speed_window_s, SPEED]
+            arrivals = self._stops.get((state.route_id, state.target))
+            last_arrival = arrivals.last()[0] if arrivals is not None and len(arrivals) else np.nan
+            predicted = now + history[-1, ETA]
+            rows.append((
+                vehicle_id, state.route_id, state.target, now,
+                history[-1, LAT], history[-1, LON],
+                np.nanmean(recent) if np.isfinite(recent).any() else np.nan,
+                predicted - state.first_arrival if state.first_arrival is not None else np.nan,
+                now - last_arrival,
+                state.first_arrival if state.first_arrival is not None else np.nan,
+            ))
+        if not rows:
+            return pd.DataFrame(columns=FEATURE_COLUMNS)
+
+        raw = pd.DataFrame(rows, columns=["vehicle_id", "route_id", "stop_id", "t", "lat", "lon",
+                                          "speed", "delay", "headway", "first_arrival"])
+        if max_age_s is not None:
+            raw = raw[raw["t"] >= raw["t"].max() - max_age_s].reset_index(drop=True)
+        snapshot_time = pd.to_datetime(raw["t"], unit="s")
+
+        if self.geometry is not None:
+            distance = self.geometry.distance_to_stop(raw["route_id"], raw["lat"], raw["lon"], raw["stop_id"])
+        else:
+            distance = np.full(len(raw), np.nan)
+
+        weather = self._weather
+        fresh = weather is not None and (raw["t"] - weather["t"]).abs() <= WEATHER_MAX_AGE_S
+        is_raining = np.where(fresh, float(weather["is_raining"]) if weather else np.nan, np.nan)
+
+        stop_ids = raw["stop_id"].astype("int64")
+        features = pd.DataFrame({
+            "vehicle_id": raw["vehicle_id"],
+            "route_id": raw["route_id"],
+            "stop_id": stop_ids,
+            "snapshot_time": snapshot_time,
+            "route_id_idx": self._encode(ROUTE_ENCODER, self.route_index, raw["route_id"]),
+            "target_stop_idx": self._encode(STOP_ENCODER, self.stop_index, stop_ids),
+            "distance_to_target_stop_m": distance,
+            "current_speed_mps": raw["speed"],
+            "time_of_day_min": snapshot_time.dt.hour * 60 + snapshot_time.dt.minute,
+            "day_of_week": snapshot_time.dt.dayofweek,
+            "current_delay_sec": raw["delay"],
+            "is_raining": is_raining,
+            "headway_to_prev_bus_sec": raw["headway"],
+            "first_predicted_arrival": pd.to_datetime(raw["first_arrival"], unit="s"),
+        })
+        return features[FEATURE_COLUMNS]
+
+    # -- persistence --------------------------------------------------------
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # rebuilt from route shapes on restore rather than pickled
+        state["geometry"] = None
+        return state
+
+    def snapshot(self, path: Optional[str] = None) -> str:
+        """Atomically pickle the store to path (default snapshot_path)."""
+        path = path or self.snapshot_path
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"version": SNAPSHOT_VERSION, "store": self}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._last_snapshot = time.monotonic()
+        return path
+
+    @classmethod
+    def restore(cls, path: str, encoders: Optional[Dict[str, Dict]] = None, geometry=None) -> "FeatureStore":
+        """
+        Load a snapshot. encoders, when given, replace the saved ones (the
+        model may have been retrained since the snapshot).
+        """
+        with open(path, "rb") as f:
+            saved = pickle.load(f)
+        if saved.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"{path}: feature store snapshot version {saved.get('version')}, expected {SNAPSHOT_VERSION}")
+        store = saved["store"]
+        store.geometry = geometry
+        if encoders is not None:
+            store.set_encoders(encoders)
+        store.snapshot_path = store.snapshot_path or path
+        store._last_snapshot = time.monotonic()
+        return store
+
+    # sink interface for ForwardPipeline(sinks=[...])
+    def write(self, source: str, batch: str, df: pd.DataFrame) -> None:
+        if source == "bus":
+            self.update_bus(df)
+        elif source == "weather":
+            self.update_weather(df)
+        if self.snapshot_path and time.monotonic() - self._last_snapshot >= self.snapshot_every_s:
+            self.snapshot()
+
+    def close(self) -> None:
+        if self.snapshot_path:
+            self.snapshot()
@@ -0,0 +1,191 @@
+"""
+headways.py
+Headways and bunching per (route, stop) from arrival events.
+
+A headway is the time between consecutive arrivals at the same stop of the
+same route. compute_headways() sorts arrival events (arrivals.ArrivalDetector
+output) by (route_id, route_stop_id, event_time) once and takes a grouped
+diff, so a whole history costs one sort instead of comparing vehicles
+pairwise per stop. Each arrival gets:
+
+  headway_sec             seconds since the previous arrival at that stop
+  prev_vehicle_id         the vehicle that made it
+  scheduled_headway_sec   from the schedule passed in, else the route's
+                          median observed headway
+  headway_gap_sec         headway_sec - scheduled_headway_sec
+  is_bunched              headway_sec below BUNCHING_RATIO of the scheduled
+                          headway, or below BUNCHING_S when there is none
+                          (the synthetic data's "short headways (<5 min)")
+
+HeadwayTracker does the same on live ticks: it keeps the last arrival per
+(route, stop) and runs each new batch of events through the same grouped
+diff, seeded with those arrivals.
+
+time_since_last_arrival() gives headway_to_prev_bus_sec for snapshots: the
+time since the last arrival at each snapshot's target stop, taken as of
+snapshot_time so no later arrival leaks in.
+"""
+
+from typing import Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+BUNCHING_S = 300
+BUNCHING_RATIO = 0.5
+
+HEADWAY_COLUMNS = [
+    "route_id", "route_stop_id", "vehicle_id", "event_time", "prev_vehicle_id",
+    "headway_sec", "scheduled_headway_sec", "headway_gap_sec", "is_bunched",
+]
+
+Schedule = Union[None, float, Dict, pd.Series]
+
+
+def _arrivals(events: pd.DataFrame) -> pd.DataFrame:
+    if "event" in events.columns:
+        events = events[events["event"] == "arrival"]
+    return events[["route_id", "route_stop_id", "vehicle_id", "event_time"]].assign(
+        event_time=pd.to_datetime(events["event_time"], format="mixed"),
+    ).dropna(subset=["route_stop_id", "event_time"])
+
+
+def _grouped_diff(arrivals: pd.DataFrame) -> pd.DataFrame:
+    """Sort once and diff within each (route_id, route_stop_id) run."""
+    route = pd.factorize(arrivals["route_id"])[0]
+    stop = pd.factorize(arrivals["route_stop_id"])[0]
+    times = arrivals["event_time"].to_numpy(dtype="datetime64[ns]").astype("int64")
+    order = np.lexsort((times, stop, route))
+
+    route, stop, times = route[order], stop[order], times[order]
+    out = arrivals.iloc[order].reset_index(drop=True)
+
+    same = np.zeros(len(out), dtype=bool)
+    same[1:] = (route[1:] == route[:-1]) & (stop[1:] == stop[:-1])
+    headway = np.full(len(out), np.nan)
+    headway[1:] = np.diff(times) / 1e9
+    vehicles = out["vehicle_id"].to_numpy()
+    prev_vehicle = np.empty(len(out), dtype=object)
+    prev_vehicle[1:] = vehicles[:-1]
+
+    out["prev_vehicle_id"] = np.where(same, prev_vehicle, None)
+    out["headway_sec"] = np.where(same, headway, np.nan)
+    return out
+
+
+def _schedule(out: pd.DataFrame, scheduled: Schedule) -> np.ndarray:
+    if scheduled is None:
+        # no timetable: the route's typical observed headway
+        return out.groupby("route_id")["headway_sec"].transform("median").to_numpy(dtype=float)
+    if np.isscalar(scheduled):
+        return np.full(len(out), float(scheduled))
+    return out["route_id"].map(scheduled).to_numpy(dtype=float)
+
+
+def _finish(out: pd.DataFrame, scheduled_headway: np.ndarray) -> pd.DataFrame:
+    headway = out["headway_sec"].to_numpy(dtype=float)
+    threshold = np.where(np.isnan(scheduled_headway), BUNCHING_S, BUNCHING_RATIO * scheduled_headway)
+    out["scheduled_headway_sec"] = scheduled_headway
+    out["headway_gap_sec"] = headway - scheduled_headway
+    out["is_bunched"] = headway < threshold
+    return out[HEADWAY_COLUMNS]
+
+
+def compute_headways(events: pd.DataFrame, scheduled: Schedule = None) -> pd.DataFrame:
+    """
+    Headways for every arrival in events (ArrivalDetector layout; rows other
+    than event == "arrival" are ignored). scheduled is a headway in seconds
+    for all routes, or per route_id (dict/Series); by default each route's
+    median observed headway.
+    """
+    arrivals = _arrivals(events)
+    if arrivals.empty:
+        return pd.DataFrame(columns=HEADWAY_COLUMNS)
+    out = _grouped_diff(arrivals)
+    return _finish(out, _schedule(out, scheduled))
+
+
+class HeadwayTracker:
+    """
+    Live headways: update() takes each tick's new arrival events and returns
+    their headways, continuing from the last arrival seen at every stop.
+    scheduled is as for compute_headways, except that without a schedule
+    there is no observed median to fall back on, so the gap is NaN and
+    bunching uses BUNCHING_S.
+    """
+    def __init__(self, scheduled: Schedule = None):
+        self.scheduled = scheduled
+        # (route_id, route_stop_id) -> (event_time, vehicle_id)
+        self._last: Dict[tuple, tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self._last)
+
+    def update(self, events: pd.DataFrame) -> pd.DataFrame:
+        arrivals = _arrivals(events)
+        if arrivals.empty:
+            return pd.DataFrame(columns=HEADWAY_COLUMNS)
+
+        keys = set(zip(arrivals["route_id"], arrivals["route_stop_id"]))
+        seeds = [(route_id, stop_id, vehicle_id, when)
+                 for (route_id, stop_id), (when, vehicle_id) in self._last.items()
+                 if (route_id, stop_id) in keys]
+        if not seeds:
+            out = _grouped_diff(arrivals)
+        else:
+            seeds = pd.DataFrame(seeds, columns=arrivals.columns)
+            out = _grouped_diff(pd.concat([seeds, arrivals], ignore_index=True))
+            # drop the seeds, and any event older than its stop's last known
+            # arrival: it no longer has a place in the sequence
+            seed_time = pd.Series(seeds["event_time"].to_numpy(),
+                                  index=pd.MultiIndex.from_frame(seeds[["route_id", "route_stop_id"]]))
+            last_seen = seed_time.reindex(pd.MultiIndex.from_frame(out[["route_id", "route_stop_id"]])).to_numpy()
+            times = out["event_time"].to_numpy(dtype="datetime64[ns]")
+            out = out[np.isnat(last_seen) | (times > last_seen)].reset_index(drop=True)
+            if out.empty:
+                return pd.DataFrame(columns=HEADWAY_COLUMNS)
+
+        latest = out.groupby(["route_id", "route_stop_id"], sort=False).tail(1)
+        for route_id, stop_id, when, vehicle_id in zip(latest["route_id"], latest["route_stop_id"],
+                                                       latest["event_time"], latest["vehicle_id"]):
+            self._last[(route_id, stop_id)] = (when, vehicle_id)
+
+        scheduled = _schedule(out, self.scheduled) if self.scheduled is not None else np.full(len(out), np.nan)
+        return _finish(out, scheduled)
+
+
+def time_since_last_arrival(snapshots: pd.DataFrame, events: pd.DataFrame,
+                            max_gap_s: Optional[float] = None) -> pd.Series:
+    """
+    headway_to_prev_bus_sec for normalized snapshots (arrivals.normalize_snapshots):
+    seconds since the last arrival at each snapshot's target stop at or
+    before its snapshot_time. Aligned with snapshots' index; NaN where
+    there is none (or it is older than max_gap_s).
+    """
+    arrivals = _arrivals(events).rename(columns={"event_time": "arrival_time", "vehicle_id": "arrival_vehicle"})
+    # rows are tracked by position: snapshots concatenated across days often
+    # repeat index labels
+    snaps = snapshots[["route_id", "route_stop_id", "snapshot_time"]].assign(
+        _row=np.arange(len(snapshots)),
+    ).dropna(subset=["route_stop_id"])
+    since = np.full(len(snapshots), np.nan)
+    if snaps.empty or arrivals.empty:
+        return pd.Series(since, index=snapshots.index, name="headway_to_prev_bus_sec")
+
+    key_types = {"route_id": "int64", "route_stop_id": "float64"}
+    snaps = snaps.astype(key_types).assign(
+        snapshot_time=pd.to_datetime(snaps["snapshot_time"]).astype("datetime64[ns]"),
+    ).sort_values("snapshot_time")
+    arrivals = arrivals.astype(key_types).assign(
+        arrival_time=arrivals["arrival_time"].astype("datetime64[ns]"),
+    ).sort_values("arrival_time")
+
+    joined = pd.merge_asof(
+        snaps, arrivals[["route_id", "route_stop_id", "arrival_time"]],
+        left_on="snapshot_time", right_on="arrival_time",
+        by=["route_id", "route_stop_id"],
+        direction="backward",
+        tolerance=pd.Timedelta(seconds=max_gap_s) if max_gap_s is not None else None,
+    )
+    since[joined["_row"].to_numpy()] = (joined["snapshot_time"] - joined["arrival_time"]).dt.total_seconds().to_numpy()
+    return pd.Series(since, index=snapshots.index, name="headway_to_prev_bus_sec")
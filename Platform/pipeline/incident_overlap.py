@@ -0,0 +1,223 @@
+"""
+incident_overlap.py
+Per-route "affected metres" from TrafficExtractor incidents.
+
+traffic_incidents.buffered_overlap_length decodes, reprojects and buffers
+the bus route again for every (route, incident) pair. OverlapEngine does the
+route side once: each route is projected, buffered and prepared when it is
+added, and cached under the hash of its encoded polyline so an unchanged
+route is never rebuilt. Each tick's incident segments are projected in one
+transformer call, built into shapely geometries in one vectorized call and
+indexed with an STRtree; every route buffer then queries the tree and clips
+only its candidate segments.
+
+Clipped pieces are linear-referenced onto the route centreline as
+[start_m, end_m) ranges, and lengths are the union of those ranges: a
+stretch of route under two incidents (or under two links of one incident)
+counts once, and a link that merely crosses the route adds nothing.
+
+Lengths are measured in UTM 16N (see route_geometry), i.e. true metres;
+buffered_overlap_length's EPSG:3857 overstates lengths by about 20% at
+Atlanta's latitude.
+"""
+
+import hashlib
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from route_geometry import PROJECTED_CRS, get_transformer
+
+# half-width of the corridor around a route that counts as "on" it
+BUFFER_M = 1.0
+
+PAIR_COLUMNS = ["route_id", "incident", "type", "is_road_closed", "overlap_m"]
+INTERVAL_COLUMNS = ["route_id", "incident", "is_road_closed", "start_m", "end_m"]
+FEATURE_COLUMNS = ["route_id", "affected_m", "closed_m", "incidents"]
+
+
+def _polyline_key(encoded: str) -> str:
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def _lines_from_polylines(encoded: Iterable[str], crs: str):
+    """Decode and project encoded polylines into an array of LineStrings (metres)."""
+    import polyline
+    import shapely
+
+    decoded = [polyline.decode(e) for e in encoded]
+    keep = [i for i, pts in enumerate(decoded) if len(pts) >= 2]
+    if not keep:
+        return np.empty(0, dtype=object), np.empty(0, dtype=int)
+
+    counts = np.array([len(decoded[i]) for i in keep])
+    latlon = np.array([pt for i in keep for pt in decoded[i]], dtype=float)
+    x, y = get_transformer(crs).transform(latlon[:, 1], latlon[:, 0])
+    lines = shapely.linestrings(np.column_stack([x, y]), indices=np.repeat(np.arange(len(keep)), counts))
+    return lines, np.asarray(keep)
+
+
+def _union_length(group: np.ndarray, starts: np.ndarray, ends: np.ndarray, n_groups: int) -> np.ndarray:
+    """Length of the union of the [start, end) ranges in each group (codes 0..n_groups-1)."""
+    if len(starts) == 0:
+        return np.zeros(n_groups)
+    # lay the groups end to end so one running maximum never crosses between them
+    span = float(ends.max() - starts.min()) + 1.0
+    lo = starts - starts.min() + group * span
+    hi = ends - starts.min() + group * span
+    order = np.argsort(lo, kind="stable")
+    lo, hi, group = lo[order], hi[order], group[order]
+    covered_to = np.concatenate([[-np.inf], np.maximum.accumulate(hi)[:-1]])
+    return np.bincount(group, weights=np.maximum(0.0, hi - np.maximum(lo, covered_to)), minlength=n_groups)
+
+
+class OverlapEngine:
+    """
+    Cached route corridors plus a per-tick STRtree over incident segments.
+    """
+    def __init__(self, buffer_m: float = BUFFER_M, crs: str = PROJECTED_CRS):
+        self.buffer_m = buffer_m
+        self.crs = crs
+        # polyline hash -> prepared corridor polygon, and its centreline
+        self._corridors: Dict[str, object] = {}
+        self._centerlines: Dict[str, object] = {}
+        # route_id -> polyline hash
+        self._routes: Dict[object, str] = {}
+
+    def set_routes(self, shapes: pd.DataFrame) -> None:
+        """
+        Register routes from BusExtractor.get_route_shapes() (route_id,
+        encoded_polyline). Corridors are only built for polylines not
+        already cached.
+        """
+        import shapely
+
+        routes = {rid: enc for rid, enc in zip(shapes["route_id"], shapes["encoded_polyline"])
+                  if isinstance(enc, str) and enc}
+        self._routes = {rid: _polyline_key(enc) for rid, enc in routes.items()}
+
+        missing = {key: routes[rid] for rid, key in self._routes.items() if key not in self._corridors}
+        if missing:
+            lines, kept = _lines_from_polylines(missing.values(), self.crs)
+            keys = list(missing)
+            corridors = shapely.buffer(lines, self.buffer_m)
+            shapely.prepare(corridors)
+            self._corridors.update({keys[i]: corridor for i, corridor in zip(kept, corridors)})
+            self._centerlines.update({keys[i]: line for i, line in zip(kept, lines)})
+
+        live = set(self._routes.values())
+        self._corridors = {key: corridor for key, corridor in self._corridors.items() if key in live}
+        self._centerlines = {key: line for key, line in self._centerlines.items() if key in live}
+
+    def intervals(self, incidents: pd.DataFrame) -> pd.DataFrame:
+        """
+        Stretches of each route under each incident, for a TrafficExtractor
+        frame (polylines is a list of encoded links): one row per clipped
+        piece, as [start_m, end_m) along the route centreline.
+        """
+        import shapely
+
+        if incidents.empty or not self._routes:
+            return pd.DataFrame(columns=INTERVAL_COLUMNS)
+
+        links = incidents["polylines"].map(lambda p: list(p) if isinstance(p, (list, tuple, np.ndarray)) else [p])
+        link_incident = np.repeat(np.arange(len(incidents)), links.map(len).to_numpy())
+        encoded = [link for row in links for link in row]
+        segments, kept = _lines_from_polylines(encoded, self.crs)
+        if len(segments) == 0:
+            return pd.DataFrame(columns=INTERVAL_COLUMNS)
+        segment_incident = link_incident[kept]
+        tree = shapely.STRtree(segments)
+
+        route_ids: List = []
+        incident_idx: List[np.ndarray] = []
+        starts: List[np.ndarray] = []
+        ends: List[np.ndarray] = []
+        for route_id, key in self._routes.items():
+            corridor = self._corridors.get(key)
+            if corridor is None:
+                continue
+            candidates = tree.query(corridor, predicate="intersects")
+            if candidates.size == 0:
+                continue
+            clipped = shapely.intersection(segments[candidates], corridor)
+            parts, part_of = shapely.get_parts(clipped, return_index=True)
+            lines = shapely.get_type_id(parts) == 1
+            parts, part_of = parts[lines], part_of[lines]
+            if parts.size == 0:
+                continue
+
+            # every consecutive vertex pair of a piece becomes a range along the route
+            coords, vertex_part = shapely.get_coordinates(parts, return_index=True)
+            along = shapely.line_locate_point(self._centerlines[key], shapely.points(coords))
+            pair = vertex_part[1:] == vertex_part[:-1]
+            lo = np.minimum(along[:-1], along[1:])[pair]
+            hi = np.maximum(along[:-1], along[1:])[pair]
+            step = np.hypot(*(coords[1:] - coords[:-1]).T)[pair]
+            # drop crossings (no length along the route, up to rounding) and
+            # ranges much longer than their step, which straddle the start of a loop route
+            keep = (hi - lo > 1e-3) & (hi - lo <= step + 2 * self.buffer_m + 1e-6)
+            if not keep.any():
+                continue
+
+            route_ids.extend([route_id] * int(keep.sum()))
+            incident_idx.append(segment_incident[candidates[part_of[vertex_part[:-1][pair][keep]]]])
+            starts.append(lo[keep])
+            ends.append(hi[keep])
+
+        if not route_ids:
+            return pd.DataFrame(columns=INTERVAL_COLUMNS)
+
+        incident = np.concatenate(incident_idx)
+        closed = (incidents["is_road_closed"].fillna(False).astype(bool).to_numpy()
+                  if "is_road_closed" in incidents else np.zeros(len(incidents), bool))
+        return pd.DataFrame({
+            "route_id": route_ids,
+            "incident": incident,
+            "is_road_closed": closed[incident],
+            "start_m": np.concatenate(starts),
+            "end_m": np.concatenate(ends),
+        })[INTERVAL_COLUMNS]
+
+    def overlaps(self, incidents: pd.DataFrame, intervals: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        One row per (route, incident) with overlap_m > 0: metres of the route
+        under that incident, each stretch counted once.
+        """
+        intervals = self.intervals(incidents) if intervals is None else intervals
+        if intervals.empty:
+            return pd.DataFrame(columns=PAIR_COLUMNS)
+
+        codes = intervals.groupby(["route_id", "incident"], sort=False).ngroup().to_numpy()
+        pairs = intervals[["route_id", "incident"]].drop_duplicates().reset_index(drop=True)
+        pairs["overlap_m"] = _union_length(codes, intervals["start_m"].to_numpy(float),
+                                           intervals["end_m"].to_numpy(float), len(pairs))
+        pairs = pairs[pairs["overlap_m"] > 0]
+        pairs["type"] = incidents["type"].to_numpy()[pairs["incident"]] if "type" in incidents else None
+        closed = incidents["is_road_closed"].fillna(False).astype(bool).to_numpy() if "is_road_closed" in incidents else np.zeros(len(incidents), bool)
+        pairs["is_road_closed"] = closed[pairs["incident"]]
+        return pairs[PAIR_COLUMNS].reset_index(drop=True)
+
+    def affected_meters(self, incidents: pd.DataFrame, intervals: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        Per-route feature table: metres of route under any incident
+        (affected_m), under a road closure (closed_m), and the number of
+        incidents touching it. Overlapping incidents are counted once per
+        metre. Every registered route gets a row.
+        """
+        intervals = self.intervals(incidents) if intervals is None else intervals
+        table = pd.DataFrame({"route_id": list(self._routes)})
+        if intervals.empty:
+            return table.assign(affected_m=0.0, closed_m=0.0, incidents=0)[FEATURE_COLUMNS]
+
+        codes, routes = pd.factorize(intervals["route_id"])
+        starts, ends = intervals["start_m"].to_numpy(float), intervals["end_m"].to_numpy(float)
+        closed = intervals["is_road_closed"].to_numpy(bool)
+        per_route = pd.DataFrame({
+            "affected_m": _union_length(codes, starts, ends, len(routes)),
+            "closed_m": _union_length(codes[closed], starts[closed], ends[closed], len(routes)),
+            "incidents": intervals.groupby(codes)["incident"].nunique().reindex(range(len(routes)), fill_value=0).to_numpy(),
+        }, index=routes)
+        table = table.merge(per_route, left_on="route_id", right_index=True, how="left")
+        return table.fillna({"affected_m": 0.0, "closed_m": 0.0, "incidents": 0}).astype({"incidents": int})[FEATURE_COLUMNS]
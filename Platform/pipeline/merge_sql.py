@@ -0,0 +1,110 @@
+"""
+merge_sql.py
+Staging -> core MERGE statements run by ForwardPipeline after each batch.
+
+Each statement moves one source_batch ($1) out of its staging table (the
+rows are deleted from staging as they are inserted into core), so a batch
+is merged exactly once. The staging tables are typed (staging_schema; the
+COPY casts every frame to them), so the merges read the columns as they
+are. DbRepository prepares these once per pooled connection.
+
+stop_events is upserted on its natural key: the vehicle, the stop it is
+heading to, and the time of its GPS fix. A retried or overlapping tick that
+re-reads an unchanged fix updates the existing row instead of adding one.
+The ON CONFLICT target is the unique index MERGE_INDEX, created by the
+one-off migration MERGE_DDL (run_pipeline.py --migrate). ForwardPipeline
+only checks that the index exists and refuses to start without it.
+
+MERGE_DDL needs:
+  - PostgreSQL 15+, for NULLS NOT DISTINCT (a fix with no destination stop
+    still conflicts with itself)
+  - stop_events.snapshot_time of type timestamp (without time zone): the
+    index is on snapshot_time::date, which is only IMMUTABLE, and so only
+    indexable, for a naive timestamp
+It first deletes existing duplicates on the key, keeping the latest
+snapshot_time as the merge does, under a lock that holds off concurrent
+inserts until the index is in place.
+"""
+
+MERGE_INDEX = "stop_events_natural_key"
+
+MERGE_DDL = f"""
+LOCK TABLE stop_events IN SHARE ROW EXCLUSIVE MODE;
+
+DELETE FROM stop_events AS s
+USING (
+    SELECT ctid, row_number() OVER (
+        PARTITION BY bus_id, destination_route_stop_id, (snapshot_time::date), time_of_day
+        ORDER BY snapshot_time DESC, ctid DESC
+    ) AS n
+    FROM stop_events
+) AS ranked
+WHERE s.ctid = ranked.ctid AND ranked.n > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS {MERGE_INDEX} ON stop_events
+    (bus_id, destination_route_stop_id, (snapshot_time::date), time_of_day)
+    NULLS NOT DISTINCT;
+"""
+
+SQL_MERGE_STOP_EVENTS = """
+WITH moved AS (
+    DELETE FROM staging_stop_events
+    WHERE source_batch = $1
+    RETURNING *
+)
+INSERT INTO stop_events (
+    bus_id, route_id, latitude, longitude, day_of_week, month, time_of_day,
+    bus_speed, destination_route_stop_id, eta_to_stop, snapshot_time,
+    capacity, occupancy, source_batch
+)
+SELECT DISTINCT ON (bus_id, destination_route_stop_id, snapshot_time::date, time_of_day)
+    bus_id, route_id, latitude, longitude, day_of_week, month, time_of_day,
+    bus_speed, destination_route_stop_id, eta_to_stop, snapshot_time,
+    capacity, occupancy, source_batch
+FROM moved
+ORDER BY bus_id, destination_route_stop_id, snapshot_time::date, time_of_day, snapshot_time DESC
+ON CONFLICT (bus_id, destination_route_stop_id, (snapshot_time::date), time_of_day) DO UPDATE SET
+    eta_to_stop = EXCLUDED.eta_to_stop,
+    capacity = EXCLUDED.capacity,
+    occupancy = EXCLUDED.occupancy,
+    source_batch = EXCLUDED.source_batch
+"""
+
+SQL_MERGE_WEATHER = """
+WITH moved AS (
+    DELETE FROM staging_weather
+    WHERE source_batch = $1
+    RETURNING *
+)
+INSERT INTO weather_data (
+    recorded_at, snapshot_time, temperature, precipitation_probability,
+    wind_speed, conditions, source_batch
+)
+SELECT
+    recorded_at, snapshot_time, temperature, precipitation_probability,
+    wind_speed, conditions, source_batch
+FROM moved
+"""
+
+SQL_MERGE_TRAFFIC = """
+WITH moved AS (
+    DELETE FROM staging_traffic
+    WHERE source_batch = $1
+    RETURNING *
+)
+INSERT INTO traffic_incidents (
+    polylines, type, is_road_closed, start_time, end_time, comment,
+    snapshot_time, source_batch
+)
+SELECT
+    polylines, type, is_road_closed, start_time, end_time, comment,
+    snapshot_time, source_batch
+FROM moved
+"""
+
+# prepared statement name -> SQL; every statement takes source_batch as $1
+MERGE_STATEMENTS = {
+    "merge_stop_events": SQL_MERGE_STOP_EVENTS,
+    "merge_weather": SQL_MERGE_WEATHER,
+    "merge_traffic": SQL_MERGE_TRAFFIC,
+}
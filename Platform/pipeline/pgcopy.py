@@ -0,0 +1,242 @@
+"""
+pgcopy.py
+Streaming COPY sources for DbRepository.
+
+BinaryCopyStream encodes DataFrames into PostgreSQL's binary COPY format a
+chunk of rows at a time, straight from the column arrays: numeric, boolean and
+timestamp columns are byte-swapped with NumPy instead of being rendered to
+text, and only one encoded chunk is held in memory at once.
+
+Binary COPY does no type coercion, so each frame column must match its
+staging column's type:
+
+    bool / boolean          -> boolean
+    int16 / Int16           -> smallint
+    int32 / Int32           -> integer
+    int64 / Int64           -> bigint
+    float32                 -> real
+    float64                 -> double precision
+    datetime64 (naive)      -> timestamp
+    datetime64 (tz-aware)   -> timestamptz
+    anything else           -> text / varchar (UTF-8 of str(value))
+
+cast_frame converts a frame to a staging schema (staging_schema) first, so
+an int column that turned float64 because of a None, or times held as
+strings, are encoded as the column types the table actually has. The
+streams apply it to every chunk when given a schema.
+
+CsvCopyStream is the text-format fallback for tables that don't line up.
+"""
+
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 50_000
+
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+PGCOPY_TRAILER = struct.pack(">h", -1)
+
+# microseconds between the Unix epoch and PostgreSQL's 2000-01-01 epoch
+_PG_EPOCH_US = 946_684_800_000_000
+
+_FIXED_WIDTH = {
+    "bool": ">u1",
+    "int8": ">i2",      # no 1-byte integer in PostgreSQL
+    "int16": ">i2",
+    "int32": ">i4",
+    "int64": ">i8",
+    "uint8": ">i2",
+    "uint16": ">i4",
+    "uint32": ">i8",
+    "float32": ">f4",
+    "float64": ">f8",
+}
+
+
+def _encode_column(series: pd.Series):
+    """
+    Encode one column as (sizes, payload): sizes is the per-row byte length
+    (-1 for NULL) and payload the concatenated bytes of the non-NULL values.
+    """
+    dtype = series.dtype
+    mask = series.notna().to_numpy()
+
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        values = series
+        if getattr(dtype, "tz", None) is not None:
+            values = values.dt.tz_convert("UTC").dt.tz_localize(None)
+        micros = values.to_numpy(dtype="datetime64[us]")[mask].astype(np.int64) - _PG_EPOCH_US
+        payload = micros.astype(">i8").view(np.uint8)
+        sizes = np.where(mask, 8, -1)
+        return sizes, payload
+
+    numpy_dtype = dtype.numpy_dtype if isinstance(dtype, pd.api.extensions.ExtensionDtype) and hasattr(dtype, "numpy_dtype") else dtype
+    if isinstance(numpy_dtype, np.dtype) and numpy_dtype.name in _FIXED_WIDTH:
+        wire = np.dtype(_FIXED_WIDTH[numpy_dtype.name])
+        values = series[mask].to_numpy(dtype=numpy_dtype.name)
+        payload = values.astype(wire).view(np.uint8)
+        sizes = np.where(mask, wire.itemsize, -1)
+        return sizes, payload
+
+    encoded = [str(value).encode("utf-8") for value in series.to_numpy(dtype=object)[mask]]
+    payload = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    sizes = np.full(len(series), -1, dtype=np.int64)
+    sizes[mask] = [len(value) for value in encoded]
+    return sizes, payload
+
+
+# staging column type -> pandas dtype it is encoded from
+_PANDAS_TYPES = {
+    "smallint": "Int16",
+    "integer": "Int32",
+    "bigint": "Int64",
+    "real": "float32",
+    "double precision": "float64",
+    "boolean": "boolean",
+}
+
+
+def _cast_column(series: pd.Series, pg_type: str) -> pd.Series:
+    if pg_type in _PANDAS_TYPES:
+        dtype = _PANDAS_TYPES[pg_type]
+        if dtype == "boolean":
+            return series.astype("boolean")
+        # raises on non-numeric text, and on fractional values for integer columns
+        return pd.to_numeric(series).astype(dtype)
+    if pg_type == "timestamptz":
+        return pd.to_datetime(series, format="mixed", utc=True)
+    if pg_type == "timestamp":
+        values = series if pd.api.types.is_datetime64_any_dtype(series) else pd.to_datetime(series, format="mixed")
+        # like PostgreSQL's text -> timestamp: keep the wall clock, drop the offset
+        return values.dt.tz_localize(None) if values.dt.tz is not None else values
+    return series.astype(object).where(series.notna(), None)
+
+
+def cast_frame(frame: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """
+    Return frame with every column converted to the dtype its schema type
+    is encoded from (bigint -> Int64, timestamp -> datetime64, ...).
+    Columns missing from frame are left out (NULL in the table); columns
+    not in schema are an error.
+    """
+    unknown = [col for col in frame.columns if col not in schema]
+    if unknown:
+        raise ValueError(f"Columns {unknown} are not in the staging schema")
+    return pd.DataFrame({col: _cast_column(frame[col], schema[col]) for col in frame.columns}, index=frame.index)
+
+
+def encode_binary_rows(frame: pd.DataFrame) -> bytes:
+    """Encode every row of frame as binary COPY tuples (no header/trailer)."""
+    n_rows, n_cols = frame.shape
+    if n_rows == 0:
+        return b""
+
+    columns = [_encode_column(frame.iloc[:, i]) for i in range(n_cols)]
+
+    # tuple = int16 field count, then per field int32 length + payload
+    row_bytes = np.full(n_rows, 2, dtype=np.int64)
+    for sizes, _ in columns:
+        row_bytes += 4 + np.maximum(sizes, 0)
+    cursor = np.cumsum(row_bytes) - row_bytes
+
+    out = np.empty(int(row_bytes.sum()), dtype=np.uint8)
+    out[cursor[:, None] + np.arange(2)] = np.frombuffer(struct.pack(">h", n_cols), dtype=np.uint8)
+    cursor += 2
+
+    for sizes, payload in columns:
+        out[cursor[:, None] + np.arange(4)] = sizes.astype(">i4").view(np.uint8).reshape(-1, 4)
+        cursor += 4
+
+        present = sizes > 0
+        if payload.size:
+            lengths = sizes[present]
+            starts = cursor[present]
+            # byte i of the payload lands at starts[row] + (i - offset of row in payload)
+            offsets = np.cumsum(lengths) - lengths
+            out[np.repeat(starts - offsets, lengths) + np.arange(payload.size)] = payload
+        cursor += np.maximum(sizes, 0)
+
+    return out.tobytes()
+
+
+def iter_chunks(frame: pd.DataFrame, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(frame), chunk_rows):
+        yield frame.iloc[start:start + chunk_rows]
+
+
+class _ChunkedStream:
+    """
+    File-like object for cursor.copy_expert: read() hands out one encoded
+    chunk at a time, pulling the next frame only when the buffer runs dry.
+    """
+    def __init__(self, frames: Iterable[pd.DataFrame], extra_cols: Optional[Dict] = None,
+                 schema: Optional[Dict[str, str]] = None):
+        self._frames = iter(frames)
+        self.extra_cols = extra_cols or {}
+        self.schema = schema
+        self.columns: Optional[List[str]] = None
+        self.rows = 0
+        self._buffer = memoryview(self._start())
+        self._done = False
+
+    def _start(self) -> bytes:
+        return b""
+
+    def _finish(self) -> bytes:
+        return b""
+
+    def _encode(self, frame: pd.DataFrame) -> bytes:
+        raise NotImplementedError
+
+    def _next_chunk(self) -> bytes:
+        for frame in self._frames:
+            if frame.empty:
+                continue
+            if self.extra_cols:
+                frame = frame.assign(**self.extra_cols)
+            if self.schema is not None:
+                frame = cast_frame(frame, self.schema)
+            if self.columns is None:
+                self.columns = list(frame.columns)
+            elif list(frame.columns) != self.columns:
+                raise ValueError(f"Chunk columns {list(frame.columns)} differ from {self.columns}")
+            self.rows += len(frame)
+            return self._encode(frame)
+        self._done = True
+        return self._finish()
+
+    def peek_columns(self) -> Optional[List[str]]:
+        """Encode the first chunk early so the COPY column list is known."""
+        if self.columns is None and not self._done:
+            self._buffer = memoryview(bytes(self._buffer) + self._next_chunk())
+        return self.columns
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._done and (size < 0 or len(self._buffer) < size):
+            self._buffer = memoryview(bytes(self._buffer) + self._next_chunk())
+        if size < 0 or size >= len(self._buffer):
+            data, self._buffer = bytes(self._buffer), memoryview(b"")
+        else:
+            data, self._buffer = bytes(self._buffer[:size]), self._buffer[size:]
+        return data
+
+
+class BinaryCopyStream(_ChunkedStream):
+    """Frames -> COPY ... FROM STDIN WITH (FORMAT binary)."""
+    def _start(self) -> bytes:
+        return PGCOPY_HEADER
+
+    def _finish(self) -> bytes:
+        return PGCOPY_TRAILER
+
+    def _encode(self, frame: pd.DataFrame) -> bytes:
+        return encode_binary_rows(frame)
+
+
+class CsvCopyStream(_ChunkedStream):
+    """Frames -> COPY ... FROM STDIN WITH CSV, one chunk of text at a time."""
+    def _encode(self, frame: pd.DataFrame) -> bytes:
+        return frame.to_csv(index=False, header=False).encode("utf-8")
@@ -1,23 +1,138 @@
-import io
 import pandas as pd
-import psycopg2
+from contextlib import contextmanager
+from psycopg2.pool import ThreadedConnectionPool
+from typing import Dict, Iterable, Iterator, Optional
+
+from pgcopy import CHUNK_ROWS, BinaryCopyStream, CsvCopyStream, iter_chunks
+from staging_schema import STAGING_DDL, STAGING_SCHEMAS
 
 class DbRepository:
-    def __init__(self, dsn: str):
+    """
+    PostgreSQL access for the pipeline over a small connection pool.
+
+    Use batch() to stage several frames and merge them into core tables in
+    one transaction; the standalone copy_to_staging / merge_core calls each
+    run in their own transaction on a pooled connection.
+    """
+    # bytes handed to COPY per read from the stream
+    COPY_READ_SIZE = 1 << 20
+
+    def __init__(self, dsn: str, minconn: int = 1, maxconn: int = 4):
         self.dsn = dsn
-    
-    def copy_to_staging(self, df: pd.DataFrame, table: str, extra_cols: dict) -> int:
+        self.pool = ThreadedConnectionPool(minconn, maxconn, dsn)
+        # prepared statement name -> SQL (taking source_batch text as $1)
+        self.statements: Dict[str, str] = {}
+        # backend pid -> names already PREPAREd on that connection
+        self._prepared: Dict[int, set] = {}
+
+    def prepare(self, name: str, sql: str) -> None:
+        """Register sql to be PREPAREd as name on each pooled connection on first use."""
+        self.statements[name] = sql
+
+    @contextmanager
+    def batch(self) -> Iterator["RepositoryBatch"]:
+        """
+        One transaction on one pooled connection: commits when the block
+        exits cleanly, rolls back if it raises.
+        """
+        conn = self.pool.getconn()
+        try:
+            yield RepositoryBatch(self, conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def create_staging_tables(self) -> None:
+        """Create the staging tables (staging_schema.STAGING_DDL) if they don't exist."""
+        with self.batch() as batch:
+            batch.execute(STAGING_DDL)
+
+    def copy_to_staging(self, df: pd.DataFrame, table: str, extra_cols: dict,
+                        chunk_rows: int = CHUNK_ROWS, binary: bool = True) -> int:
+        """
+        COPY df (plus constant extra_cols) into table, streaming chunk_rows
+        rows at a time. Frames for the tables in STAGING_SCHEMAS are cast to
+        the table's column types first. binary=True encodes typed columns
+        directly (see pgcopy for the dtype -> column type mapping);
+        binary=False streams CSV text.
+        """
+        if df.empty: return 0
+        with self.batch() as batch:
+            return batch.copy_to_staging(df, table, extra_cols, chunk_rows=chunk_rows, binary=binary)
+
+    def copy_csv_to_staging(self, path: str, table: str, extra_cols: dict,
+                            chunk_rows: int = CHUNK_ROWS, binary: bool = True, **read_csv_kwargs) -> int:
+        """
+        Backfill table from a CSV file with bounded memory: the file is read
+        and copied chunk_rows rows at a time. Pass dtype=/parse_dates= so
+        every chunk has the same column types.
+        """
+        frames = pd.read_csv(path, chunksize=chunk_rows, **read_csv_kwargs)
+        return self.copy_frames_to_staging(frames, table, extra_cols, binary=binary)
+
+    def copy_frames_to_staging(self, frames: Iterable[pd.DataFrame], table: str, extra_cols: Optional[dict] = None,
+                               binary: bool = True) -> int:
+        with self.batch() as batch:
+            return batch.copy_frames_to_staging(frames, table, extra_cols, binary=binary)
+
+    def execute(self, sql: str) -> None:
+        with self.batch() as batch:
+            batch.execute(sql)
+
+    def index_exists(self, name: str) -> bool:
+        with self.batch() as batch:
+            with batch.conn.cursor() as cur:
+                cur.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+                return cur.fetchone()[0]
+
+    def merge_core(self, sql: str) -> int:
+        with self.batch() as batch:
+            return batch.merge_core(sql)
+
+    def close(self) -> None:
+        self.pool.closeall()
+        self._prepared.clear()
+
+
+class RepositoryBatch:
+    """Staging and merge operations bound to one DbRepository.batch() transaction."""
+    def __init__(self, repo: DbRepository, conn):
+        self.repo = repo
+        self.conn = conn
+
+    def copy_to_staging(self, df: pd.DataFrame, table: str, extra_cols: dict,
+                        chunk_rows: int = CHUNK_ROWS, binary: bool = True) -> int:
         if df.empty: return 0
-        frame = df.assign(**extra_cols)
-        buf = io.StringIO()
-        cols = list(frame.columns)
-        frame.to_csv(buf, index=False, header=False)
-        buf.seek(0)
-        with psycopg2.connect(self.dsn) as conn, conn.cursor() as cur:
-            cur.copy_expert(f"COPY {table} ({','.join(cols)}) FROM STDIN WITH CSV", buf)
-        return len(frame)
+        return self.copy_frames_to_staging(iter_chunks(df, chunk_rows), table, extra_cols, binary=binary)
+
+    def copy_frames_to_staging(self, frames: Iterable[pd.DataFrame], table: str, extra_cols: Optional[dict] = None,
+                               binary: bool = True) -> int:
+        stream = (BinaryCopyStream if binary else CsvCopyStream)(frames, extra_cols, STAGING_SCHEMAS.get(table))
+        cols = stream.peek_columns()
+        if cols is None: return 0
+        fmt = "(FORMAT binary)" if binary else "CSV"
+        with self.conn.cursor() as cur:
+            cur.copy_expert(f"COPY {table} ({','.join(cols)}) FROM STDIN WITH {fmt}", stream, size=self.repo.COPY_READ_SIZE)
+        return stream.rows
+
+    def merge(self, name: str, source_batch: str) -> int:
+        """EXECUTE the prepared statement registered as name for source_batch."""
+        prepared = self.repo._prepared.setdefault(self.conn.info.backend_pid, set())
+        with self.conn.cursor() as cur:
+            if name not in prepared:
+                cur.execute(f"PREPARE {name} (text) AS {self.repo.statements[name]}")
+                prepared.add(name)
+            cur.execute(f"EXECUTE {name} (%s)", (source_batch,))
+            return cur.rowcount
+
+    def execute(self, sql: str) -> None:
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
 
     def merge_core(self, sql: str) -> int:
-        with psycopg2.connect(self.dsn) as conn, conn.cursor() as cur:
+        with self.conn.cursor() as cur:
             cur.execute(sql)
-            return cur.rowcount
\ No newline at end of file
+            return cur.rowcount
@@ -0,0 +1,311 @@
+"""
+road_snapping.py
+Offline map matching against a local road graph.
+
+traffic_incidents.snap_segment_to_roads sends every 100 points to Google's
+snapToRoads, which is slow, rate-limited and needs network. RoadNetwork
+instead loads a road extract once (OSM XML or GeoJSON LineStrings), projects
+it to metres (see route_geometry), and keeps:
+
+  - the directed edge list (one edge per consecutive node pair of a way,
+    honouring oneway tags) and its sparse adjacency matrix
+  - a KD-tree over points sampled every sample_m along every edge
+
+snap_points() is a vectorized nearest-edge snap for whole columns of
+positions. match_trace() is an HMM matcher (Newson & Krumm): candidates are
+the nearest edges, emissions are Gaussian in the GPS offset, transitions
+compare the on-road distance between consecutive candidates with the
+straight-line distance between fixes, and Viterbi picks the path. On-road
+distances come from Dijkstra rows that are cached per source node, so a day
+of history mostly reuses them. Everything is local and CPU-bound.
+
+No extract is shipped with the repo. A campus extract can be saved as OSM XML
+from the Overpass API, e.g.
+
+    [out:xml];
+    way["highway"](33.765,-84.410,33.795,-84.380);
+    (._;>;);
+    out body;
+"""
+
+import json
+import math
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from route_geometry import PROJECTED_CRS, project
+
+SAMPLE_M = 10.0
+SEARCH_RADIUS_M = 50.0
+CANDIDATES = 5
+GPS_SIGMA_M = 5.0
+TRANSITION_BETA_M = 30.0
+DIJKSTRA_LIMIT_M = 3_000.0
+DIJKSTRA_CACHE = 4_096
+
+# highway values buses can't use
+EXCLUDED_HIGHWAYS = {"footway", "path", "steps", "cycleway", "pedestrian", "bridleway", "track", "corridor", "elevator"}
+
+
+class RoadNetwork:
+    """In-memory directed road graph with a spatial index over its edges."""
+    def __init__(self, node_lat: Sequence[float], node_lon: Sequence[float],
+                 edges: Sequence[Tuple[int, int]], edge_names: Optional[Sequence[str]] = None,
+                 sample_m: float = SAMPLE_M, crs: str = PROJECTED_CRS):
+        from scipy.sparse import csr_matrix
+        from scipy.spatial import cKDTree
+
+        self.crs = crs
+        self.node_xy = project(node_lat, node_lon, crs)
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        self.u, self.v = edges[:, 0], edges[:, 1]
+        self.edge_names = np.asarray(edge_names if edge_names is not None else [None] * len(edges), dtype=object)
+
+        ab = self.node_xy[self.v] - self.node_xy[self.u]
+        self.length = np.hypot(ab[:, 0], ab[:, 1])
+
+        n = len(self.node_xy)
+        self.graph = csr_matrix((np.maximum(self.length, 1e-6), (self.u, self.v)), shape=(n, n))
+
+        # sample points along every edge; each maps back to its edge
+        pieces = np.maximum(np.ceil(self.length / sample_m).astype(int), 1)
+        self._sample_edge = np.repeat(np.arange(len(edges)), pieces + 1)
+        frac = np.concatenate([np.linspace(0.0, 1.0, k + 1) for k in pieces]) if len(edges) else np.empty(0)
+        samples = self.node_xy[self.u][self._sample_edge] + ab[self._sample_edge] * frac[:, None]
+        self._tree = cKDTree(samples)
+
+        self._dijkstra_rows: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._inverse = None
+
+    # ------------------------------------------------------------------ loading
+
+    @classmethod
+    def from_osm(cls, path: Union[str, Path], **kwargs) -> "RoadNetwork":
+        """Load an OSM XML extract, keeping drivable highway ways."""
+        nodes: Dict[int, Tuple[float, float]] = {}
+        ways: List[Tuple[List[int], Dict[str, str]]] = []
+        for _, elem in ET.iterparse(str(path), events=("end",)):
+            if elem.tag == "node":
+                nodes[int(elem.get("id"))] = (float(elem.get("lat")), float(elem.get("lon")))
+                elem.clear()
+            elif elem.tag == "way":
+                tags = {tag.get("k"): tag.get("v") for tag in elem.iter("tag")}
+                if tags.get("highway") and tags["highway"] not in EXCLUDED_HIGHWAYS:
+                    ways.append(([int(nd.get("ref")) for nd in elem.iter("nd")], tags))
+                elem.clear()
+        return cls._from_ways(nodes, ways, **kwargs)
+
+    @classmethod
+    def from_geojson(cls, path: Union[str, Path], **kwargs) -> "RoadNetwork":
+        """
+        Load LineString / MultiLineString features; coordinates shared by
+        features become shared graph nodes. properties.oneway is honoured.
+        """
+        with open(path) as f:
+            features = json.load(f)["features"]
+        nodes: Dict[Tuple[float, float], Tuple[float, float]] = {}
+        ways = []
+        for feature in features:
+            geometry = feature.get("geometry") or {}
+            parts = geometry.get("coordinates", [])
+            if geometry.get("type") == "LineString":
+                parts = [parts]
+            elif geometry.get("type") != "MultiLineString":
+                continue
+            tags = {k: str(v) for k, v in (feature.get("properties") or {}).items()}
+            for part in parts:
+                refs = []
+                for lon, lat, *_ in part:
+                    key = (round(lat, 7), round(lon, 7))
+                    nodes[key] = key
+                    refs.append(key)
+                ways.append((refs, tags))
+        return cls._from_ways(nodes, ways, **kwargs)
+
+    @classmethod
+    def _from_ways(cls, nodes, ways, **kwargs) -> "RoadNetwork":
+        index: Dict[object, int] = {}
+        edges: List[Tuple[int, int]] = []
+        names: List[Optional[str]] = []
+        for refs, tags in ways:
+            refs = [ref for ref in refs if ref in nodes]
+            ids = [index.setdefault(ref, len(index)) for ref in refs]
+            oneway = tags.get("oneway", "no")
+            for a, b in zip(ids, ids[1:]):
+                if a == b:
+                    continue
+                if oneway != "-1":
+                    edges.append((a, b))
+                    names.append(tags.get("name"))
+                if oneway not in ("yes", "true", "1"):
+                    edges.append((b, a))
+                    names.append(tags.get("name"))
+        if not edges:
+            raise ValueError("No drivable road edges found in the extract")
+        latlon = np.array([nodes[ref] for ref in index], dtype=float)
+        return cls(latlon[:, 0], latlon[:, 1], edges, names, **kwargs)
+
+    # ---------------------------------------------------------------- geometry
+
+    def _candidates(self, xy: np.ndarray, k: int, radius_m: float):
+        """
+        Exact projections of each point onto its nearby edges: arrays of
+        (edge, fraction along edge, foot xy, offset) shaped (n, m), with
+        offset = inf where there is no candidate.
+        """
+        m = min(max(4 * k, 8), len(self._sample_edge))
+        dist, sample = self._tree.query(xy, k=m, distance_upper_bound=radius_m + SAMPLE_M)
+        dist, sample = dist.reshape(len(xy), m), sample.reshape(len(xy), m)
+        found = np.isfinite(dist)
+        edge = np.where(found, self._sample_edge[np.minimum(sample, len(self._sample_edge) - 1)], 0)
+
+        a = self.node_xy[self.u[edge]]
+        ab = self.node_xy[self.v[edge]] - a
+        t = np.clip(((xy[:, None, :] - a) * ab).sum(axis=2) / np.maximum((ab ** 2).sum(axis=2), 1e-12), 0.0, 1.0)
+        foot = a + ab * t[..., None]
+        offset = np.hypot(*(xy[:, None, :] - foot).transpose(2, 0, 1))
+        offset = np.where(found & (offset <= radius_m), offset, np.inf)
+        return edge, t, foot, offset
+
+    def _to_latlon(self, xy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self._inverse is None:
+            from pyproj import Transformer
+
+            self._inverse = Transformer.from_crs(self.crs, "EPSG:4326", always_xy=True)
+        lon, lat = self._inverse.transform(xy[:, 0], xy[:, 1])
+        return np.asarray(lat), np.asarray(lon)
+
+    def snap_points(self, lats, lons, radius_m: float = SEARCH_RADIUS_M) -> pd.DataFrame:
+        """
+        Nearest-edge snap of every position independently. Returns
+        snapped_lat, snapped_lon, edge, offset_m (NaN beyond radius_m).
+        """
+        xy = project(lats, lons, self.crs)
+        edge, t, foot, offset = self._candidates(xy, 1, radius_m)
+        best = offset.argmin(axis=1)
+        rows = np.arange(len(xy))
+        hit = np.isfinite(offset[rows, best])
+        lat, lon = self._to_latlon(foot[rows, best])
+        return pd.DataFrame({
+            "snapped_lat": np.where(hit, lat, np.nan),
+            "snapped_lon": np.where(hit, lon, np.nan),
+            "edge": np.where(hit, edge[rows, best], -1),
+            "offset_m": np.where(hit, offset[rows, best], np.nan),
+        })
+
+    # --------------------------------------------------------------- matching
+
+    def _distances_from(self, node: int) -> np.ndarray:
+        from scipy.sparse.csgraph import dijkstra
+
+        row = self._dijkstra_rows.get(node)
+        if row is None:
+            row = dijkstra(self.graph, directed=True, indices=node, limit=DIJKSTRA_LIMIT_M)
+            self._dijkstra_rows[node] = row
+            if len(self._dijkstra_rows) > DIJKSTRA_CACHE:
+                self._dijkstra_rows.popitem(last=False)
+        else:
+            self._dijkstra_rows.move_to_end(node)
+        return row
+
+    def _road_distance(self, e1, t1, e2, t2) -> np.ndarray:
+        """On-road metres from each (e1, t1) to each (e2, t2); shape (len(e1), len(e2))."""
+        along1 = self.length[e1] * t1
+        along2 = self.length[e2] * t2
+        via = np.stack([self._distances_from(int(self.v[e]))[self.u[e2]] for e in e1])
+        dist = (self.length[e1] - along1)[:, None] + via + along2[None, :]
+        same = e1[:, None] == e2[None, :]
+        return np.where(same, np.abs(along2[None, :] - along1[:, None]), dist)
+
+    def match_trace(self, lats, lons, sigma_m: float = GPS_SIGMA_M, beta_m: float = TRANSITION_BETA_M,
+                    k: int = CANDIDATES, radius_m: float = SEARCH_RADIUS_M) -> pd.DataFrame:
+        """
+        HMM map matching of one vehicle's time-ordered fixes. Where no
+        candidate is in range, or no candidate is reachable from the last
+        fix, the chain restarts at the next matchable fix. Returns the same
+        columns as snap_points().
+        """
+        xy = project(lats, lons, self.crs)
+        n = len(xy)
+        edge_all, t_all, foot_all, offset_all = self._candidates(xy, k, radius_m)
+
+        # per point: up to k distinct candidate edges, closest first
+        cands = []
+        for i in range(n):
+            order = np.argsort(offset_all[i], kind="stable")
+            _, first = np.unique(edge_all[i][order], return_index=True)
+            pick = order[np.sort(first)]
+            pick = pick[np.isfinite(offset_all[i][pick])][:k]
+            cands.append(pick)
+
+        chosen = np.full(n, -1)
+        i = 0
+        while i < n:
+            if cands[i].size == 0:
+                i += 1
+                continue
+            # Viterbi over the chain starting at i
+            score = -0.5 * (offset_all[i][cands[i]] / sigma_m) ** 2
+            back: List[np.ndarray] = []
+            j = i
+            while j + 1 < n and cands[j + 1].size:
+                prev, nxt = cands[j], cands[j + 1]
+                road = self._road_distance(edge_all[j][prev], t_all[j][prev], edge_all[j + 1][nxt], t_all[j + 1][nxt])
+                straight = math.dist(xy[j], xy[j + 1])
+                trans = score[:, None] - np.abs(road - straight) / beta_m
+                if not np.isfinite(trans).any():
+                    break
+                back.append(trans.argmax(axis=0))
+                score = trans.max(axis=0) - 0.5 * (offset_all[j + 1][nxt] / sigma_m) ** 2
+                j += 1
+
+            state = int(score.argmax())
+            for step in range(j, i - 1, -1):
+                chosen[step] = cands[step][state]
+                if step > i:
+                    state = int(back[step - i - 1][state])
+            i = j + 1
+
+        rows = np.arange(n)
+        hit = chosen >= 0
+        pick = np.where(hit, chosen, 0)
+        lat, lon = self._to_latlon(foot_all[rows, pick])
+        return pd.DataFrame({
+            "snapped_lat": np.where(hit, lat, np.nan),
+            "snapped_lon": np.where(hit, lon, np.nan),
+            "edge": np.where(hit, edge_all[rows, pick], -1),
+            "offset_m": np.where(hit, offset_all[rows, pick], np.nan),
+        })
+
+    def snap_history(self, snapshots: pd.DataFrame, vehicle_col: str = "vehicle_id",
+                     lat_col: str = "vehicle_lat", lon_col: str = "vehicle_lon",
+                     time_col: str = "snapshot_time") -> pd.DataFrame:
+        """
+        match_trace() for every vehicle of a snapshot history (e.g. the CSV
+        collectors' output), one trace per vehicle in time order. Returns the
+        snapshots with snapped_lat, snapped_lon, edge and offset_m added.
+        """
+        fixes = snapshots.drop_duplicates([vehicle_col, time_col]).sort_values([vehicle_col, time_col])
+        matched = []
+        for _, trace in fixes.groupby(vehicle_col, sort=False):
+            result = self.match_trace(trace[lat_col].to_numpy(), trace[lon_col].to_numpy())
+            result.index = trace.index
+            matched.append(result)
+        snapped = pd.concat(matched) if matched else pd.DataFrame(columns=["snapped_lat", "snapped_lon", "edge", "offset_m"])
+        keys = fixes[[vehicle_col, time_col]].join(snapped)
+        return snapshots.merge(keys, on=[vehicle_col, time_col], how="left")
+
+    def snap_polyline(self, encoded: str) -> str:
+        """Map-match an encoded polyline (e.g. a HERE incident link) and re-encode it."""
+        import polyline
+
+        points = np.asarray(polyline.decode(encoded), dtype=float)
+        if len(points) == 0:
+            return encoded
+        snapped = self.match_trace(points[:, 0], points[:, 1]).dropna()
+        return polyline.encode(list(zip(snapped["snapped_lat"], snapped["snapped_lon"])))
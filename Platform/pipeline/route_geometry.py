@@ -0,0 +1,234 @@
+"""
+route_geometry.py
+Precomputed route geometry for batch spatial features.
+
+RouteGeometryStore holds, per route:
+  - the route polyline projected once to UTM zone 16N (metres), densified so
+    no segment is longer than max_segment_m
+  - the cumulative chainage (distance along the route) of every vertex
+  - a KD-tree over those vertices, and one over the route's stops
+
+Whole batches of vehicle positions are then answered with array operations:
+locate() gives each position's chainage along its route, nearest_stop() the
+closest stop, and distance_to_stop() the along-route distance to a target
+stop (the README's distance_to_target_stop_m). Nothing loops over
+snapshots x route points in Python.
+
+Routes are treated as loops (TransLoc shuttles run closed circuits): a
+target stop behind the vehicle is reached by going around, so its distance
+wraps by the route length. Where a route runs along the same street in both
+directions the nearest leg wins; pass max_offset_m to reject positions that
+are off the route entirely.
+
+pyproj, scipy and polyline are imported when the store is built.
+"""
+
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+PROJECTED_CRS = "EPSG:32616"    # UTM 16N: metre units around Atlanta
+MAX_SEGMENT_M = 10.0
+# vertices whose adjacent segments are checked for the exact projection
+CANDIDATE_VERTICES = 4
+
+
+@lru_cache(maxsize=None)
+def get_transformer(crs: str = PROJECTED_CRS):
+    """lon/lat -> crs transformer, built once per process and target CRS."""
+    from pyproj import Transformer
+
+    return Transformer.from_crs("EPSG:4326", crs, always_xy=True)
+
+
+def project(lats, lons, crs: str = PROJECTED_CRS) -> np.ndarray:
+    """Project lat/lon arrays to an (n, 2) array of metres."""
+    x, y = get_transformer(crs).transform(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+    return np.column_stack([x, y])
+
+
+def _densify(xy: np.ndarray, max_segment_m: float) -> np.ndarray:
+    """Insert evenly spaced vertices so no segment exceeds max_segment_m."""
+    seg = np.diff(xy, axis=0)
+    lengths = np.hypot(seg[:, 0], seg[:, 1])
+    pieces = np.maximum(np.ceil(lengths / max_segment_m).astype(int), 1)
+    # fractions 0, 1/k, ..., (k-1)/k along each segment, then the last vertex
+    starts = np.repeat(np.arange(len(seg)), pieces)
+    frac = np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    frac = frac / np.repeat(pieces, pieces)
+    dense = xy[starts] + seg[starts] * frac[:, None]
+    return np.vstack([dense, xy[-1:]])
+
+
+class RouteShape:
+    """One route's projected, densified polyline with chainage and stop index."""
+    def __init__(self, route_id, latlon: Sequence[Tuple[float, float]],
+                 max_segment_m: float = MAX_SEGMENT_M, crs: str = PROJECTED_CRS):
+        from scipy.spatial import cKDTree
+
+        latlon = np.asarray(latlon, dtype=float)
+        if len(latlon) < 2:
+            raise ValueError(f"Route {route_id} needs at least two points")
+
+        self.route_id = route_id
+        self.crs = crs
+        self.xy = _densify(project(latlon[:, 0], latlon[:, 1], crs), max_segment_m)
+        seg = np.diff(self.xy, axis=0)
+        self.chainage = np.concatenate([[0.0], np.cumsum(np.hypot(seg[:, 0], seg[:, 1]))])
+        self.length = float(self.chainage[-1])
+        self._tree = cKDTree(self.xy)
+
+        self.stop_ids = np.empty(0, dtype=object)
+        self.stop_xy = np.empty((0, 2))
+        self.stop_chainage = np.empty(0)
+        self._stop_tree = None
+        self._stop_index: Dict[object, int] = {}
+
+    def set_stops(self, stop_ids: Iterable, lats, lons) -> None:
+        from scipy.spatial import cKDTree
+
+        self.stop_ids = np.asarray(list(stop_ids), dtype=object)
+        self.stop_xy = project(lats, lons, self.crs)
+        self.stop_chainage, _ = self._locate_xy(self.stop_xy)
+        self._stop_tree = cKDTree(self.stop_xy) if len(self.stop_ids) else None
+        self._stop_index = {stop_id: i for i, stop_id in enumerate(self.stop_ids)}
+
+    def _locate_xy(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact projection onto the polyline: the segments next to the k
+        nearest vertices are the only candidates, so each point costs
+        O(log n) instead of O(route points).
+        """
+        if len(points) == 0:
+            return np.empty(0), np.empty(0)
+        k = min(CANDIDATE_VERTICES, len(self.xy))
+        _, vertices = self._tree.query(points, k=k)
+        vertices = vertices.reshape(len(points), k)
+
+        # segment i runs from vertex i to i + 1; take both segments around each vertex
+        seg_ids = np.clip(np.concatenate([vertices - 1, vertices], axis=1), 0, len(self.xy) - 2)
+        a = self.xy[seg_ids]
+        ab = self.xy[seg_ids + 1] - a
+        ap = points[:, None, :] - a
+        denom = np.maximum((ab ** 2).sum(axis=2), 1e-12)
+        t = np.clip((ap * ab).sum(axis=2) / denom, 0.0, 1.0)
+        foot = a + ab * t[..., None]
+        offsets = np.hypot(*(points[:, None, :] - foot).transpose(2, 0, 1))
+
+        best = offsets.argmin(axis=1)
+        rows = np.arange(len(points))
+        seg = seg_ids[rows, best]
+        seg_len = self.chainage[seg + 1] - self.chainage[seg]
+        return self.chainage[seg] + t[rows, best] * seg_len, offsets[rows, best]
+
+    def locate(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """(chainage_m, offset_m) of each position projected onto the route."""
+        return self._locate_xy(project(lats, lons, self.crs))
+
+    def nearest_stop(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """(route_stop_id, straight-line distance_m) of each position's closest stop."""
+        if self._stop_tree is None:
+            n = len(np.atleast_1d(lats))
+            return np.full(n, None, dtype=object), np.full(n, np.nan)
+        dist, idx = self._stop_tree.query(project(lats, lons, self.crs))
+        return self.stop_ids[idx], dist
+
+    def stop_chainages(self, stop_ids: Iterable) -> np.ndarray:
+        index = np.array([self._stop_index.get(stop_id, -1) for stop_id in stop_ids], dtype=int)
+        result = np.full(len(index), np.nan)
+        known = index >= 0
+        result[known] = self.stop_chainage[index[known]]
+        return result
+
+
+class RouteGeometryStore:
+    """RouteShapes by route_id, answering batch queries across routes."""
+    def __init__(self, max_segment_m: float = MAX_SEGMENT_M, crs: str = PROJECTED_CRS):
+        self.max_segment_m = max_segment_m
+        self.crs = crs
+        self.routes: Dict[object, RouteShape] = {}
+
+    def add_route(self, route_id, shape: Union[str, Sequence[Tuple[float, float]]]) -> RouteShape:
+        """Add a route from an encoded polyline or a list of (lat, lon)."""
+        if isinstance(shape, str):
+            import polyline
+
+            shape = polyline.decode(shape)
+        route = self.routes[route_id] = RouteShape(route_id, shape, self.max_segment_m, self.crs)
+        return route
+
+    def add_stops(self, stops: pd.DataFrame) -> None:
+        """Attach stops (route_stop_id, route_id, latitude, longitude) to their routes."""
+        for route_id, route_stops in stops.dropna(subset=["latitude", "longitude"]).groupby("route_id"):
+            route = self.routes.get(route_id)
+            if route is not None:
+                route.set_stops(route_stops["route_stop_id"], route_stops["latitude"], route_stops["longitude"])
+
+    @classmethod
+    def from_frames(cls, shapes: pd.DataFrame, stops: Optional[pd.DataFrame] = None, **kwargs) -> "RouteGeometryStore":
+        """
+        Build from BusExtractor.get_route_shapes() (route_id, encoded_polyline)
+        and optionally BusExtractor.get_route_stops().
+        """
+        store = cls(**kwargs)
+        for route_id, encoded in zip(shapes["route_id"], shapes["encoded_polyline"]):
+            if isinstance(encoded, str) and encoded:
+                store.add_route(route_id, encoded)
+        if stops is not None:
+            store.add_stops(stops)
+        return store
+
+    @classmethod
+    def from_transloc(cls, bus, **kwargs) -> "RouteGeometryStore":
+        """Build from the live route shapes and stops of a BusExtractor."""
+        return cls.from_frames(bus.get_route_shapes(), bus.get_route_stops(), **kwargs)
+
+    def _by_route(self, route_ids):
+        route_ids = np.asarray(route_ids)
+        for route_id, route in self.routes.items():
+            rows = np.flatnonzero(route_ids == route_id)
+            if rows.size:
+                yield route, rows
+
+    def locate(self, route_ids, lats, lons, max_offset_m: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (chainage_m, offset_m) for each position on its own route; NaN for
+        unknown routes and, with max_offset_m, for positions too far off.
+        """
+        lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+        chainage = np.full(len(lats), np.nan)
+        offset = np.full(len(lats), np.nan)
+        for route, rows in self._by_route(route_ids):
+            chainage[rows], offset[rows] = route.locate(lats[rows], lons[rows])
+        if max_offset_m is not None:
+            chainage[offset > max_offset_m] = np.nan
+        return chainage, offset
+
+    def nearest_stop(self, route_ids, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """(route_stop_id, distance_m) of the closest stop on each position's route."""
+        lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+        stop_ids = np.full(len(lats), None, dtype=object)
+        dist = np.full(len(lats), np.nan)
+        for route, rows in self._by_route(route_ids):
+            stop_ids[rows], dist[rows] = route.nearest_stop(lats[rows], lons[rows])
+        return stop_ids, dist
+
+    def distance_to_stop(self, route_ids, lats, lons, stop_ids,
+                         max_offset_m: Optional[float] = None) -> np.ndarray:
+        """
+        Along-route metres from each position to its target stop, going
+        forward around the loop. NaN where the route or stop is unknown.
+        """
+        lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+        stop_ids = np.asarray(stop_ids, dtype=object)
+        result = np.full(len(lats), np.nan)
+        for route, rows in self._by_route(route_ids):
+            here, offset = route.locate(lats[rows], lons[rows])
+            ahead = route.stop_chainages(stop_ids[rows]) - here
+            ahead = np.where(ahead < 0, ahead + route.length, ahead)
+            if max_offset_m is not None:
+                ahead[offset > max_offset_m] = np.nan
+            result[rows] = ahead
+        return result
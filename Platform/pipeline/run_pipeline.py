@@ -1,10 +1,74 @@
+import argparse
+import os
+import sys
 from Config import Config
 from ForwardPipeline import ForwardPipeline  # wherever your class lives
+from Scheduler import Scheduler, POLL_INTERVAL
+from sinks import ColumnarSink
+from feature_store import FeatureStore, load_encoders
+from extractors.BusExtractor import BusExtractor
+from route_geometry import RouteGeometryStore
+from repository import DbRepository
+from merge_sql import MERGE_DDL
 from dotenv import load_dotenv
 
+# the model bundle pickles classes from Analysis/XGBoost (utils.FeatureTransformer)
+MODEL_CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Analysis", "XGBoost")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stinger Delay forward pipeline")
+    parser.add_argument("--loop", action="store_true",
+                        help="Poll continuously and fan bus data out per route")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL,
+                        help=f"Seconds between ticks with --loop (default: {POLL_INTERVAL})")
+    parser.add_argument("--sink-dir",
+                        help="Also write typed, date-partitioned snapshots under this directory")
+    parser.add_argument("--sink-format", choices=["parquet", "arrow"], default="parquet",
+                        help="File format for --sink-dir (default: parquet)")
+    parser.add_argument("--feature-state",
+                        help="Keep online model features, snapshotted to this file and restored from it on start")
+    parser.add_argument("--model",
+                        help="Model bundle (serve.save_model_bundle) whose route/stop encoders --feature-state uses")
+    parser.add_argument("--route-shapes", choices=["transloc", "none"], default="transloc",
+                        help="Route shapes and stops for --feature-state's distance_to_target_stop_m: "
+                             "fetched from TransLoc at start (default), or none (the feature is NaN)")
+    parser.add_argument("--migrate", action="store_true",
+                        help="Dedupe stop_events and create the unique index its upsert needs "
+                             "(PostgreSQL 15+; see merge_sql), then exit")
+    args = parser.parse_args()
+    if args.feature_state and not args.model:
+        parser.error("--feature-state needs --model for the training route/stop encoders")
+
     cfg = Config()          # or Config.from_env(), Config.load(), etc.
-    pipeline = ForwardPipeline(cfg)
+    if args.migrate:
+        if not cfg.pg_dsn:
+            parser.error("--migrate needs PG_DSN")
+        repo = DbRepository(cfg.pg_dsn)
+        try:
+            repo.execute(MERGE_DDL)
+        finally:
+            repo.close()
+        print("✓ stop_events deduped and indexed")
+        sys.exit(0)
+    sinks = [ColumnarSink(args.sink_dir, fmt=args.sink_format)] if args.sink_dir else []
+    if args.feature_state:
+        sys.path.append(MODEL_CODE_DIR)
+        encoders = load_encoders(args.model)
+        geometry = None
+        if args.route_shapes == "transloc":
+            geometry = RouteGeometryStore.from_transloc(BusExtractor(base_url=os.environ["BUS_API_URL"], api_key=cfg.bus_key))
+            print(f"✓ Loaded {len(geometry.routes)} route shapes")
+        if os.path.exists(args.feature_state):
+            sinks.append(FeatureStore.restore(args.feature_state, encoders=encoders, geometry=geometry))
+        else:
+            sinks.append(FeatureStore(encoders, geometry=geometry, snapshot_path=args.feature_state))
+    pipeline = ForwardPipeline(cfg, sinks=sinks)
 
-    # run once, no DB writes, just prints
-    pipeline.run_once()
+    try:
+        if args.loop:
+            Scheduler(pipeline, interval=args.interval).run()
+        else:
+            # run once; DB writes only when PG_DSN is set
+            pipeline.run_once()
+    finally:
+        pipeline.close()
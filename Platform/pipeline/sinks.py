@@ -0,0 +1,281 @@
+"""
+sinks.py
+Columnar storage sinks for ForwardPipeline.
+
+ColumnarSink writes each source's frames to date-partitioned Parquet (or
+Arrow IPC) files with typed columns, so analysis loads no longer re-parse CSV
+text and re-convert snapshot_time on every read:
+
+    <root>/<source>/date=YYYY-MM-DD/part-<HHMMSS>-<n>.parquet
+
+Rows whose snapshot_time doesn't parse go to <root>/<source>/date=unparsed
+(and are counted in ColumnarSink.unparsed_rows) rather than being dropped.
+
+Rows are buffered and written a row group at a time; a file is rolled over
+when it reaches file_rows, once it has been open file_seconds (hourly by
+default: a day of bus rows never reaches file_rows, and an unfinished file
+has no footer, so this bounds what a crash can lose and how stale readers'
+view is), when the date changes, or on close(). Files are written under a
+leading "." and renamed once complete, so readers only ever see finished
+files. read_snapshots() reads back just the requested columns
+and date range.
+
+pyarrow is only imported when a sink or reader is used.
+"""
+
+import os
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+import pandas as pd
+
+ROW_GROUP_ROWS = 10_000
+FILE_ROWS = 500_000
+FILE_SECONDS = 3_600
+FORMATS = {"parquet": "parquet", "arrow": "arrow"}
+
+# column -> pandas dtype written for each source; columns not listed keep
+# whatever type pyarrow infers. Pinning them keeps every row group on the
+# same schema even when a tick has an all-null column (e.g. no ETAs).
+SINK_DTYPES = {
+    "bus": {
+        "bus_id": "Int64",
+        "route_id": "Int64",
+        "latitude": "float64",
+        "longitude": "float64",
+        "day_of_week": "string",
+        "month": "string",
+        "time_of_day": "string",
+        "bus_speed": "float64",
+        "destination_route_stop_id": "Int64",
+        "eta_to_stop": "Int64",
+        "snapshot_time": "datetime64[us]",
+        "capacity": "Int64",
+        "occupancy": "Int64",
+    },
+    "weather": {
+        "recorded_at": "datetime64[us]",
+        "snapshot_time": "datetime64[us]",
+        "temperature": "float64",
+        "precipitation_probability": "Int64",
+        "wind_speed": "float64",
+        "conditions": "string",
+    },
+    "traffic": {
+        "type": "string",
+        "is_road_closed": "boolean",
+        "start_time": "datetime64[us, UTC]",
+        "end_time": "datetime64[us, UTC]",
+        "comment": "string",
+        "snapshot_time": "datetime64[us]",
+    },
+}
+
+# columns pandas has no dtype for, pinned to an explicit pyarrow type (built
+# from the pyarrow module): an all-empty polylines column would otherwise
+# infer list<null>, and no later frame could be written to that file
+SINK_ARROW_TYPES = {
+    "traffic": {
+        "polylines": lambda pa: pa.list_(pa.string()),
+    },
+}
+
+# column whose date picks the partition
+PARTITION_COLUMN = "snapshot_time"
+# partition for rows whose PARTITION_COLUMN is missing or unparseable
+UNPARSED_PARTITION = "unparsed"
+
+
+def _typed(df: pd.DataFrame, dtypes: Dict[str, str]) -> pd.DataFrame:
+    df = df.copy()
+    for col, dtype in dtypes.items():
+        if col not in df.columns:
+            continue
+        if dtype.startswith("datetime64"):
+            utc = "UTC" in dtype
+            df[col] = pd.to_datetime(df[col], format="mixed", utc=utc, errors="coerce").astype(dtype)
+        elif dtype in ("Int64", "float64"):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def _arrow_schema(df: pd.DataFrame, source: str):
+    """pyarrow's inferred schema for df, with the source's SINK_ARROW_TYPES pinned."""
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for col, arrow_type in SINK_ARROW_TYPES.get(source, {}).items():
+        if col in schema.names:
+            schema = schema.set(schema.get_field_index(col), pa.field(col, arrow_type(pa)))
+    return schema
+
+
+class _PartitionWriter:
+    """One open file of one source: buffers rows and writes row groups."""
+    def __init__(self, directory: Path, fmt: str, schema, row_group_rows: int, compression: Optional[str]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = f"part-{datetime.now():%H%M%S}-{os.getpid()}"
+        n = 0
+        while (directory / f"{stem}-{n}.{fmt}").exists() or (directory / f".{stem}-{n}.{fmt}").exists():
+            n += 1
+        self.path = directory / f"{stem}-{n}.{fmt}"
+        self._tmp_path = directory / f".{self.path.name}"
+
+        self.schema = schema
+        self.row_group_rows = row_group_rows
+        self.rows = 0
+        self.opened = time.monotonic()
+        self._buffer: List = []
+        self._buffered = 0
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(self._tmp_path, schema, compression=compression)
+            self._write = lambda table: self._writer.write_table(table, row_group_size=self.row_group_rows)
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=compression)
+            self._writer = pa.ipc.new_file(self._tmp_path, schema, options=options)
+            self._write = lambda table: self._writer.write_table(table, max_chunksize=self.row_group_rows)
+
+    def append(self, table) -> None:
+        self._buffer.append(table)
+        self._buffered += table.num_rows
+        self.rows += table.num_rows
+        if self._buffered >= self.row_group_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        import pyarrow as pa
+
+        if self._buffered:
+            self._write(pa.concat_tables(self._buffer).combine_chunks())
+            self._buffer, self._buffered = [], 0
+
+    def close(self) -> Path:
+        self.flush()
+        self._writer.close()
+        os.replace(self._tmp_path, self.path)
+        return self.path
+
+
+class ColumnarSink:
+    """
+    Pipeline sink writing typed, date-partitioned Parquet or Arrow IPC.
+
+    write(source, batch, df) is called by ForwardPipeline for every non-empty
+    frame; close() finalizes any open files and must be called on shutdown.
+    """
+    def __init__(self, root: Union[str, Path], fmt: str = "parquet",
+                 row_group_rows: int = ROW_GROUP_ROWS, file_rows: int = FILE_ROWS,
+                 file_seconds: Optional[float] = FILE_SECONDS,
+                 sources: Optional[Iterable[str]] = None, compression: Optional[str] = "zstd"):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown sink format {fmt!r}; expected one of {sorted(FORMATS)}")
+        self.root = Path(root)
+        self.fmt = fmt
+        self.row_group_rows = row_group_rows
+        self.file_rows = file_rows
+        self.file_seconds = file_seconds
+        self.sources = set(sources) if sources is not None else None
+        self.compression = compression
+        # (source, date) -> open writer
+        self._writers: Dict[tuple, _PartitionWriter] = {}
+        self.files: List[Path] = []
+        self.unparsed_rows = 0
+
+    def write(self, source: str, batch: str, df: pd.DataFrame) -> None:
+        import pyarrow as pa
+
+        self.roll_expired()
+        if df.empty or (self.sources is not None and source not in self.sources):
+            return
+
+        df = _typed(df, SINK_DTYPES.get(source, {}))
+        if PARTITION_COLUMN in df.columns:
+            times = pd.to_datetime(df[PARTITION_COLUMN], format="mixed", errors="coerce")
+            days = times.dt.strftime("%Y-%m-%d").fillna(UNPARSED_PARTITION)
+            unparsed = int(times.isna().sum())
+            if unparsed:
+                self.unparsed_rows += unparsed
+                print(f"Warning: {unparsed} {source} row(s) with no parseable {PARTITION_COLUMN} "
+                      f"written to date={UNPARSED_PARTITION}")
+        else:
+            days = pd.Series(f"{date.today():%Y-%m-%d}", index=df.index)
+
+        for day, rows in df.groupby(days, sort=True):
+            key = (source, day)
+            # a new day closes the previous day's file for this source
+            if day != UNPARSED_PARTITION:
+                for stale in [k for k in self._writers
+                              if k[0] == source and k[1] not in (day, UNPARSED_PARTITION)]:
+                    self.files.append(self._writers.pop(stale).close())
+
+            writer = self._writers.get(key)
+            schema = writer.schema if writer else _arrow_schema(rows, source)
+            table = pa.Table.from_pandas(rows, schema=schema, preserve_index=False)
+            if writer is None:
+                directory = self.root / source / f"date={day}"
+                writer = self._writers[key] = _PartitionWriter(
+                    directory, FORMATS[self.fmt], table.schema, self.row_group_rows, self.compression
+                )
+            writer.append(table)
+
+            if writer.rows >= self.file_rows:
+                self.files.append(self._writers.pop(key).close())
+
+    def roll_expired(self) -> None:
+        """Finish every file that has been open for file_seconds."""
+        if self.file_seconds is None:
+            return
+        now = time.monotonic()
+        for key in [k for k, writer in self._writers.items() if now - writer.opened >= self.file_seconds]:
+            self.files.append(self._writers.pop(key).close())
+
+    def flush(self) -> None:
+        """Write out buffered rows as (possibly short) row groups."""
+        for writer in self._writers.values():
+            writer.flush()
+
+    def close(self) -> None:
+        for key in list(self._writers):
+            self.files.append(self._writers.pop(key).close())
+
+
+def read_snapshots(root: Union[str, Path], source: str = "bus",
+                   columns: Optional[List[str]] = None,
+                   start: Union[str, date, None] = None, end: Union[str, date, None] = None,
+                   fmt: str = "parquet", filter=None) -> pd.DataFrame:
+    """
+    Read a sink's files back as a DataFrame.
+
+    Only the date partitions in [start, end] (inclusive, "YYYY-MM-DD" or
+    date) are opened and only columns are decoded. The unparsed partition
+    is only read when neither bound is given. filter is an optional
+    extra pyarrow.dataset expression, e.g. ds.field("route_id") == 29.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    path = Path(root) / source
+    if not path.exists():
+        return pd.DataFrame(columns=columns)
+
+    partitioning = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+    dataset = ds.dataset(path, format="ipc" if fmt == "arrow" else fmt, partitioning=partitioning)
+
+    expr = filter
+    if start is not None or end is not None:
+        term = ds.field("date") != UNPARSED_PARTITION
+        expr = term if expr is None else expr & term
+    for bound, op in ((start, "__ge__"), (end, "__le__")):
+        if bound is None:
+            continue
+        term = getattr(ds.field("date"), op)(str(pd.Timestamp(bound).date()))
+        expr = term if expr is None else expr & term
+
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
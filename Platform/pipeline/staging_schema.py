@@ -0,0 +1,62 @@
+"""
+staging_schema.py
+Column types of the staging tables ForwardPipeline COPYs into.
+
+The extractor frames have no fixed dtypes: destination_route_stop_id,
+eta_to_stop, capacity and occupancy come out int64 or float64 depending on
+whether any value in the tick is None, and the times are strings. Binary
+COPY does no coercion, so DbRepository casts every chunk to its table's
+schema here (pgcopy.cast_frame) before encoding it, and STAGING_DDL creates
+the tables with exactly these types. The merges in merge_sql read them as
+they are.
+"""
+
+STAGING_SCHEMAS = {
+    "staging_stop_events": {
+        "bus_id": "bigint",
+        "route_id": "integer",
+        "latitude": "double precision",
+        "longitude": "double precision",
+        "day_of_week": "text",
+        "month": "text",
+        "time_of_day": "text",
+        "bus_speed": "double precision",
+        "destination_route_stop_id": "bigint",
+        "eta_to_stop": "integer",
+        "snapshot_time": "timestamp",
+        "capacity": "integer",
+        "occupancy": "integer",
+        "source_batch": "text",
+    },
+    "staging_weather": {
+        "recorded_at": "timestamp",
+        "snapshot_time": "timestamp",
+        "temperature": "double precision",
+        "precipitation_probability": "integer",
+        "wind_speed": "double precision",
+        "conditions": "text",
+        "source_batch": "text",
+    },
+    "staging_traffic": {
+        "polylines": "text",
+        "type": "text",
+        "is_road_closed": "boolean",
+        "start_time": "timestamptz",
+        "end_time": "timestamptz",
+        "comment": "text",
+        "snapshot_time": "timestamp",
+        "source_batch": "text",
+    },
+}
+
+
+def staging_ddl(table: str) -> str:
+    columns = ",\n".join(f"    {name} {pg_type}" for name, pg_type in STAGING_SCHEMAS[table].items())
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table} (\n{columns}\n);\n"
+        # every merge selects (and deletes) one source_batch
+        f"CREATE INDEX IF NOT EXISTS {table}_source_batch ON {table} (source_batch);\n"
+    )
+
+
+STAGING_DDL = "\n".join(staging_ddl(table) for table in STAGING_SCHEMAS)
@@ -0,0 +1,12 @@
+import os
+import sys
+from pathlib import Path
+
+# pipeline modules import each other flat (from extractors..., from feature_store ...)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Config reads these at import time (ForwardPipeline, Scheduler)
+for var in ("BUS_API_KEY", "WEATHER_USER_AGENT", "TRAFFIC_API_KEY"):
+    os.environ.setdefault(var, "test")
+for var in ("BUS_API_URL", "WEATHER_API_URL", "TRAFFIC_API_URL"):
+    os.environ.setdefault(var, "https://example.test")
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from arrivals import ArrivalDetector
+
+T0 = pd.Timestamp("2024-03-04 08:00:00")
+
+# two stops on route 1 along 33.77N; 0.001 degrees of longitude is about 92 m
+STOPS = pd.DataFrame({"route_stop_id": [10, 20], "route_id": [1, 1],
+                      "latitude": [33.77, 33.77], "longitude": [-84.400, -84.395]})
+FAR = -84.390
+
+
+def _snap(seconds, lon=FAR, lat=33.77, stop_id=None, eta=None, bus_id=1):
+    return {"bus_id": bus_id, "route_id": 1, "latitude": lat, "longitude": lon,
+            "destination_route_stop_id": stop_id, "eta_to_stop": eta,
+            "snapshot_time": str(T0 + pd.Timedelta(seconds=seconds))}
+
+
+def _events(out):
+    return [(e.vehicle_id, e.route_stop_id, e.event, (e.event_time - T0).total_seconds(), e.source)
+            for e in out.itertuples()]
+
+
+def _run(detector, *snaps):
+    return _events(detector.update(pd.DataFrame(list(snaps))))
+
+
+def test_geofence_arrival_and_departure():
+    detector = ArrivalDetector(STOPS)
+    events = _run(detector,
+                  _snap(0, lon=-84.402),     # ~185 m out
+                  _snap(20, lon=-84.4002),   # ~18 m: inside
+                  _snap(40, lon=-84.4006),   # ~55 m: outside radius_m, inside exit_radius_m
+                  _snap(60, lon=-84.399))    # ~92 m: gone
+    assert events == [(1, 10, "arrival", 20.0, "geofence"), (1, 10, "departure", 40.0, "geofence")]
+
+
+def test_eta_reaching_zero_is_an_arrival_at_the_predicted_time():
+    detector = ArrivalDetector(STOPS)
+    assert _run(detector, _snap(0, stop_id=10, eta=120), _snap(30, stop_id=10, eta=60)) == []
+    assert _run(detector, _snap(60, stop_id=10, eta=10)) == [(1, 10, "arrival", 70.0, "eta")]
+
+
+def test_a_target_change_mid_stream_ends_the_previous_target():
+    detector = ArrivalDetector(STOPS)
+    # stop 10 was predicted for t=90, but by t=45 the bus heads for stop 20:
+    # the arrival is capped at the snapshot that revealed it
+    events = _run(detector, _snap(0, stop_id=10, eta=120), _snap(30, stop_id=10, eta=60), _snap(45, stop_id=20, eta=300))
+    assert events == [(1, 10, "arrival", 45.0, "eta")]
+    # stop 20 was predicted for t=345; the next snapshot is much later
+    events = _run(detector, _snap(600, stop_id=30, eta=200))
+    assert events == [(1, 20, "arrival", 345.0, "eta")]
+
+
+def test_the_first_signal_wins_and_a_stop_is_not_arrived_at_twice():
+    detector = ArrivalDetector(STOPS)
+    events = _run(detector,
+                  _snap(0, stop_id=10, eta=30),
+                  _snap(20, lon=-84.4002, stop_id=10, eta=5),   # geofence and eta both fire
+                  _snap(40, lon=-84.399, stop_id=20, eta=60))   # target change: stop 10 again
+    assert events == [(1, 10, "arrival", 20.0, "geofence"), (1, 10, "departure", 20.0, "geofence")]
+
+    # after rearm_s the stop can be arrived at again (and turning back to it
+    # ends the stop 20 target at its predicted t=100)
+    events = _run(detector, _snap(400, lon=-84.4001, stop_id=10, eta=0))
+    assert events == [(1, 10, "arrival", 400.0, "geofence"), (1, 20, "arrival", 100.0, "eta")]
+
+
+def test_ticks_in_any_order_within_a_call_or_one_by_one_give_the_same_events():
+    snaps = [_snap(0, lon=-84.402, stop_id=10, eta=40), _snap(0, bus_id=2, stop_id=20, eta=100),
+             _snap(20, lon=-84.4002, stop_id=10, eta=5), _snap(30, bus_id=2, stop_id=20, eta=60),
+             _snap(40, lon=-84.399, stop_id=20, eta=50), _snap(60, bus_id=2, stop_id=10, eta=500),
+             _snap(90, lon=-84.3952, stop_id=20, eta=0)]
+
+    ticked = ArrivalDetector(STOPS)
+    one_by_one = [e for s in snaps for e in _run(ticked, s)]
+    shuffled = _run(ArrivalDetector(STOPS), *[snaps[i] for i in np.random.default_rng(0).permutation(len(snaps))])
+
+    assert one_by_one == [
+        (1, 10, "arrival", 20.0, "geofence"), (1, 10, "departure", 20.0, "geofence"),
+        (2, 20, "arrival", 60.0, "eta"),
+        (1, 20, "arrival", 90.0, "geofence"),
+    ]
+    assert sorted(shuffled, key=lambda e: e[3]) == one_by_one
+
+
+def test_silent_vehicles_are_dropped_and_start_fresh():
+    detector = ArrivalDetector(STOPS, stale_after_s=600)
+    _run(detector, _snap(0, stop_id=10, eta=60), _snap(0, bus_id=2, stop_id=10, eta=60))
+    _run(detector, _snap(700, bus_id=2, stop_id=10, eta=60))
+    assert len(detector) == 1
+    # bus 1's old target says nothing about the stop it now heads for
+    assert _run(detector, _snap(800, stop_id=20, eta=60)) == []
@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+from asof_join import attach_incidents, attach_weather, incident_intervals
+
+
+def _snapshots(times, route_id=1, index=None):
+    return pd.DataFrame({"snapshot_time": pd.to_datetime(times), "route_id": route_id}, index=index)
+
+
+def _incident(snapshot_time, end_time, start_time="2024-03-04T09:00:00-05:00", comment="Lane closed",
+              is_road_closed=False, type="accident"):
+    return {"type": type, "start_time": start_time, "end_time": end_time, "comment": comment,
+            "is_road_closed": is_road_closed, "polylines": ["_p~iF~ps|U_ulLnnqC"],
+            "snapshot_time": snapshot_time}
+
+
+# -- attach_weather ---------------------------------------------------------
+
+WEATHER = pd.DataFrame({
+    # fetch times; the forecast periods (recorded_at) start ahead of them
+    "snapshot_time": ["2024-03-04 09:00:00", "2024-03-04 09:15:00", "2024-03-04 12:00:00"],
+    "recorded_at": ["2024-03-04T10:00:00-05:00", "2024-03-04T10:00:00-05:00", "2024-03-04T12:00:00-05:00"],
+    "temperature": [50.0, 52.0, 60.0],
+    "precipitation_probability": [10, 70, 0],
+    "wind_speed": [5.0, 6.0, 7.0],
+    "conditions": ["Sunny", "Cloudy", "Light Rain"],
+})
+
+
+def test_weather_is_the_latest_fetch_at_or_before_each_snapshot():
+    snapshots = _snapshots(["2024-03-04 09:20", "2024-03-04 08:59", "2024-03-04 09:00", "2024-03-04 09:14"],
+                           index=[40, 10, 30, 20])
+    out = attach_weather(snapshots, WEATHER)
+
+    assert list(out.index) == [40, 10, 30, 20]
+    assert out["temperature"].tolist()[0] == 52.0
+    assert np.isnan(out["temperature"].tolist()[1])
+    assert out["temperature"].tolist()[2:] == [50.0, 50.0]
+    assert out["weather_age_s"].tolist()[2:] == [0.0, 840.0]
+
+
+def test_weather_older_than_max_age_is_not_attached():
+    out = attach_weather(_snapshots(["2024-03-04 11:59", "2024-03-04 12:30"]), WEATHER, max_age_s=3_600)
+
+    assert np.isnan(out["temperature"].iloc[0]) and np.isnan(out["weather_age_s"].iloc[0])
+    assert out["temperature"].iloc[1] == 60.0
+
+
+def test_is_raining_from_conditions_or_probability():
+    out = attach_weather(_snapshots(["2024-03-04 09:00", "2024-03-04 09:15", "2024-03-04 12:00"]), WEATHER)
+    assert out["is_raining"].tolist() == [0.0, 1.0, 1.0]
+
+
+# -- attach_incidents -------------------------------------------------------
+
+def _fetched(first, last, end_time, every="5min", **fields):
+    """The same incident in every fetch from first to last (inclusive)."""
+    return [_incident(str(t), end_time, **fields) for t in pd.date_range(first, last, freq=every)]
+
+
+def test_an_extended_incident_is_one_incident():
+    incidents = pd.DataFrame(
+        _fetched("2024-03-04 09:00", "2024-03-04 09:05", "2024-03-04T09:15:00-05:00")
+        + _fetched("2024-03-04 09:10", "2024-03-04 10:00", "2024-03-04T10:00:00-05:00")
+    )
+    out = attach_incidents(_snapshots(["2024-03-04 09:05", "2024-03-04 09:30", "2024-03-04 10:00"]), incidents)
+
+    assert out["active_incidents"].tolist() == [1, 1, 0]
+    assert incident_intervals(incidents)["incident"].tolist() == [0, 0]
+
+
+def test_a_later_end_time_does_not_reach_earlier_snapshots():
+    # at 09:20 the only fetch said the incident ended at 09:15
+    incidents = pd.DataFrame([
+        _incident("2024-03-04 09:00:00", "2024-03-04T09:15:00-05:00"),
+        _incident("2024-03-04 09:30:00", "2024-03-04T10:00:00-05:00"),
+    ])
+    out = attach_incidents(_snapshots(["2024-03-04 09:10", "2024-03-04 09:20", "2024-03-04 09:40"]), incidents)
+    assert out["active_incidents"].tolist() == [1, 0, 1]
+
+
+def test_a_shortened_incident_ends_from_the_revision_on():
+    incidents = pd.DataFrame(
+        _fetched("2024-03-04 09:00", "2024-03-04 09:25", "2024-03-04T11:00:00-05:00")
+        + _fetched("2024-03-04 09:30", "2024-03-04 09:40", "2024-03-04T09:45:00-05:00")
+    )
+    out = attach_incidents(_snapshots(["2024-03-04 09:20", "2024-03-04 09:40", "2024-03-04 10:00"]), incidents)
+    assert out["active_incidents"].tolist() == [1, 1, 0]
+
+
+def test_incidents_count_from_their_first_fetch_and_closures_as_fetched():
+    backdated = {"start_time": "2024-03-04T08:00:00-05:00"}
+    incidents = pd.DataFrame(
+        # backdated by HERE to 08:00, first fetched at 09:00; the closure is
+        # lifted at 09:30
+        _fetched("2024-03-04 09:00", "2024-03-04 09:25", None, is_road_closed=True, **backdated)
+        + _fetched("2024-03-04 09:30", "2024-03-04 10:00", None, is_road_closed=False, **backdated)
+        + _fetched("2024-03-04 09:30", "2024-03-04 10:00", "2024-03-04T12:00:00-05:00", comment="Other")
+    )
+    out = attach_incidents(_snapshots(["2024-03-04 08:30", "2024-03-04 09:10", "2024-03-04 09:45"]), incidents)
+
+    assert out["active_incidents"].tolist() == [0, 1, 2]
+    assert out["active_closures"].tolist() == [0, 1, 0]
+
+
+def test_an_incident_missing_from_later_fetches_is_cleared():
+    incidents = pd.DataFrame(
+        # HERE stops reporting the closure after 09:10, long before its end_time
+        _fetched("2024-03-04 09:00", "2024-03-04 09:10", "2024-03-04T18:00:00-05:00", is_road_closed=True)
+        + _fetched("2024-03-04 09:00", "2024-03-04 10:00", "2024-03-04T18:00:00-05:00", comment="Other")
+    )
+    out = attach_incidents(_snapshots(["2024-03-04 09:10", "2024-03-04 09:14", "2024-03-04 09:15"]), incidents)
+
+    assert out["active_incidents"].tolist() == [2, 2, 1]
+    assert out["active_closures"].tolist() == [1, 1, 0]
+
+
+def test_an_open_ended_incident_is_not_active_forever():
+    # a closure fetched once at 08:00 with no end_time and no later fetches
+    incidents = pd.DataFrame([_incident("2024-03-04 08:00:00", None, start_time="2024-03-04T07:30:00-05:00",
+                                        is_road_closed=True)])
+    out = attach_incidents(_snapshots(["2024-03-04 08:10", "2024-03-04 08:20", "2024-03-06 08:00"]), incidents)
+
+    assert out["active_closures"].tolist() == [1, 0, 0]
+    assert incident_intervals(incidents, max_gap_s=3_600)["active_until"].tolist() == [pd.Timestamp("2024-03-04 09:00")]
+
+
+def test_route_metres_are_the_union_of_active_incidents():
+    incidents = pd.DataFrame(
+        _fetched("2024-03-04 09:00", "2024-03-04 09:05", "2024-03-04T09:15:00-05:00", comment="A")
+        + _fetched("2024-03-04 09:10", "2024-03-04 10:00", "2024-03-04T10:00:00-05:00", comment="A")
+        + _fetched("2024-03-04 09:20", "2024-03-04 10:00", "2024-03-04T09:40:00-05:00", comment="B")
+    )
+    intervals = incident_intervals(incidents)
+    assert intervals["incident"].tolist() == [0, 0, 1]
+    # OverlapEngine.intervals() rows: both segments of A cover 0-100 m of
+    # route 1, B covers 50-150 m of route 1 and 0-30 m of route 2
+    ranges = pd.DataFrame({
+        "route_id": [1, 1, 1, 2],
+        "incident": [0, 1, 2, 2],
+        "is_road_closed": False,
+        "start_m": [0.0, 0.0, 50.0, 0.0],
+        "end_m": [100.0, 100.0, 150.0, 30.0],
+    })
+    snapshots = pd.DataFrame({
+        "snapshot_time": pd.to_datetime(["2024-03-04 09:05", "2024-03-04 09:12", "2024-03-04 09:30",
+                                         "2024-03-04 09:50", "2024-03-04 09:30", "2024-03-04 09:30"]),
+        "route_id": [1, 1, 1, 1, 2, 3],
+    }, index=list("abcdef"))
+    out = attach_incidents(snapshots, intervals, ranges=ranges)
+
+    assert list(out.index) == list("abcdef")
+    assert out["route_active_incidents"].tolist() == [1, 1, 2, 1, 1, 0]
+    assert out["route_affected_m"].tolist() == [100.0, 100.0, 150.0, 100.0, 30.0, 0.0]
+    assert out["active_incidents"].tolist() == [1, 1, 2, 1, 2, 2]
+
+
+def test_no_incidents():
+    out = attach_incidents(_snapshots(["2024-03-04 09:00"]), pd.DataFrame(columns=list(_incident("", ""))))
+    assert out["active_incidents"].tolist() == [0] and out["active_closures"].tolist() == [0]
@@ -0,0 +1,154 @@
+"""
+The async extractors must return exactly what the sync ones do. Both paths
+hit the same aiohttp test server serving canned TransLoc, weather.gov and
+HERE payloads.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from pandas.testing import assert_frame_equal
+
+import extractors.BusExtractor as bus_module
+import extractors.TrafficExtractor as traffic_module
+import extractors.WeatherExtractor as weather_module
+from extractors.BaseExtractor import ABCBaseExtractor
+from extractors.BusExtractor import BusExtractor
+from extractors.TrafficExtractor import TrafficExtractor
+from extractors.WeatherExtractor import WeatherExtractor
+
+FLEET = [
+    {"VehicleID": 100 + i, "RouteID": 20 + i % 3, "Latitude": 33.77 + i * 1e-4, "Longitude": -84.39,
+     "GroundSpeed": 8.5 + i, "TimeStamp": f"/Date({1760800000000 + i * 1000}-0400)/"}
+    for i in range(30)
+]
+# vehicle 101 has no estimate, vehicle 102 is missing from the capacity table
+ESTIMATES = {v["VehicleID"]: [{"RouteStopID": 500 + i, "Seconds": 30 * i}] for i, v in enumerate(FLEET) if i != 1}
+CAPACITIES = [{"VehicleID": v["VehicleID"], "Capacity": 40, "CurrentOccupation": i} for i, v in enumerate(FLEET) if i != 2]
+
+HOUR = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+PERIODS = [
+    {"number": i + 1,
+     "startTime": (HOUR + timedelta(hours=i - 1)).isoformat(),
+     "endTime": (HOUR + timedelta(hours=i)).isoformat(),
+     "isDaytime": True, "temperature": 70 + i, "windSpeed": "5 to 10 mph",
+     "shortForecast": "Chance Rain Showers" if i % 2 else "Sunny",
+     "probabilityOfPrecipitation": {"unitCode": "wmoUnit:percent", "value": 10 * i}}
+    for i in range(6)
+]
+INCIDENTS = {"results": [
+    {"location": {"shape": {"links": [{"points": [{"lat": 33.77, "lng": -84.39}, {"lat": 33.78, "lng": -84.39}]}]}},
+     "incidentDetails": {"type": "accident", "roadClosed": False, "startTime": "2025-10-18T14:00:00Z",
+                         "endTime": "2025-10-18T16:00:00Z", "comment": "Crash on North Ave"}},
+    {"location": {"shape": {"links": []}},
+     "incidentDetails": {"type": "roadClosure", "roadClosed": True, "junctionTraversability": "allClosed",
+                         "startTime": "2025-10-18T12:00:00Z", "endTime": None, "comment": None}},
+]}
+
+
+class FixedDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return datetime(2025, 10, 18, 10, 30, 0, tzinfo=tz)
+
+
+@pytest.fixture(autouse=True)
+def fixed_clock(monkeypatch):
+    # snapshot_time is the fetch wall clock; pin it so both paths agree
+    for module in (bus_module, weather_module, traffic_module):
+        monkeypatch.setattr(module, "datetime", FixedDatetime)
+
+
+def make_app():
+    async def vehicles(request):
+        return web.json_response(FLEET)
+
+    async def estimates(request):
+        ids = [int(i) for i in request.query["vehicleIdStrings"].split(",")]
+        return web.json_response([{"VehicleID": i, "Estimates": ESTIMATES.get(i, [])} for i in ids])
+
+    async def capacities(request):
+        return web.json_response(CAPACITIES)
+
+    async def points(request):
+        base = f"{request.scheme}://{request.host}"
+        return web.json_response({"properties": {"forecastHourly": f"{base}/gridpoints/FFC/52,87/forecast/hourly"}})
+
+    async def forecast(request):
+        return web.json_response({"properties": {"periods": PERIODS}}, headers={"Cache-Control": "max-age=600"})
+
+    async def alerts(request):
+        return web.json_response({"features": []})
+
+    async def incidents(request):
+        return web.json_response(INCIDENTS)
+
+    app = web.Application()
+    app.router.add_get("/Services/JSONPRelay.svc/GetMapVehiclePoints", vehicles)
+    app.router.add_get("/Services/JSONPRelay.svc/GetVehicleRouteStopEstimates", estimates)
+    app.router.add_get("/Services/JSONPRelay.svc/GetVehicleCapacities", capacities)
+    app.router.add_get("/points/{point}", points)
+    app.router.add_get("/gridpoints/FFC/52,87/forecast/hourly", forecast)
+    app.router.add_get("/alerts/active", alerts)
+    app.router.add_get("/v7/incidents", incidents)
+    return app
+
+
+def compare(make_extractor, extract):
+    """Run extract(extractor) sync and async against the stub server and return both frames."""
+    async def main():
+        server = TestServer(make_app())
+        await server.start_server()
+        base = str(server.make_url("")).rstrip("/")
+        WeatherExtractor._forecast_endpoints.clear()
+        try:
+            sync_extractor, async_extractor = make_extractor(base), make_extractor(base)
+            loop = asyncio.get_running_loop()
+            expected = await loop.run_in_executor(None, lambda: extract(sync_extractor, False))
+            actual = await extract(async_extractor, True)
+            await async_extractor.aclose()
+            await ABCBaseExtractor.aclose_pool()
+            return expected, actual
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("batch_etas", [True, False])
+def test_bus_async_matches_sync(batch_etas):
+    expected, actual = compare(
+        lambda base: BusExtractor(base_url=base, api_key="key", batch_etas=batch_etas),
+        lambda bus, is_async: bus.aextract() if is_async else bus.extract(),
+    )
+    assert len(expected) == len(FLEET)
+    assert expected["eta_to_stop"].isna().sum() == 1 and expected["capacity"].isna().sum() == 1
+    assert_frame_equal(actual, expected)
+
+
+def test_weather_async_matches_sync():
+    make = lambda base: WeatherExtractor(base_url=base, api_key="", user_agent="(test, test@example.com)")
+    expected, actual = compare(make, lambda w, is_async: w.aextract() if is_async else w.extract())
+    assert len(expected) == 1
+    assert_frame_equal(actual, expected)
+
+
+def test_weather_horizon_async_matches_sync():
+    make = lambda base: WeatherExtractor(base_url=base, api_key="", user_agent="(test, test@example.com)")
+    expected, actual = compare(make, lambda w, is_async: w.aextract_horizon() if is_async else w.extract_horizon())
+    assert len(expected) == len(PERIODS)
+    # snapshot_time is taken at build time on each path
+    assert_frame_equal(actual.drop(columns="snapshot_time"), expected.drop(columns="snapshot_time"))
+
+
+def test_traffic_async_matches_sync():
+    expected, actual = compare(
+        lambda base: TrafficExtractor(base_url=base, api_key="key"),
+        lambda t, is_async: t.aextract() if is_async else t.extract(),
+    )
+    assert len(expected) == 2
+    assert_frame_equal(actual, expected)
@@ -0,0 +1,95 @@
+import math
+
+import pytest
+
+from extractors.BusExtractor import BusExtractor
+
+
+def vehicles(n):
+    return [
+        {
+            "VehicleID": 100 + i,
+            "RouteID": 20,
+            "Latitude": 33.77 + i * 1e-4,
+            "Longitude": -84.39,
+            "GroundSpeed": 10.0,
+            "TimeStamp": "/Date(1760800000000-0400)/",
+        }
+        for i in range(n)
+    ]
+
+
+class StubResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class StubSession:
+    """requests.Session stand-in answering TransLoc endpoints from the vehicle list."""
+
+    def __init__(self, fleet):
+        self.fleet = fleet
+        self.calls = []
+        self.headers = {}
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls.append((url, dict(params or {})))
+        if url.endswith(BusExtractor.VEHICLES_ENDPOINT.lstrip("/")):
+            return StubResponse(self.fleet)
+        if url.endswith(BusExtractor.ESTIMATES_ENDPOINT.lstrip("/")):
+            ids = str(params["vehicleIdStrings"]).split(",")
+            return StubResponse([
+                {"VehicleID": int(i), "Estimates": [{"RouteStopID": 7, "Seconds": 60}]} for i in ids
+            ])
+        if url.endswith(BusExtractor.CAPACITIES_ENDPOINT.lstrip("/")):
+            return StubResponse([
+                {"VehicleID": v["VehicleID"], "Capacity": 40, "CurrentOccupation": 12} for v in self.fleet
+            ])
+        raise AssertionError(f"unexpected request {url}")
+
+    def count(self, endpoint):
+        return sum(url.endswith(endpoint.lstrip("/")) for url, _ in self.calls)
+
+
+def extractor(fleet, **kwargs):
+    bus = BusExtractor(base_url="https://transloc.test", api_key="key", **kwargs)
+    bus.session = StubSession(fleet)
+    return bus
+
+
+@pytest.mark.parametrize("n", [0, 1, 24, 25, 26, 60])
+def test_one_vehicles_call_batched_etas_and_one_capacity_call_per_tick(n):
+    bus = extractor(vehicles(n))
+    df = bus.extract()
+
+    session = bus.session
+    assert session.count(BusExtractor.VEHICLES_ENDPOINT) == 1
+    assert session.count(BusExtractor.ESTIMATES_ENDPOINT) == math.ceil(n / BusExtractor.ETA_BATCH_SIZE)
+    assert session.count(BusExtractor.CAPACITIES_ENDPOINT) == (1 if n else 0)
+    assert len(session.calls) == 1 + math.ceil(n / BusExtractor.ETA_BATCH_SIZE) + (1 if n else 0)
+
+    assert len(df) == n
+    if n:
+        assert (df["destination_route_stop_id"] == 7).all()
+        assert (df["capacity"] == 40).all() and (df["occupancy"] == 12).all()
+
+
+def test_eta_batches_cover_every_vehicle_once():
+    bus = extractor(vehicles(60))
+    bus.extract()
+    requested = [
+        int(i)
+        for url, params in bus.session.calls if "vehicleIdStrings" in params
+        for i in params["vehicleIdStrings"].split(",")
+    ]
+    assert sorted(requested) == [100 + i for i in range(60)]
+
+
+def test_per_vehicle_etas_without_batching():
+    bus = extractor(vehicles(3), batch_etas=False)
+    bus.extract()
+    assert bus.session.count(BusExtractor.ESTIMATES_ENDPOINT) == 3
+    assert bus.session.count(BusExtractor.CAPACITIES_ENDPOINT) == 1
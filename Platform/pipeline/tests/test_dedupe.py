@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from dedupe import RecentKeys
+
+KEY = ["bus_id", "time_of_day"]
+
+
+def _rows(*keys):
+    return pd.DataFrame(keys, columns=KEY)
+
+
+def test_rows_seen_in_an_earlier_frame_are_dropped():
+    recent = RecentKeys()
+    assert len(recent.filter_new(_rows((1, "10:00"), (2, "10:00")), KEY)) == 2
+    fresh = recent.filter_new(_rows((1, "10:00"), (2, "10:01")), KEY)
+
+    assert fresh.values.tolist() == [[2, "10:01"]]
+    assert recent.dropped == 1
+    assert (2, "10:01") in recent and len(recent) == 3
+
+
+def test_duplicates_within_one_frame_keep_the_first_row():
+    fresh = RecentKeys().filter_new(_rows((1, "10:00"), (1, "10:00"), (2, "10:00"), (1, "10:00")), KEY)
+    assert fresh.index.tolist() == [0, 2]
+
+
+def test_missing_key_values_compare_equal():
+    frame = pd.DataFrame({"bus_id": [1, 1, 1], "time_of_day": [None, np.nan, "10:00"]})
+    recent = RecentKeys()
+    assert recent.filter_new(frame, KEY).index.tolist() == [0, 2]
+    assert (1, None) in recent
+    assert recent.filter_new(frame.iloc[[1]], KEY).empty
+
+
+def test_least_recently_seen_key_is_evicted_at_maxlen():
+    recent = RecentKeys(maxlen=2)
+    recent.filter_new(_rows((1, "a"), (2, "a")), KEY)
+    # seeing 1 again makes 2 the oldest
+    recent.filter_new(_rows((1, "a")), KEY)
+    recent.filter_new(_rows((3, "a")), KEY)
+
+    assert len(recent) == 2
+    assert (1, "a") in recent and (3, "a") in recent and (2, "a") not in recent
+    assert len(recent.filter_new(_rows((2, "a")), KEY)) == 1
+
+
+def test_filter_remembers_nothing_until_commit():
+    recent = RecentKeys()
+    fresh, keys = recent.filter(_rows((1, "a"), (1, "a"), (2, "a")), KEY)
+
+    assert len(fresh) == 2 and keys == [(1, "a"), (2, "a")]
+    assert len(recent) == 0
+    # the load failed: the same rows are still new next time
+    fresh, keys = recent.filter(_rows((1, "a"), (2, "a")), KEY)
+    assert len(fresh) == 2
+    recent.commit(keys)
+    assert recent.filter(_rows((1, "a"), (2, "a")), KEY)[0].empty
@@ -0,0 +1,175 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_store import UNSEEN_INDEX, FeatureStore, load_encoders
+
+ENCODERS = {
+    "route_id_idx": {"4001": 0, "4002": 1},
+    "target_stop_idx": {"10": 0, "20": 1, "30": 2},
+}
+
+
+def _ticks(rows):
+    return pd.DataFrame([{
+        "bus_id": bus_id, "route_id": route_id,
+        "latitude": 33.77, "longitude": -84.39, "bus_speed": 10.0,
+        "eta_to_stop": 60, "destination_route_stop_id": stop_id,
+        "snapshot_time": "2024-03-04 08:00:00",
+    } for bus_id, route_id, stop_id in rows])
+
+
+def _indexes(store):
+    features = store.features().set_index("vehicle_id")
+    return features[["route_id_idx", "target_stop_idx"]].to_dict("index")
+
+
+def test_constructor_requires_encoders():
+    with pytest.raises(TypeError):
+        FeatureStore()
+
+
+def test_indexes_come_from_the_training_encoders_not_arrival_order():
+    rows = [(1, 4002, 30), (2, 4001, 10)]
+    forward, backward = FeatureStore(ENCODERS), FeatureStore(ENCODERS)
+    forward.update_bus(_ticks(rows))
+    backward.update_bus(_ticks(rows[::-1]))
+
+    expected = {1: {"route_id_idx": 1, "target_stop_idx": 2}, 2: {"route_id_idx": 0, "target_stop_idx": 0}}
+    assert _indexes(forward) == expected
+    assert _indexes(backward) == expected
+
+
+def test_unseen_ids_get_the_sentinel(capsys):
+    store = FeatureStore(ENCODERS)
+    store.update_bus(_ticks([(1, 4999, 20), (2, 4001, 99), (3, 4999, 99)]))
+
+    assert _indexes(store) == {
+        1: {"route_id_idx": UNSEEN_INDEX, "target_stop_idx": 1},
+        2: {"route_id_idx": 0, "target_stop_idx": UNSEEN_INDEX},
+        3: {"route_id_idx": UNSEEN_INDEX, "target_stop_idx": UNSEEN_INDEX},
+    }
+    # the encoders are not extended, and each unseen id is reported once
+    assert "4999" not in store.route_index and "99" not in store.stop_index
+    store.features()
+    out = capsys.readouterr().out
+    assert out.count("id 4999") == 1 and out.count("id 99") == 1
+
+
+def test_load_encoders_from_model_bundle(tmp_path):
+    path = tmp_path / "model.pkl"
+    with open(path, "wb") as f:
+        pickle.dump({"model": None, "transformer": None, "encoders": ENCODERS}, f)
+    assert load_encoders(path) == ENCODERS
+
+    with open(path, "wb") as f:
+        pickle.dump({"model": None, "transformer": None}, f)
+    with pytest.raises(ValueError, match="encoders"):
+        load_encoders(path)
+
+
+def test_restore_uses_the_current_model_encoders(tmp_path):
+    store = FeatureStore(ENCODERS)
+    store.update_bus(_ticks([(1, 4002, 30)]))
+    path = store.snapshot(str(tmp_path / "state.pkl"))
+
+    assert _indexes(FeatureStore.restore(path)) == {1: {"route_id_idx": 1, "target_stop_idx": 2}}
+    retrained = {"route_id_idx": {"4002": 5}, "target_stop_idx": {"30": 7}}
+    assert _indexes(FeatureStore.restore(path, encoders=retrained)) == {1: {"route_id_idx": 5, "target_stop_idx": 7}}
+
+
+# -- behaviour ---------------------------------------------------------------
+
+T0 = pd.Timestamp("2024-03-04 08:00:00")
+
+
+def _fix(seconds, bus_id=1, stop_id=10, eta=60, speed=10.0, route_id=4001, lat=33.77, lon=-84.39):
+    return {"bus_id": bus_id, "route_id": route_id, "latitude": lat, "longitude": lon, "bus_speed": speed,
+            "eta_to_stop": eta, "destination_route_stop_id": stop_id,
+            "snapshot_time": str(T0 + pd.Timedelta(seconds=seconds))}
+
+
+def _feed(store, *fixes):
+    store.update_bus(pd.DataFrame(list(fixes)))
+    return store.features().set_index("vehicle_id")
+
+
+def test_headway_is_time_since_the_previous_bus_reached_the_stop():
+    store = FeatureStore(ENCODERS)
+    # bus 1 heads for stop 10 and has moved on to stop 20 by t=30
+    _feed(store, _fix(0, bus_id=1, stop_id=10, eta=60), _fix(30, bus_id=1, stop_id=20, eta=90))
+    features = _feed(store, _fix(100, bus_id=2, stop_id=10, eta=40))
+
+    # arrival inferred at min(predicted 60, next snapshot 30) = t=30
+    assert features.loc[2, "headway_to_prev_bus_sec"] == 70
+    assert np.isnan(features.loc[1, "headway_to_prev_bus_sec"])
+
+
+def test_delay_is_the_slip_of_the_predicted_arrival_since_first_heading_for_the_stop():
+    store = FeatureStore(ENCODERS)
+    features = _feed(store, _fix(0, eta=120), _fix(15, eta=135), _fix(30, eta=150))
+
+    assert features.loc[1, "current_delay_sec"] == 60
+    assert features.loc[1, "first_predicted_arrival"] == T0 + pd.Timedelta(seconds=120)
+    # a new target starts a new baseline
+    features = _feed(store, _fix(45, stop_id=20, eta=100))
+    assert features.loc[1, "current_delay_sec"] == 0
+
+
+def test_speed_is_averaged_over_the_last_60_seconds():
+    store = FeatureStore(ENCODERS)
+    features = _feed(store, _fix(0, speed=10.0), _fix(30, speed=20.0), _fix(70, speed=30.0))
+    assert features.loc[1, "current_speed_mps"] == pytest.approx(25.0 * 0.44704)
+
+
+def test_weather_only_counts_while_fresh():
+    store = FeatureStore(ENCODERS)
+    store.update_weather(pd.DataFrame({"snapshot_time": [str(T0)], "conditions": ["Light Rain"],
+                                       "precipitation_probability": [20]}))
+    assert _feed(store, _fix(3_600)).loc[1, "is_raining"] == 1.0
+    assert np.isnan(_feed(store, _fix(3 * 3_600)).loc[1, "is_raining"])
+
+
+def test_vehicles_not_seen_for_stale_after_s_are_evicted():
+    store = FeatureStore(ENCODERS, stale_after_s=900)
+    _feed(store, _fix(0, bus_id=1), _fix(0, bus_id=2))
+    features = _feed(store, _fix(600, bus_id=2), _fix(1_000, bus_id=3))
+
+    assert len(store) == 2 and list(features.index) == [2, 3]
+    # a vehicle back after a long gap starts fresh
+    features = _feed(store, _fix(3_000, bus_id=3, eta=100))
+    assert features.loc[3, "current_delay_sec"] == 0
+
+
+def test_snapshot_and_restore_give_the_same_features(tmp_path):
+    store = FeatureStore(ENCODERS)
+    _feed(store, _fix(0, bus_id=1, stop_id=10), _fix(30, bus_id=1, stop_id=20),
+          _fix(15, bus_id=2, stop_id=30, eta=200), _fix(45, bus_id=2, stop_id=10, eta=20))
+    path = store.snapshot(str(tmp_path / "state.pkl"))
+    restored = FeatureStore.restore(path)
+
+    pd.testing.assert_frame_equal(restored.features(), store.features())
+    # and both keep evolving identically
+    more = pd.DataFrame([_fix(60, bus_id=2, stop_id=10, eta=5)])
+    store.update_bus(more)
+    restored.update_bus(more)
+    pd.testing.assert_frame_equal(restored.features(), store.features())
+
+
+def test_distance_to_target_stop_comes_from_the_route_geometry():
+    pytest.importorskip("scipy")
+    pytest.importorskip("pyproj")
+    from route_geometry import RouteGeometryStore
+
+    geometry = RouteGeometryStore()
+    geometry.add_route(4001, [(33.770, -84.400), (33.770, -84.390)])
+    geometry.add_stops(pd.DataFrame({"route_stop_id": [10], "route_id": [4001],
+                                     "latitude": [33.770], "longitude": [-84.392]}))
+    store = FeatureStore(ENCODERS, geometry=geometry)
+    features = _feed(store, _fix(0, lat=33.770, lon=-84.398), _fix(0, bus_id=2, route_id=4002))
+
+    # 0.006 degrees of longitude at 33.77N is about 555 m
+    assert features.loc[1, "distance_to_target_stop_m"] == pytest.approx(555, abs=5)
+    assert np.isnan(features.loc[2, "distance_to_target_stop_m"])
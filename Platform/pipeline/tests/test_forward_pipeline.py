@@ -0,0 +1,176 @@
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import ForwardPipeline as forward_pipeline_module
+from ForwardPipeline import ForwardPipeline
+
+
+class RecordingSink:
+    def __init__(self):
+        self.writes = []
+        self.closed = False
+
+    def write(self, source, batch, df):
+        self.writes.append((source, time.monotonic(), len(df)))
+
+    def close(self):
+        self.closed = True
+
+    def sources(self):
+        return [source for source, _, _ in self.writes]
+
+
+def slow(frame, seconds):
+    def extract(**kwargs):
+        time.sleep(seconds)
+        return frame
+    return extract
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    monkeypatch.setattr(ForwardPipeline, "EXTRACT_TIMEOUTS", {"bus": 1.0, "weather": 1.0, "traffic": 1.0})
+    cfg = SimpleNamespace(pg_dsn=None, bus_key="k", weather_user_agent="(test, test@example.com)", traffic_key="k")
+    sink = RecordingSink()
+    pipe = ForwardPipeline(cfg, sinks=[sink])
+    pipe.bus.extract = slow(pd.DataFrame({"bus_id": [1, 2], "destination_route_stop_id": [5, 6],
+                                          "time_of_day": ["10:00:00", "10:00:01"], "route_id": [20, 20]}), 0.0)
+    pipe.weather.extract = slow(pd.DataFrame({"temperature": [70.0]}), 0.4)
+    pipe.traffic.extract = slow(pd.DataFrame({"type": ["accident"]}), 0.2)
+    yield pipe, sink
+    pipe.close()
+
+
+def test_bus_is_delivered_before_slow_sources_finish(pipeline):
+    pipe, sink = pipeline
+    started = time.monotonic()
+    frames = pipe.run_once()
+
+    assert sink.sources()[0] == "bus"
+    assert sink.writes[0][1] - started < 0.15
+    # the others are delivered in completion order, not submission order
+    assert sink.sources() == ["bus", "traffic", "weather"]
+    assert set(frames) == {"bus", "weather", "traffic"}
+
+
+def test_run_once_without_waiting_returns_after_bus(pipeline):
+    pipe, sink = pipeline
+    started = time.monotonic()
+    frames = pipe.run_once(wait=False)
+
+    assert time.monotonic() - started < 0.15
+    assert list(frames) == ["bus"] and len(frames["bus"]) == 2
+    assert sink.sources() == ["bus"]
+
+    pipe.close()
+    assert sink.sources() == ["bus", "traffic", "weather"]
+    assert pipe.last_timings["weather"]["status"] == "ok"
+
+
+def test_timed_out_source_is_delivered_empty_at_its_deadline(pipeline, monkeypatch):
+    pipe, sink = pipeline
+    monkeypatch.setattr(ForwardPipeline, "EXTRACT_TIMEOUTS", {"bus": 1.0, "weather": 0.1, "traffic": 1.0})
+    frames = pipe.run_once()
+
+    assert frames["weather"].empty
+    assert pipe.last_timings["weather"]["status"] == "timeout"
+    assert sink.sources() == ["bus", "weather", "traffic"]
+
+    # still running from the last batch: not resubmitted, delivered as busy
+    frames = pipe.run_once()
+    assert pipe.last_timings["weather"]["status"] == "busy"
+
+
+def test_sequential_mode_delivers_every_source(pipeline):
+    pipe, sink = pipeline
+    pipe.concurrent = False
+    frames = pipe.run_once()
+    assert sink.sources() == ["bus", "weather", "traffic"]
+    assert len(frames["bus"]) == 2
+
+
+def test_rows_from_a_failed_load_are_not_dropped_as_duplicates(pipeline, monkeypatch):
+    pipe, sink = pipeline
+    pipe.repo = SimpleNamespace(close=lambda: None)
+    loaded = []
+
+    def load(name, batch, df):
+        if not loaded:
+            loaded.append(None)
+            raise RuntimeError("COPY failed")
+        loaded.append(len(df))
+    monkeypatch.setattr(pipe, "_load", load)
+
+    frame = pd.DataFrame({"bus_id": [1, 2], "destination_route_stop_id": [5, 6], "time_of_day": ["10:00:00", "10:00:01"]})
+    with pytest.raises(RuntimeError):
+        pipe._deliver("bus", "b1", pipe._result(frame, "ok", time.monotonic()))
+    assert len(pipe.recent_keys["bus"]) == 0
+
+    # the next tick re-reads the same (stationary) buses
+    assert len(pipe._deliver("bus", "b2", pipe._result(frame, "ok", time.monotonic()))) == 2
+    assert loaded == [None, 2]
+    assert pipe._deliver("bus", "b3", pipe._result(frame, "ok", time.monotonic())).empty
+
+
+def test_a_failed_load_does_not_abort_the_batch(pipeline, monkeypatch):
+    pipe, sink = pipeline
+    pipe.repo = SimpleNamespace(close=lambda: None)
+
+    def load(name, batch, df):
+        if name == "bus":
+            raise RuntimeError("database is down")
+    monkeypatch.setattr(pipe, "_load", load)
+
+    for concurrent in (True, False):
+        pipe.concurrent = concurrent
+        sink.writes.clear()
+        frames = pipe.run_once()
+
+        assert set(frames) == {"bus", "weather", "traffic"}
+        assert sink.sources() == (["traffic", "weather"] if concurrent else ["weather", "traffic"])
+        assert pipe.last_timings["bus"]["status"] == "error"
+        assert pipe.last_timings["weather"]["status"] == "ok"
+
+
+class FakeRepository:
+    def __init__(self, dsn, indexes=()):
+        self.indexes = set(indexes)
+        self.executed = []
+        self.closed = False
+
+    def create_staging_tables(self):
+        pass
+
+    def index_exists(self, name):
+        return name in self.indexes
+
+    def execute(self, sql):
+        self.executed.append(sql)
+
+    def prepare(self, name, sql):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def test_startup_checks_for_the_upsert_index_without_migrating(monkeypatch):
+    cfg = SimpleNamespace(pg_dsn="postgresql://test", bus_key="k", weather_user_agent="(test, test@example.com)",
+                          traffic_key="k")
+    repos = []
+
+    def repository(dsn, indexes):
+        repos.append(FakeRepository(dsn, indexes))
+        return repos[-1]
+
+    monkeypatch.setattr(forward_pipeline_module, "DbRepository", lambda dsn: repository(dsn, {"stop_events_natural_key"}))
+    ForwardPipeline(cfg).close()
+    assert repos[-1].executed == []
+
+    monkeypatch.setattr(forward_pipeline_module, "DbRepository", lambda dsn: repository(dsn, ()))
+    with pytest.raises(RuntimeError, match="--migrate"):
+        ForwardPipeline(cfg)
+    assert repos[-1].executed == [] and repos[-1].closed
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from headways import BUNCHING_S, HeadwayTracker, compute_headways, time_since_last_arrival
+
+T0 = pd.Timestamp("2024-03-04 08:00:00")
+
+
+def _events(rows):
+    """(route_id, route_stop_id, vehicle_id, minutes after T0[, event])"""
+    return pd.DataFrame([{
+        "route_id": r[0], "route_stop_id": r[1], "vehicle_id": r[2],
+        "event_time": T0 + pd.Timedelta(minutes=r[3]), "event": r[4] if len(r) > 4 else "arrival",
+    } for r in rows])
+
+
+EVENTS = _events([
+    (20, 1, "a", 0), (20, 1, "b", 10), (20, 2, "a", 3), (20, 1, "c", 12),
+    (20, 2, "b", 13), (20, 1, "a", 30), (21, 1, "x", 5), (21, 1, "y", 7),
+    (20, 1, "b", 31, "departure"),
+])
+
+
+def test_headways_are_per_route_and_stop():
+    out = compute_headways(EVENTS)
+    stop = out[(out["route_id"] == 20) & (out["route_stop_id"] == 1)]
+
+    assert stop["vehicle_id"].tolist() == ["a", "b", "c", "a"]
+    assert stop["prev_vehicle_id"].isna().tolist() == [True, False, False, False]
+    assert stop["prev_vehicle_id"].tolist()[1:] == ["a", "b", "c"]
+    assert np.isnan(stop["headway_sec"].iloc[0])
+    assert stop["headway_sec"].tolist()[1:] == [600.0, 120.0, 1080.0]
+    # the departure is not an arrival
+    assert len(out) == 8
+
+
+def test_scheduled_headway_defaults_to_the_route_median():
+    out = compute_headways(EVENTS)
+    route_20 = out[out["route_id"] == 20].set_index("event_time")
+    # route 20 headways: 600, 120, 1080 at stop 1 and 600 at stop 2
+    assert route_20["scheduled_headway_sec"].unique().tolist() == [600.0]
+    bus_c = route_20.loc[T0 + pd.Timedelta(minutes=12)]
+    assert bus_c["headway_gap_sec"] == -480.0 and bus_c["is_bunched"]
+    assert not route_20.loc[T0 + pd.Timedelta(minutes=10), "is_bunched"]
+
+
+def test_bunching_without_any_schedule_uses_the_fixed_threshold():
+    out = compute_headways(EVENTS, scheduled={20: 600.0})
+    route_21 = out[out["route_id"] == 21]
+    assert route_21["scheduled_headway_sec"].isna().all()
+    assert route_21["is_bunched"].tolist() == [False, 120.0 < BUNCHING_S]
+
+
+@pytest.mark.parametrize("cuts", [[4, 11, 20], [1, 2, 3, 5, 6, 7, 8], []])
+def test_tracker_over_ticks_matches_the_batch(cuts):
+    arrivals = EVENTS[EVENTS["event"] == "arrival"].sort_values("event_time").reset_index(drop=True)
+    minutes = (arrivals["event_time"] - T0).dt.total_seconds() / 60
+    ticks = np.searchsorted(cuts, minutes.to_numpy(), side="right")
+
+    tracker = HeadwayTracker(scheduled=600.0)
+    live = pd.concat([tracker.update(arrivals[ticks == k]) for k in range(len(cuts) + 1)], ignore_index=True)
+
+    key = ["route_id", "route_stop_id", "event_time"]
+    batch = compute_headways(EVENTS, scheduled=600.0).sort_values(key).reset_index(drop=True)
+    live = live.sort_values(key).reset_index(drop=True)
+    # the batch's prev_vehicle_id is a string column, the tracker's object
+    for frame in (live, batch):
+        frame["prev_vehicle_id"] = frame["prev_vehicle_id"].astype(object).where(frame["prev_vehicle_id"].notna())
+    pd.testing.assert_frame_equal(live, batch, check_dtype=False)
+    assert len(tracker) == 3
+
+
+def test_tracker_ignores_events_older_than_the_last_known_arrival():
+    tracker = HeadwayTracker()
+    tracker.update(_events([(20, 1, "a", 10)]))
+    out = tracker.update(_events([(20, 1, "b", 5), (20, 1, "c", 15)]))
+    assert out["vehicle_id"].tolist() == ["c"]
+    assert out["headway_sec"].tolist() == [300.0]
+
+
+def test_time_since_last_arrival_with_a_duplicate_index():
+    snapshots = pd.DataFrame({
+        "route_id": [20, 20, 20, 21, 20],
+        "route_stop_id": [1.0, 1.0, 2.0, 1.0, np.nan],
+        "snapshot_time": [T0 + pd.Timedelta(minutes=m) for m in (11, 5, 20, 4, 11)],
+    }, index=[0, 1, 0, 1, 0])
+    since = time_since_last_arrival(snapshots, EVENTS)
+
+    assert list(since.index) == [0, 1, 0, 1, 0]
+    # an arrival after the snapshot never counts
+    assert since.tolist()[:3] == [60.0, 300.0, 420.0]
+    assert np.isnan(since.iloc[3]) and np.isnan(since.iloc[4])
+
+    capped = time_since_last_arrival(snapshots, EVENTS, max_gap_s=360)
+    assert capped.tolist()[:2] == [60.0, 300.0] and np.isnan(capped.iloc[2])
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+polyline = pytest.importorskip("polyline")
+pytest.importorskip("shapely")
+
+from incident_overlap import OverlapEngine, _union_length
+from route_geometry import PROJECTED_CRS, get_transformer
+
+LAT = 33.770
+
+
+def along_route(lon_from, lon_to, lat=LAT):
+    return polyline.encode([(lat, lon_from), (lat, (lon_from + lon_to) / 2), (lat, lon_to)])
+
+
+def metres(lon_from, lon_to, lat=LAT):
+    x, y = get_transformer(PROJECTED_CRS).transform([lon_from, lon_to], [lat, lat])
+    return float(np.hypot(x[1] - x[0], y[1] - y[0]))
+
+
+@pytest.fixture
+def engine():
+    engine = OverlapEngine()
+    engine.set_routes(pd.DataFrame({
+        "route_id": [20, 21],
+        "encoded_polyline": [along_route(-84.400, -84.390), along_route(-84.400, -84.390, lat=33.780)],
+    }))
+    return engine
+
+
+def incidents(rows):
+    return pd.DataFrame(rows, columns=["polylines", "type", "is_road_closed"])
+
+
+def test_overlapping_incidents_are_counted_once(engine):
+    frame = incidents([
+        ([along_route(-84.398, -84.394)], "accident", False),
+        ([along_route(-84.396, -84.392)], "construction", True),
+    ])
+    table = engine.affected_meters(frame).set_index("route_id")
+
+    assert table.loc[20, "affected_m"] == pytest.approx(metres(-84.398, -84.392), abs=3)
+    assert table.loc[20, "closed_m"] == pytest.approx(metres(-84.396, -84.392), abs=3)
+    assert table.loc[20, "incidents"] == 2
+    assert table.loc[21].tolist() == [0.0, 0.0, 0]
+
+    pairs = engine.overlaps(frame).set_index("incident")
+    assert pairs.loc[0, "overlap_m"] == pytest.approx(metres(-84.398, -84.394), abs=3)
+    assert pairs.loc[1, "overlap_m"] == pytest.approx(metres(-84.396, -84.392), abs=3)
+
+
+def test_duplicate_links_of_one_incident_are_counted_once(engine):
+    link = along_route(-84.398, -84.394)
+    frame = incidents([([link, link, along_route(-84.397, -84.395)], "accident", False)])
+    pairs = engine.overlaps(frame)
+    assert len(pairs) == 1
+    assert pairs.loc[0, "overlap_m"] == pytest.approx(metres(-84.398, -84.394), abs=3)
+
+
+def test_link_crossing_the_route_covers_nothing(engine):
+    crossing = polyline.encode([(LAT - 0.002, -84.395), (LAT + 0.002, -84.395)])
+    table = engine.affected_meters(incidents([([crossing], "accident", False)])).set_index("route_id")
+    assert table.loc[20, "affected_m"] == 0.0
+    assert table.loc[20, "incidents"] == 0
+
+
+def test_union_length():
+    group = np.array([0, 0, 0, 1, 1, 0])
+    starts = np.array([0.0, 5.0, 20.0, 0.0, 1.0, 2.0])
+    ends = np.array([10.0, 12.0, 25.0, 4.0, 2.0, 3.0])
+    assert _union_length(group, starts, ends, 3).tolist() == [17.0, 4.0, 0.0]
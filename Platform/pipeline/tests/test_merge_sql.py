@@ -0,0 +1,42 @@
+import re
+
+import pytest
+
+from merge_sql import MERGE_DDL, MERGE_STATEMENTS
+from staging_schema import STAGING_SCHEMAS
+
+STAGING_TABLES = {
+    "merge_stop_events": "staging_stop_events",
+    "merge_weather": "staging_weather",
+    "merge_traffic": "staging_traffic",
+}
+
+
+@pytest.mark.parametrize("name", sorted(MERGE_STATEMENTS))
+def test_merge_reads_typed_staging_columns(name):
+    sql = MERGE_STATEMENTS[name]
+    table = STAGING_TABLES[name]
+    assert f"DELETE FROM {table}" in sql
+
+    inserted = re.search(r"INSERT INTO \w+ \((.*?)\)", sql, re.S).group(1)
+    columns = [col.strip() for col in inserted.split(",")]
+    assert set(columns) <= set(STAGING_SCHEMAS[table])
+
+    # staging is typed: no casts other than the ::date of the natural key
+    assert set(re.findall(r"::(\w+)", sql)) <= {"date"}
+
+
+def test_stop_events_conflict_target_matches_the_unique_index():
+    target = re.search(r"ON CONFLICT \((.*)\) DO UPDATE", MERGE_STATEMENTS["merge_stop_events"]).group(1)
+    index = re.search(r"ON stop_events\s*\((.*)\)\s*NULLS NOT DISTINCT", MERGE_DDL, re.S).group(1)
+    assert " ".join(target.split()) == " ".join(index.split())
+    assert "CREATE UNIQUE INDEX IF NOT EXISTS" in MERGE_DDL
+
+
+def test_migration_dedupes_on_the_index_key_before_creating_it():
+    partition = re.search(r"PARTITION BY (.*?)\s+ORDER BY", MERGE_DDL, re.S).group(1)
+    index = re.search(r"ON stop_events\s*\((.*)\)\s*NULLS NOT DISTINCT", MERGE_DDL, re.S).group(1)
+    assert " ".join(partition.split()) == " ".join(index.split())
+    # the merge keeps the latest snapshot_time per key; so does the dedupe
+    assert "ORDER BY snapshot_time DESC" in MERGE_DDL
+    assert MERGE_DDL.index("LOCK TABLE") < MERGE_DDL.index("DELETE FROM") < MERGE_DDL.index("CREATE UNIQUE INDEX")
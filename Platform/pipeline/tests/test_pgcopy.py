@@ -0,0 +1,118 @@
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pgcopy import PGCOPY_HEADER, PGCOPY_TRAILER, BinaryCopyStream, cast_frame
+from staging_schema import STAGING_DDL, STAGING_SCHEMAS
+
+BUS_SCHEMA = STAGING_SCHEMAS["staging_stop_events"]
+
+
+def decode(data):
+    """Reference decoder: binary COPY bytes -> list of rows of raw field bytes (None = NULL)."""
+    assert data.startswith(PGCOPY_HEADER) and data.endswith(PGCOPY_TRAILER)
+    pos, rows = len(PGCOPY_HEADER), []
+    while True:
+        (n_fields,) = struct.unpack_from(">h", data, pos)
+        pos += 2
+        if n_fields == -1:
+            return rows
+        row = []
+        for _ in range(n_fields):
+            (size,) = struct.unpack_from(">i", data, pos)
+            pos += 4
+            row.append(None if size == -1 else data[pos:pos + size])
+            pos += max(size, 0)
+        rows.append(row)
+
+
+def bus_tick(with_missing_eta):
+    """A BusExtractor frame as it comes out of pd.DataFrame(list of dicts)."""
+    rows = [
+        {"bus_id": 101, "route_id": 20, "latitude": 33.77, "longitude": -84.39, "day_of_week": "Monday",
+         "month": "10", "time_of_day": "10:00:00", "bus_speed": 12.5, "destination_route_stop_id": 555,
+         "eta_to_stop": 90, "snapshot_time": "2025-10-20 10:00:05", "capacity": 40, "occupancy": 12},
+        {"bus_id": 102, "route_id": 21, "latitude": 33.78, "longitude": -84.40, "day_of_week": "Monday",
+         "month": "10", "time_of_day": "10:00:01", "bus_speed": 0.0,
+         "destination_route_stop_id": None if with_missing_eta else 556,
+         "eta_to_stop": None if with_missing_eta else 30,
+         "snapshot_time": "2025-10-20 10:00:05", "capacity": None if with_missing_eta else 40,
+         "occupancy": None if with_missing_eta else 3},
+    ]
+    return pd.DataFrame(rows)
+
+
+def encode(frame, schema):
+    stream = BinaryCopyStream([frame], {"source_batch": "20251020T140005Z"}, schema)
+    stream.peek_columns()
+    return stream.columns, decode(stream.read())
+
+
+@pytest.mark.parametrize("with_missing_eta", [False, True])
+def test_bus_frame_is_encoded_as_the_staging_column_types(with_missing_eta):
+    frame = bus_tick(with_missing_eta)
+    # the dtype flip the schema protects against
+    assert frame["eta_to_stop"].dtype == (np.float64 if with_missing_eta else np.int64)
+
+    columns, rows = encode(frame, BUS_SCHEMA)
+    assert columns == list(BUS_SCHEMA)
+    widths = {"bigint": 8, "integer": 4, "double precision": 8, "timestamp": 8}
+    for row in rows:
+        for col, field in zip(columns, row):
+            if field is not None and BUS_SCHEMA[col] in widths:
+                assert len(field) == widths[BUS_SCHEMA[col]], col
+
+    first = dict(zip(columns, rows[0]))
+    assert struct.unpack(">q", first["bus_id"])[0] == 101
+    assert struct.unpack(">i", first["eta_to_stop"])[0] == 90
+    assert struct.unpack(">q", first["destination_route_stop_id"])[0] == 555
+    # microseconds since 2000-01-01
+    expected = (pd.Timestamp("2025-10-20 10:00:05") - pd.Timestamp("2000-01-01")) // pd.Timedelta(microseconds=1)
+    assert struct.unpack(">q", first["snapshot_time"])[0] == expected
+    assert first["time_of_day"] == b"10:00:00"
+    assert first["source_batch"] == b"20251020T140005Z"
+
+    second = dict(zip(columns, rows[1]))
+    if with_missing_eta:
+        assert second["eta_to_stop"] is None and second["capacity"] is None
+    else:
+        assert struct.unpack(">i", second["eta_to_stop"])[0] == 30
+
+
+def test_cast_frame_types():
+    cast = cast_frame(bus_tick(True), BUS_SCHEMA)
+    assert str(cast["bus_id"].dtype) == "Int64"
+    assert str(cast["eta_to_stop"].dtype) == "Int32"
+    assert cast["eta_to_stop"].isna().tolist() == [False, True]
+    assert pd.api.types.is_datetime64_dtype(cast["snapshot_time"])
+
+
+def test_cast_frame_traffic_times_and_flags():
+    frame = pd.DataFrame({
+        "polylines": [["abc", "def"], []],
+        "is_road_closed": [True, None],
+        "start_time": ["2025-10-18T14:00:00Z", "2025-10-18T10:00:00-04:00"],
+        "end_time": [None, "2025-10-18T16:00:00Z"],
+        "snapshot_time": ["2025-10-18 10:30:00", "2025-10-18 10:30:00"],
+    })
+    cast = cast_frame(frame, STAGING_SCHEMAS["staging_traffic"])
+    assert str(cast["start_time"].dt.tz) == "UTC"
+    assert cast["start_time"].iloc[0] == cast["start_time"].iloc[1]
+    assert cast["end_time"].isna().tolist() == [True, False]
+    assert cast["is_road_closed"].tolist()[0] is True and cast["is_road_closed"].isna().tolist() == [False, True]
+
+
+def test_cast_frame_rejects_values_the_column_cannot_hold():
+    with pytest.raises((TypeError, ValueError)):
+        cast_frame(pd.DataFrame({"eta_to_stop": [1.5]}), BUS_SCHEMA)
+    with pytest.raises(ValueError):
+        cast_frame(pd.DataFrame({"not_a_column": [1]}), BUS_SCHEMA)
+
+
+def test_staging_ddl_declares_every_schema_column():
+    for table, schema in STAGING_SCHEMAS.items():
+        assert f"CREATE TABLE IF NOT EXISTS {table} (" in STAGING_DDL
+        for col, pg_type in schema.items():
+            assert f"    {col} {pg_type}" in STAGING_DDL
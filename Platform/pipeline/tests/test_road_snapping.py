@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+pytest.importorskip("pyproj")
+
+from road_snapping import RoadNetwork
+
+# an eastbound one-way main street along 33.770N, split at -84.395, and a
+# two-way side street about 44 m north of it joined only at its ends
+NODES = [(33.770, -84.400), (33.770, -84.395), (33.770, -84.390), (33.7704, -84.400), (33.7704, -84.390)]
+EDGES = [(0, 1), (1, 2), (3, 4), (4, 3), (0, 3), (3, 0), (2, 4), (4, 2)]
+MAIN_WEST, MAIN_EAST = 0, 1
+
+# a bus driving east along the main street; the third fix drifts 28 m north,
+# closer to the side street than to the road it is on
+TRACE_LAT = [33.77003, 33.76997, 33.77025, 33.77004, 33.76996]
+TRACE_LON = [-84.398, -84.397, -84.396, -84.394, -84.393]
+
+
+@pytest.fixture
+def network():
+    lat, lon = zip(*NODES)
+    return RoadNetwork(lat, lon, EDGES)
+
+
+def test_nearest_edge_snapping_jumps_to_the_side_street(network):
+    snapped = network.snap_points(TRACE_LAT, TRACE_LON)
+    assert snapped["edge"].tolist()[2] in (2, 3)
+
+
+def test_hmm_matches_a_noisy_trace_to_the_driven_edges(network):
+    matched = network.match_trace(TRACE_LAT, TRACE_LON)
+
+    assert matched["edge"].tolist() == [MAIN_WEST, MAIN_WEST, MAIN_WEST, MAIN_EAST, MAIN_EAST]
+    assert matched["snapped_lat"].to_numpy() == pytest.approx(33.770, abs=1e-5)
+    assert matched["offset_m"].iloc[2] == pytest.approx(28, abs=1)
+
+
+def test_fixes_out_of_range_are_unmatched_and_restart_the_chain(network):
+    lats = TRACE_LAT[:2] + [33.780] + TRACE_LAT[3:]
+    matched = network.match_trace(lats, TRACE_LON)
+
+    assert matched["edge"].tolist() == [MAIN_WEST, MAIN_WEST, -1, MAIN_EAST, MAIN_EAST]
+    assert np.isnan(matched["snapped_lat"].iloc[2]) and np.isnan(matched["offset_m"].iloc[2])
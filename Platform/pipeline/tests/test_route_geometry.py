@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("scipy")
+pytest.importorskip("pyproj")
+
+from route_geometry import RouteGeometryStore, project
+
+# an L: east along 33.770N, then north along 84.390W
+CORNERS = [(33.770, -84.400), (33.770, -84.390), (33.775, -84.390)]
+STOPS = pd.DataFrame({"route_stop_id": [10, 20, 30], "route_id": [1, 1, 1],
+                      "latitude": [33.770, 33.770, 33.775], "longitude": [-84.400, -84.390, -84.390]})
+
+
+def _legs():
+    xy = project(*zip(*CORNERS))
+    return np.hypot(*np.diff(xy, axis=0).T)
+
+
+@pytest.fixture
+def store():
+    store = RouteGeometryStore()
+    store.add_route(1, CORNERS)
+    store.add_stops(STOPS)
+    return store
+
+
+def test_route_length_is_the_projected_polyline():
+    east, north = _legs()
+    # about 925 m and 555 m
+    assert east == pytest.approx(925, abs=5) and north == pytest.approx(555, abs=5)
+    shape = RouteGeometryStore().add_route(1, CORNERS)
+    assert shape.length == pytest.approx(east + north, abs=0.01)
+
+
+def test_distance_to_stop_is_along_the_route(store):
+    east, north = _legs()
+    dist = store.distance_to_stop([1, 1, 1], [33.770, 33.770, 33.7725], [-84.400, -84.395, -84.390], [30, 30, 30])
+    assert dist == pytest.approx([east + north, east / 2 + north, north / 2], abs=1)
+
+
+def test_a_stop_behind_the_vehicle_wraps_around_the_loop(store):
+    east, north = _legs()
+    # at the corner stop 10 is behind: it is reached by going round, so
+    # only the north leg is left; likewise stop 20 from halfway up it
+    dist = store.distance_to_stop([1, 1], [33.770, 33.7725], [-84.390, -84.390], [10, 20])
+    assert dist == pytest.approx([north, east + north - north / 2], abs=1)
+
+
+def test_unknown_route_or_stop_is_nan(store):
+    dist = store.distance_to_stop([1, 2, 1], [33.770] * 3, [-84.395] * 3, [30, 30, 99])
+    assert not np.isnan(dist[0])
+    assert np.isnan(dist[1]) and np.isnan(dist[2])
+
+
+def test_positions_off_the_route_are_rejected_with_max_offset(store):
+    # about 110 m north of the east leg
+    dist = store.distance_to_stop([1, 1], [33.771, 33.770], [-84.395, -84.395], [30, 30], max_offset_m=50)
+    assert np.isnan(dist[0]) and not np.isnan(dist[1])
+    _, offset = store.locate([1], [33.771], [-84.395])
+    assert offset[0] == pytest.approx(111, abs=2)
+
+
+def test_nearest_stop(store):
+    stop_ids, dist = store.nearest_stop([1, 1, 2], [33.770, 33.7745, 33.770], [-84.3985, -84.390, -84.390])
+    assert stop_ids.tolist() == [10, 30, None]
+    assert dist[:2] == pytest.approx([139, 56], abs=2)
+    assert np.isnan(dist[2])
@@ -0,0 +1,112 @@
+import os
+import signal
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import Scheduler as scheduler_module
+from Scheduler import Scheduler, _seconds_until_service
+
+HOUR = 3_600
+
+
+class TerminatedPipeline:
+    """Receives SIGTERM in the middle of its first batch."""
+    def __init__(self):
+        self.batches = 0
+
+    def run_once(self, wait=True):
+        self.batches += 1
+        os.kill(os.getpid(), signal.SIGTERM)
+        return {"bus": pd.DataFrame()}
+
+
+def test_sigterm_stops_the_loop_like_ctrl_c(monkeypatch):
+    monkeypatch.setattr(scheduler_module, "_seconds_until_service", lambda **kwargs: 0)
+    before = signal.getsignal(signal.SIGTERM)
+    pipeline = TerminatedPipeline()
+
+    Scheduler(pipeline, handler=lambda *args: None, interval=0).run(max_ticks=5)
+
+    assert pipeline.batches == 1
+    assert signal.getsignal(signal.SIGTERM) is before
+
+
+# -- service hours ---------------------------------------------------------------
+
+@pytest.mark.parametrize("now, wait", [
+    (datetime(2024, 3, 5, 10, 0), 0),                           # Tuesday, in service
+    (datetime(2024, 3, 5, 6, 0), 0),                            # the window opens on the hour
+    (datetime(2024, 3, 5, 2, 30), 3.5 * HOUR),                  # overnight, same day
+    (datetime(2024, 3, 5, 23, 0), 7 * HOUR),                    # the window closes on the hour
+    (datetime(2024, 3, 8, 23, 30), (2 * 24 + 6.5) * HOUR),      # Friday night -> Monday
+    (datetime(2024, 3, 9, 12, 0), (24 + 18) * HOUR),            # Saturday noon -> Monday
+    (datetime(2024, 3, 10, 5, 59, 30), (24 + 0.5 / 60) * HOUR), # Sunday before 6 is not service
+])
+def test_seconds_until_service(now, wait):
+    assert _seconds_until_service(now=now) == wait
+
+
+def test_custom_service_window():
+    assert _seconds_until_service(now=datetime(2024, 3, 5, 5, 0), start_hour=5, end_hour=7) == 0
+    assert _seconds_until_service(now=datetime(2024, 3, 5, 7, 0), start_hour=5, end_hour=7) == 22 * HOUR
+
+
+# -- drift-corrected ticks ---------------------------------------------------------
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class SlowPipeline:
+    """Each batch takes the next of durations seconds on the clock."""
+    def __init__(self, clock, durations):
+        self.clock = clock
+        self.durations = list(durations)
+        self.started = []
+
+    def run_once(self, wait=True):
+        self.started.append(self.clock.now - 1_000.0)
+        self.clock.now += self.durations.pop(0)
+        return {"bus": pd.DataFrame()}
+
+
+def test_ticks_stay_on_the_grid_and_overruns_skip_slots(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler_module.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(scheduler_module.time, "sleep", clock.sleep)
+    monkeypatch.setattr(scheduler_module, "_seconds_until_service", lambda **kwargs: 0)
+    pipeline = SlowPipeline(clock, [2, 3.5, 40, 0.5])
+
+    scheduler = Scheduler(pipeline, handler=lambda *args: None, interval=15)
+    scheduler.run(max_ticks=4)
+
+    # time spent in a tick comes off the sleep; the 40 s tick misses the
+    # slots at 45 and 60 and the next one runs at 75
+    assert pipeline.started == [0, 15, 30, 75]
+    assert clock.sleeps == [13, 11.5, 5, 14.5]
+    assert scheduler.skipped == 2
+
+
+def test_outside_service_hours_sleeps_then_re_anchors(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler_module.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(scheduler_module.time, "sleep", clock.sleep)
+    waits = [HOUR + 7, 0, 0]
+    monkeypatch.setattr(scheduler_module, "_seconds_until_service", lambda **kwargs: waits.pop(0))
+    pipeline = SlowPipeline(clock, [1, 1])
+
+    Scheduler(pipeline, handler=lambda *args: None, interval=15).run(max_ticks=2)
+
+    assert pipeline.started == [HOUR + 7, HOUR + 22]
+    assert clock.sleeps == [HOUR + 7, 14, 14]
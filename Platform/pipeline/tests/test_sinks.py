@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from sinks import UNPARSED_PARTITION, ColumnarSink, read_snapshots
+
+
+def bus_rows(times):
+    return pd.DataFrame({
+        "bus_id": range(len(times)),
+        "route_id": 20,
+        "bus_speed": 5.0,
+        "snapshot_time": times,
+    })
+
+
+def test_rows_with_unparseable_snapshot_time_are_kept(tmp_path):
+    sink = ColumnarSink(tmp_path)
+    sink.write("bus", "b1", bus_rows(["2025-10-20 10:00:00", "not a time", None, "2025-10-21 08:00:00"]))
+    sink.close()
+
+    assert sink.unparsed_rows == 2
+    partitions = sorted(p.name for p in (tmp_path / "bus").iterdir())
+    assert partitions == ["date=2025-10-20", "date=2025-10-21", f"date={UNPARSED_PARTITION}"]
+
+    everything = read_snapshots(tmp_path, "bus")
+    assert sorted(everything["bus_id"]) == [0, 1, 2, 3]
+    assert everything.loc[everything["date"] == UNPARSED_PARTITION, "snapshot_time"].isna().all()
+
+    # date ranges never pick up the unparsed partition
+    assert sorted(read_snapshots(tmp_path, "bus", start="2025-10-20")["bus_id"]) == [0, 3]
+    assert sorted(read_snapshots(tmp_path, "bus", end="2025-10-20")["bus_id"]) == [0]
+
+
+def test_unparsed_rows_do_not_roll_over_day_files(tmp_path):
+    sink = ColumnarSink(tmp_path)
+    sink.write("bus", "b1", bus_rows(["2025-10-20 10:00:00", "garbage"]))
+    sink.write("bus", "b2", bus_rows(["2025-10-20 10:00:15"]))
+    sink.close()
+    day_files = list((tmp_path / "bus" / "date=2025-10-20").glob("*.parquet"))
+    assert len(day_files) == 1
+    assert len(read_snapshots(tmp_path, "bus")) == 3
+
+
+def test_files_are_finished_once_open_for_file_seconds(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("sinks.time.monotonic", lambda: clock[0])
+    sink = ColumnarSink(tmp_path, file_seconds=3600)
+    sink.write("bus", "b1", bus_rows(["2025-10-20 10:00:00"]))
+    sink.flush()
+    assert read_snapshots(tmp_path, "bus").empty
+
+    clock[0] += 3600
+    sink.write("bus", "b2", bus_rows(["2025-10-20 11:00:00"]))
+    # the first hour is readable while the day is still being written
+    assert len(sink.files) == 1
+    assert read_snapshots(tmp_path, "bus")["bus_id"].tolist() == [0]
+
+    sink.close()
+    assert len(read_snapshots(tmp_path, "bus")) == 2
+
+
+def test_traffic_polylines_are_list_of_string_even_when_first_empty(tmp_path):
+    def incident(polylines, minute):
+        return pd.DataFrame({"type": ["accident"], "polylines": [polylines],
+                             "snapshot_time": [f"2025-10-20 10:{minute:02d}:00"]})
+
+    sink = ColumnarSink(tmp_path)
+    sink.write("traffic", "b1", incident([], 0))
+    sink.write("traffic", "b2", incident(["_p~iF~ps|U"], 1))
+    sink.write("traffic", "b3", incident(None, 2))
+    sink.close()
+
+    rows = read_snapshots(tmp_path, "traffic").sort_values("snapshot_time")
+    assert [None if p is None else list(p) for p in rows["polylines"]] == [[], ["_p~iF~ps|U"], None]
@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+
+import extractors.transloc_time as transloc_time
+from extractors.transloc_time import decode_transloc_date, decode_transloc_dates
+
+MS = 1760800000000
+INSTANT = pd.Timestamp(MS, unit="ms", tz="UTC")
+
+
+@pytest.fixture(params=["pyarrow", "pandas"])
+def backend(request, monkeypatch):
+    if request.param == "pyarrow":
+        pytest.importorskip("pyarrow")
+    else:
+        # the str.extract fallback used without pyarrow
+        monkeypatch.setattr(transloc_time, "_extract_millis", transloc_time._extract_millis_pandas)
+    return request.param
+
+
+def test_non_default_index_is_preserved(backend):
+    values = pd.Series([f"/Date({MS}-0400)/", f"/Date({MS + 1000})/", f"\\/Date({MS + 2000}+0000)\\/"],
+                       index=[5, 6, 7])
+    decoded = decode_transloc_dates(values, tz=None)
+    assert list(decoded.index) == [5, 6, 7]
+    assert decoded.notna().all()
+    assert list(decoded) == [INSTANT, INSTANT + pd.Timedelta(seconds=1), INSTANT + pd.Timedelta(seconds=2)]
+
+
+def test_filtered_and_concatenated_columns(backend):
+    frame = pd.DataFrame({"TimeStamp": [f"/Date({MS + i * 1000}-0400)/" for i in range(6)]})
+    filtered = frame[frame.index % 2 == 1]["TimeStamp"]
+    combined = pd.concat([filtered, filtered])
+    decoded = decode_transloc_dates(combined, tz=None)
+    assert list(decoded.index) == [1, 3, 5, 1, 3, 5]
+    assert decoded.notna().all()
+    assert decoded.iloc[0] == INSTANT + pd.Timedelta(seconds=1)
+
+
+def test_nulls_and_malformed_values_are_nat(backend):
+    values = pd.Series([None, "/Date(abc)/", "Date(123", "", f"/Date({MS}-0400)/", float("nan")],
+                       index=list("abcdef"))
+    decoded = decode_transloc_dates(values, tz=None)
+    assert list(decoded.index) == list("abcdef")
+    assert decoded.isna().tolist() == [True, True, True, True, False, True]
+    assert decoded["e"] == INSTANT
+
+
+def test_offset_does_not_shift_the_instant(backend):
+    decoded = decode_transloc_dates([f"/Date({MS}-0400)/", f"/Date({MS}+0530)/", f"/Date({MS})/"])
+    assert decoded.nunique() == 1
+    assert str(decoded.dt.tz) == "America/New_York"
+
+
+def test_single_value(backend):
+    assert decode_transloc_date(f"/Date({MS})/", tz=None) == INSTANT
+    assert decode_transloc_date("nonsense") is None
+    assert decode_transloc_date(None) is None
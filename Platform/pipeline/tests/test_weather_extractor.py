@@ -0,0 +1,193 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from extractors.WeatherExtractor import WeatherExtractor
+
+
+def hourly_periods(first_start, n=4):
+    return [
+        {"startTime": (first_start + timedelta(hours=i)).isoformat(),
+         "endTime": (first_start + timedelta(hours=i + 1)).isoformat(),
+         "temperature": 60 + i, "windSpeed": "5 mph", "shortForecast": f"period {i}",
+         "probabilityOfPrecipitation": {"value": 10 * i}}
+        for i in range(n)
+    ]
+
+
+def weather():
+    return WeatherExtractor(base_url="https://api.weather.test", api_key="", user_agent="(test, test@example.com)")
+
+
+def test_current_period_is_the_one_covering_now_not_the_first():
+    hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    # a body fetched two hours ago: its first two periods are over
+    periods = hourly_periods(hour - timedelta(hours=2))
+    df = weather()._to_dataframe({"properties": {"periods": periods}})
+    assert df.loc[0, "conditions"] == "period 2"
+    assert df.loc[0, "temperature"] == 62.0
+
+
+def test_current_period_boundaries():
+    start = pd.Timestamp("2025-10-18T14:00:00-04:00")
+    periods = hourly_periods(start.to_pydatetime())
+    w = weather()
+    assert w._current_period(periods, now=start)["shortForecast"] == "period 0"
+    assert w._current_period(periods, now=start + pd.Timedelta(minutes=59))["shortForecast"] == "period 0"
+    assert w._current_period(periods, now=start + pd.Timedelta(hours=1))["shortForecast"] == "period 1"
+    # nothing covers now: before the forecast, or after it has run out
+    assert w._current_period(periods, now=start - pd.Timedelta(hours=1))["shortForecast"] == "period 0"
+    assert w._current_period(periods, now=start + pd.Timedelta(hours=10))["shortForecast"] == "period 3"
+
+
+class StubResponse:
+    def __init__(self, status, payload=None, headers=None):
+        self.status_code = status
+        self.payload = payload
+        self.headers = headers or {}
+
+    def json(self):
+        return self.payload
+
+
+class StubSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.headers = {}
+        self.calls = 0
+        self.requests = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls += 1
+        self.requests.append((url, headers or {}))
+        return self.responses.pop(0)
+
+
+# -- points / forecast caching ------------------------------------------------
+
+FORECAST_URL = "https://api.weather.test/gridpoints/FFC/52,87/forecast/hourly"
+POINTS = {"properties": {"forecastHourly": FORECAST_URL}}
+FORECAST = {"properties": {"periods": hourly_periods(datetime.now(timezone.utc) - timedelta(minutes=30))}}
+
+
+@pytest.fixture(autouse=True)
+def fresh_endpoint_cache(monkeypatch):
+    # resolved endpoints are shared by every instance in the process
+    monkeypatch.setattr(WeatherExtractor, "_forecast_endpoints", {})
+
+
+def test_points_lookup_is_resolved_once_per_process():
+    first, second = weather(), weather()
+    first.session = StubSession([StubResponse(200, POINTS)])
+    second.session = StubSession([])
+
+    assert first._resolve_forecast_endpoint() == "gridpoints/FFC/52,87/forecast/hourly"
+    assert first._resolve_forecast_endpoint() == "gridpoints/FFC/52,87/forecast/hourly"
+    assert second._resolve_forecast_endpoint() == "gridpoints/FFC/52,87/forecast/hourly"
+    assert first.session.calls == 1 and second.session.calls == 0
+
+
+def test_points_lookup_persists_to_cache_path(tmp_path, monkeypatch):
+    cache_path = str(tmp_path / "weather_cache.json")
+    w = WeatherExtractor(base_url="https://api.weather.test", api_key="", user_agent="(test, test@example.com)",
+                         cache_path=cache_path)
+    w.session = StubSession([StubResponse(200, POINTS)])
+    w._resolve_forecast_endpoint()
+    with open(cache_path) as f:
+        assert json.load(f) == {"https://api.weather.test|33.7756,-84.3963": "gridpoints/FFC/52,87/forecast/hourly"}
+
+    # a restart: the in-process cache is empty, the file is not
+    monkeypatch.setattr(WeatherExtractor, "_forecast_endpoints", {})
+    restarted = WeatherExtractor(base_url="https://api.weather.test", api_key="",
+                                 user_agent="(test, test@example.com)", cache_path=cache_path)
+    restarted.session = StubSession([])
+    assert restarted._resolve_forecast_endpoint() == "gridpoints/FFC/52,87/forecast/hourly"
+    assert restarted.session.calls == 0
+
+
+def test_forecast_is_reused_until_max_age_then_revalidated():
+    validators = {"ETag": '"v1"', "Last-Modified": "Mon, 04 Mar 2024 13:00:00 GMT", "Cache-Control": "max-age=600"}
+    w = weather()
+    w.session = StubSession([
+        StubResponse(200, FORECAST, validators),
+        StubResponse(304, headers={"ETag": '"v1"', "Cache-Control": "max-age=600"}),
+    ])
+    endpoint = "gridpoints/FFC/52,87/forecast/hourly"
+
+    assert w._get_forecast(endpoint) == FORECAST
+    assert w._get_forecast(endpoint) == FORECAST
+    assert w.session.calls == 1
+    assert w.session.requests[0] == (FORECAST_URL, {})
+
+    w._forecast_cache["expires"] = 0.0    # max-age runs out
+    assert w._get_forecast(endpoint) is FORECAST
+    assert w.session.requests[1] == (FORECAST_URL, {"If-None-Match": '"v1"',
+                                                    "If-Modified-Since": "Mon, 04 Mar 2024 13:00:00 GMT"})
+    # the 304 renews the expiry
+    assert w._get_forecast(endpoint) is FORECAST
+    assert w.session.calls == 2
+
+
+def test_extract_twice_fetches_points_and_forecast_once():
+    w = weather()
+    w.session = StubSession([StubResponse(200, POINTS), StubResponse(200, FORECAST, {"Cache-Control": "max-age=600"})])
+
+    assert w.extract()["conditions"].tolist() == ["period 0"]
+    assert w.extract()["conditions"].tolist() == ["period 0"]
+    assert w.session.calls == 2
+
+
+# -- alerts ---------------------------------------------------------------------
+
+
+def test_failed_alerts_request_is_not_cached_as_empty():
+    alert = {"properties": {"event": "Flood Watch"}}
+    w = weather()
+    w.session = StubSession([StubResponse(503), StubResponse(200, {"features": [alert]})])
+
+    assert w._get_alerts() == []
+    # the 503 was not cached: the next call goes back to weather.gov
+    assert w._get_alerts() == [alert]
+    assert w.session.calls == 2
+    # the success is cached for ALERTS_TTL
+    assert w._get_alerts() == [alert]
+    assert w.session.calls == 2
+
+
+def test_failed_alerts_refresh_serves_last_known_alerts():
+    alert = {"properties": {"event": "Heat Advisory"}}
+    w = weather()
+    w.session = StubSession([StubResponse(200, {"features": [alert]}), StubResponse(500), StubResponse(200, {"features": []})])
+
+    assert w._get_alerts() == [alert]
+    w._alerts_cache = (0.0, w._alerts_cache[1])    # expire it
+    assert w._get_alerts() == [alert]
+    assert w._get_alerts() == []
+    assert w.session.calls == 3
+
+
+def test_horizon_keeps_the_last_known_alerts_when_a_refresh_fails():
+    start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    alert = {"properties": {"event": "Flood Watch", "severity": "Moderate",
+                            "onset": (start + timedelta(hours=1)).isoformat(),
+                            "ends": (start + timedelta(hours=3)).isoformat()}}
+    forecast = {"properties": {"periods": hourly_periods(start)}}
+    w = weather()
+    w.session = StubSession([
+        StubResponse(200, POINTS),
+        StubResponse(200, forecast, {"Cache-Control": "max-age=3600"}),
+        StubResponse(200, {"features": [alert]}),
+        StubResponse(503),
+    ])
+
+    first = w.extract_horizon()
+    w._alerts_cache = (0.0, w._alerts_cache[1])    # expire the alerts only
+    second = w.extract_horizon()
+
+    for horizon in (first, second):
+        assert horizon["alert_count"].tolist() == [0, 1, 1, 0]
+        assert horizon["alert_events"].tolist()[1:3] == ["Flood Watch", "Flood Watch"]
+        assert horizon["alert_severity"].tolist()[1] == "Moderate"
+    assert w.session.calls == 4
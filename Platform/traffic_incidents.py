@@ -92,6 +92,9 @@ def snap_segment_to_roads(points):
 
     return snapped
 
+# built once: constructing a Transformer costs far more than using it
+_to_m = Transformer.from_crs("epsg:4326", "epsg:3857", always_xy=True).transform
+
 def buffered_overlap_length(busRoutePL, incidentSegmentPL):
     busRoute = polyline.decode(busRoutePL)
     incidentSegment = polyline.decode(incidentSegmentPL)
@@ -99,7 +102,6 @@ def buffered_overlap_length(busRoutePL, incidentSegmentPL):
     busLineString = LineString([(lng,lat) for lat,lng in busRoute])
     incidentLineString = LineString([(lng,lat) for lat,lng in incidentSegment])
     #convert to metres
-    _to_m = Transformer.from_crs("epsg:4326", "epsg:3857", always_xy=True).transform
     busLineString_m = transform(_to_m, busLineString)
     incidentLineString_m = transform(_to_m, incidentLineString)
     #buffer L1 by 1 m and clip L2 to it